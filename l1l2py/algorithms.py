@@ -31,10 +31,16 @@ try:
 except ImportError:
     from numpy import linalg as la
 
-from collections import deque
+from math import sqrt
 from six.moves import xrange
 
-__all__ = ('l1_bound', 'ridge_regression', 'l1l2_regularization', 'l1l2_path')
+from l1l2py.lipschitz import lipschitz_constant
+from l1l2py.screening import correlation, strong_set, kkt_violations
+
+__all__ = ('l1_bound', 'ridge_regression', 'ridge_solver', 'ridge_path',
+           'l1l2_regularization', 'l1l2_path', 'l1l2_path_batch',
+           'l1l2_path_folds', 'PrecomputedData', 'IncrementalRidge',
+           'Workspace', 'RegularizationPath')
 
 
 def _emergency_log(message, file_path='/tmp/emergency_log.txt'):
@@ -43,6 +49,252 @@ def _emergency_log(message, file_path='/tmp/emergency_log.txt'):
             lf.write(message)
 
 
+class PrecomputedData(object):
+    r"""Quantities of a data matrix reused by the solvers.
+
+    The Lipschitz constant of the least squares gradient, the correlation
+    vector ``X^T Y`` and (optionally) the Gram matrix ``X^T X`` depend only
+    on the data and not on the ``mu``, ``tau`` or ``lambda`` penalties, so
+    they may be computed once per dataset (e.g. once per cross validation
+    split) and shared by all the solutions evaluated on it.
+
+    The object is bound to the memory buffer of ``data`` and to the values
+    of ``labels``: the solvers raise a ``ValueError`` if they receive it
+    along with a different matrix or (if ``XTY`` was computed) with
+    different labels.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,) or (N, 1) ndarray, optional (default is `None`)
+        Labels vector. If `None`, ``XTY`` is not computed.
+    gram : bool or 'auto', optional (default is `'auto'`)
+        Whether to compute the Gram matrix ``X^T X``.
+        If `'auto'`, it is computed only if `N > P`.
+
+    Attributes
+    ----------
+    lipschitz : float
+        Maximum eigenvalue of ``X^T X``.
+    XTY : (P, 1) ndarray or `None`
+        Correlation between data and labels.
+    gram : (P, P) ndarray or `None`
+        Gram matrix ``X^T X``.
+
+    """
+
+    def __init__(self, data, labels=None, gram='auto'):
+        n, p = data.shape
+        if gram == 'auto':
+            gram = n > p
+
+        self.data = data
+        self._key = _buffer_key(data)
+        self.lipschitz = lipschitz_constant(data)
+
+        self.XTY = self._labels = None
+        if labels is not None:
+            self._labels = np.array(labels, dtype=_float_dtype(data)).ravel()
+            self.XTY = np.dot(data.T, self._labels.reshape(-1, 1))
+
+        self.gram = np.dot(data.T, data) if gram else None
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def sigma(self, mu):
+        """Step size of the `l1l2` solver for the given ``mu``."""
+        return (self.lipschitz / self.shape[0]) + mu
+
+    def check(self, data, labels=None):
+        """Raise a ``ValueError`` if ``data`` is not the precomputed matrix,
+        or if ``labels`` are not the ones of ``XTY``.
+        """
+        if data is not self.data and _buffer_key(data) != self._key:
+            raise ValueError("precomputed quantities refer to a different "
+                             "data matrix")
+        if (labels is not None and self._labels is not None and
+                not np.array_equal(np.asarray(labels, self._labels.dtype)
+                                   .ravel(), self._labels)):
+            raise ValueError("precomputed quantities refer to different "
+                             "labels")
+
+    def restrict(self, columns):
+        """Quantities of the sub-matrix ``data[:, columns]``.
+
+        The Lipschitz constant of the whole matrix is kept, as it is an upper
+        bound for the one of any sub-matrix.
+        """
+        out = PrecomputedData.__new__(PrecomputedData)
+        out.data = self.data[:, columns]
+        out._key = _buffer_key(out.data)
+        out.lipschitz = self.lipschitz
+        out._labels = self._labels
+        out.XTY = None if self.XTY is None else self.XTY[columns]
+        out.gram = (None if self.gram is None
+                    else self.gram[np.ix_(columns, columns)])
+        return out
+
+
+class Workspace(object):
+    r"""Work buffers of the `l1l2` solvers.
+
+    The iterations of the solvers only update a few vectors (solution,
+    gradient, residual, ...) which are kept in the buffers of a workspace
+    and overwritten in place, so that no temporary array is allocated
+    inside the loop.
+    A buffer is allocated the first time it is requested and then reused
+    by the following solves (also of smaller problems, e.g. on the working
+    sets of the screening rule), so a workspace shared by the solves of a
+    regularization path allocates its buffers only once.
+
+    Examples
+    --------
+    >>> workspace = l1l2py.algorithms.Workspace()
+    >>> workspace.get('beta', (3, 1)).shape
+    (3, 1)
+
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.float64):
+        """Uninitialized buffer ``name`` of the given shape and type."""
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+
+class RegularizationPath(object):
+    r"""Solutions of an `l1l2` regularization path.
+
+    The solutions are the rows of a single `(T, P)` block, ordered as the
+    values of ``tau`` (from the less sparse to the sparser), and only the
+    ones with at least one non-zero element are kept.
+    The object is also the sequence of the `(P, 1)` solutions, which are
+    views of the rows of a dense block.
+
+    Parameters
+    ----------
+    coefs : (T, P) ndarray or sparse matrix
+        Solutions, one for each row.
+    sparse : bool, optional (default is `False`)
+        If `True`, the solutions are stored as a CSR matrix
+        (``scipy.sparse``), with only their non-zero elements.
+
+    Attributes
+    ----------
+    coefs : (T', P) ndarray or CSR matrix
+        Solutions with at least one non-zero element.
+    nonzero : (T',) ndarray of int
+        Number of non-zero elements of each solution.
+
+    Examples
+    --------
+    >>> path = l1l2py.algorithms.RegularizationPath(
+    ...     numpy.array([[1.0, 0.0, 2.0], [0.0, 0.0, 3.0], [0.0, 0.0, 0.0]]))
+    >>> len(path)
+    2
+    >>> path.nonzero
+    array([2, 1])
+    >>> path.support(0)
+    array([0, 2])
+    >>> path[1].shape
+    (3, 1)
+
+    """
+
+    def __init__(self, coefs, sparse=False):
+        if sparse or hasattr(coefs, 'tocsr'):
+            from scipy import sparse as sp
+            coefs = sp.csr_matrix(coefs)
+            coefs.eliminate_zeros()
+            nonzero = np.diff(coefs.indptr)
+        else:
+            coefs = np.asarray(coefs)
+            nonzero = np.count_nonzero(coefs, axis=1)
+
+        # the void solutions (of the biggest taus) are usually the last rows
+        keep = nonzero > 0
+        if not keep.all():
+            last = np.count_nonzero(keep)
+            if keep[:last].all():
+                coefs, nonzero = coefs[:last], nonzero[:last]
+            else:
+                coefs, nonzero = coefs[keep], nonzero[keep]
+        self.coefs = coefs
+        self.nonzero = nonzero
+
+    @property
+    def sparse(self):
+        return not isinstance(self.coefs, np.ndarray)
+
+    def __len__(self):
+        return self.coefs.shape[0]
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('solution index out of range')
+        if self.sparse:
+            return self.coefs[i].toarray().T
+        return self.coefs[i][:, np.newaxis]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def support(self, i):
+        """Indexes of the non-zero elements of the ``i``-th solution."""
+        if self.sparse:
+            i = i % len(self)
+            return self.coefs.indices[self.coefs.indptr[i]:
+                                      self.coefs.indptr[i + 1]]
+        return np.flatnonzero(self.coefs[i])
+
+    def tocsr(self):
+        """The same path, stored as a CSR matrix."""
+        return RegularizationPath(self.coefs, sparse=True)
+
+
+def _soft_threshold(value, threshold, out):
+    r"""In place soft-thresholding ``sign(value) * max(|value| - threshold,
+    0)``, stored in ``out``."""
+    np.abs(value, out=out)
+    out -= threshold
+    np.maximum(out, 0.0, out=out)
+    return np.copysign(out, value, out=out)
+
+
+def _dot_into(matrix, vector, out):
+    r"""Product ``matrix.dot(vector)`` stored in ``out``.
+    Dense arrays of the same type are multiplied in place (BLAS `gemv`),
+    other matrices (sparse, linear operators) through a temporary."""
+    if (isinstance(matrix, np.ndarray) and
+            matrix.dtype == vector.dtype == out.dtype):
+        return np.dot(matrix, vector, out=out)
+    out[...] = matrix.dot(vector)
+    return out
+
+
+def _buffer_key(data):
+    interface = np.asarray(data).__array_interface__
+    return (interface['data'][0], interface['shape'],
+            interface['strides'], interface['typestr'])
+
+
+def _float_dtype(data):
+    r"""Floating point type of the computations on ``data``: `float32`
+    data are kept in single precision, anything else is promoted to
+    `float64`."""
+    return np.float32 if data.dtype == np.float32 else np.float64
+
+
 def l1_bound(data, labels):
     r"""Estimation of an useful maximum bound for the `l1` penalty term.
 
@@ -87,7 +339,7 @@ def l1_bound(data, labels):
     return tau_max
 
 
-def ridge_regression(data, labels, mu=0.0):
+def ridge_regression(data, labels, mu=0.0, solver='auto'):
     r"""Implementation of the Regularized Least Squares solver.
 
     It solves the ridge regression problem with parameter ``mu`` on the
@@ -95,12 +347,21 @@ def ridge_regression(data, labels, mu=0.0):
 
     Parameters
     ----------
-    data : (N, P) ndarray
+    data : (N, P) ndarray, sparse matrix or LinearOperator
         Data matrix.
     labels : (N,)  or (N, 1) ndarray
         Labels vector.
     mu : float, optional (default is `0.0`)
         `l2-norm` penalty.
+    solver : {'auto', 'cholesky', 'svd', 'lsqr'}, optional
+        (default is `'auto'`)
+        Solver of the linear system (see ``ridge_solver``):
+
+        - 'cholesky' factorizes the (regularized) Gram matrix of the smallest
+          dimension;
+        - 'svd' computes the minimum norm solution from the SVD of ``data``,
+          and is also used if the Cholesky factorization fails;
+        - 'lsqr' is iterative and only needs products with ``data``.
 
     Returns
     --------
@@ -117,26 +378,380 @@ def ridge_regression(data, labels, mu=0.0):
     3
 
     """
-    n, p = data.shape
+    labels = np.asarray(labels, dtype=_float_dtype(data))
+    return _ridge_solve(data, labels.reshape(-1, 1), mu, solver)[0]
+
+
+def ridge_solver(data, mu=0.0):
+    r"""Solver chosen by ``ridge_regression`` when ``solver='auto'``.
+
+    Sparse matrices, linear operators and data matrices whose both
+    dimensions are greater than ``5000`` are solved with LSQR, so that no
+    Gram matrix is formed. Otherwise the (positive definite) regularized
+    problems are solved with a Cholesky factorization and the
+    (possibly rank deficient) problems with ``mu = 0`` from the SVD.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray, sparse matrix or LinearOperator
+        Data matrix.
+    mu : float, optional (default is `0.0`)
+        `l2-norm` penalty.
+
+    Returns
+    -------
+    solver : {'cholesky', 'svd', 'lsqr'}
+        Name of the solver.
+
+    """
+    if not isinstance(data, np.ndarray) or min(data.shape) > _LSQR_SIZE:
+        return 'lsqr'
+    return 'cholesky' if mu > 0 else 'svd'
+
 
+_LSQR_SIZE = 5000
+
+
+def _ridge_solve(data, labels, mu, solver):
+    r"""Ridge regression solution for (N,) or (N, K) ``labels`` and the name
+    of the solver actually used."""
+    if solver == 'auto':
+        solver = ridge_solver(data, mu)
+    elif solver not in ('cholesky', 'svd', 'lsqr'):
+        raise ValueError("solver must be one of 'auto', 'cholesky', "
+                         "'svd' or 'lsqr', got %r" % solver)
+
+    if solver == 'cholesky':
+        try:
+            return _ridge_cholesky(data, labels, mu), solver
+        except np.linalg.LinAlgError:
+            solver = 'svd'  # (numerically) singular system
+
+    if solver == 'svd':
+        return _ridge_svd(data, labels, mu), solver
+    return _ridge_lsqr(data, labels, mu), solver
+
+
+def _ridge_cholesky(data, labels, mu):
+    n, p = data.shape
     if n < p:
         tmp = np.dot(data, data.T)
-        if mu:
-            tmp += mu * n * np.eye(n)
-        tmp = la.pinv(tmp)
-
-        return np.dot(np.dot(data.T, tmp), labels.reshape(-1, 1))
+        tmp.flat[::n + 1] += mu * n
+        return np.dot(data.T, _cholesky_solve(tmp, labels))
     else:
         tmp = np.dot(data.T, data)
-        if mu:
-            tmp += mu * n * np.eye(p)
-        tmp = la.pinv(tmp)
+        tmp.flat[::p + 1] += mu * n
+        return _cholesky_solve(tmp, np.dot(data.T, labels))
+
+
+def _cholesky_solve(matrix, b):
+    factor = _cholesky_checked(matrix, np.diag(matrix))
+    tmp = _solve_triangular(factor, b, lower=True)
+    return _solve_triangular(factor.T, tmp, lower=False)
+
+
+def _ridge_svd(data, labels, mu):
+    U, s, Vt = la.svd(data, full_matrices=False)
+    filters = _spectral_filter(s ** 2, [mu], data.shape[0],
+                               max(data.shape))[0] * s
+    UTY = np.dot(U.T, labels)
+    if UTY.ndim > 1:
+        filters = filters[:, np.newaxis]
+    return np.dot(Vt.T, filters * UTY)
+
+
+def _ridge_lsqr(data, labels, mu):
+    from scipy.sparse.linalg import lsqr
+
+    damp = np.sqrt(mu * data.shape[0])
+    if labels.ndim == 1:
+        beta = lsqr(data, labels, damp=damp, atol=1e-10, btol=1e-10)[0]
+    else:
+        beta = np.column_stack([lsqr(data, y, damp=damp, atol=1e-10,
+                                     btol=1e-10)[0] for y in labels.T])
+    return beta.astype(labels.dtype, copy=False)
+
+
+def _ridge_gram(gram, XTY, n, mu=0.0):
+    r"""Ridge regression solution from the Gram matrix ``X^T X`` and
+    ``X^T Y`` of a data matrix with ``n`` samples.
+
+    As in ``ridge_regression``, the regularized Gram matrix is factorized
+    with Cholesky; only a (numerically) rank deficient one, possible with
+    ``mu = 0``, gives the minimum norm solution from its eigendecomposition.
+    """
+    tmp = np.array(gram, copy=True)
+    tmp.flat[::tmp.shape[0] + 1] += mu * n
+    try:
+        return _cholesky_solve(tmp, XTY)
+    except np.linalg.LinAlgError:
+        beta = _ridge_gram_path(gram, XTY, n, [mu])[0]
+        return beta.reshape(np.shape(XTY))
+
+
+def ridge_path(data, labels, lambda_range):
+    r"""Ridge regression solutions for each value in ``lambda_range``.
+
+    A single (thin) SVD :math:`X = U S V^T` of the data matrix is
+    computed, then every solution is obtained rescaling the singular values:
+
+    .. math::
+
+        \beta(\lambda) = V \frac{S}{S^2 + n\lambda} U^T Y.
+
+    For ``lambda = 0`` the minimum norm least squares solution is returned,
+    as in ``ridge_regression``.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    lambda_range : array_like of `L` floats
+        Range of `l2-norm` penalties.
+
+    Returns
+    -------
+    betas : (L, P, 1) ndarray
+        Ridge regression solutions, one for each value in ``lambda_range``.
+
+    Examples
+    --------
+    >>> X = numpy.array([[0.1, 1.1, 0.3], [0.2, 1.2, 1.6], [0.3, 1.3, -0.6]])
+    >>> beta = numpy.array([0.1, 0.1, 0.0])
+    >>> Y = numpy.dot(X, beta)
+    >>> betas = l1l2py.algorithms.ridge_path(X, Y, [0.1, 1.0, 10.0])
+    >>> betas.shape
+    (3, 3, 1)
+    >>> numpy.allclose(betas[1], l1l2py.algorithms.ridge_regression(X, Y, 1.0))
+    True
+
+    """
+    n = data.shape[0]
+    U, s, Vt = la.svd(data, full_matrices=False)
+
+    filters = _spectral_filter(s ** 2, lambda_range, n, max(data.shape)) * s
+    UTY = np.dot(U.T, np.ravel(labels).astype(U.dtype, copy=False))
+
+    return np.dot(filters * UTY, Vt)[..., np.newaxis]
+
+
+def _ridge_gram_path(gram, XTY, n, lambda_range):
+    r"""Ridge regression solutions for each value in ``lambda_range`` from
+    a single eigendecomposition of the Gram matrix ``X^T X`` of a data
+    matrix with ``n`` samples (see ``ridge_path``)."""
+    eigvals, V = la.eigh(gram)
+    eigvals = np.maximum(eigvals, 0.0)
+
+    filters = _spectral_filter(eigvals, lambda_range, n, max(gram.shape))
+    VTY = np.dot(V.T, np.ravel(XTY))
+
+    return np.dot(filters * VTY, V.T)[..., np.newaxis]
+
+
+def _spectral_filter(eigvals, lambda_range, n, size):
+    r"""(L, R) matrix of the factors ``1 / (eigvals + n lambda)``.
+
+    As in the pseudo-inverse, factors of eigenvalues (of the regularized
+    Gram matrix) below ``size * eps * max(eigvals)`` are set to zero,
+    with the machine precision of ``eigvals``.
+    """
+    lambdas = np.asarray(lambda_range, dtype=eigvals.dtype).reshape(-1, 1)
+    denominators = eigvals + n * lambdas
+
+    cutoff = size * np.finfo(eigvals.dtype).eps * denominators.max(axis=1)
+    valid = denominators > cutoff[:, np.newaxis]
+
+    filters = np.zeros_like(denominators)
+    filters[valid] = 1.0 / denominators[valid]
+    return filters
+
+
+class IncrementalRidge(object):
+    r"""Ridge regression solutions on a changing subset of columns.
+
+    For each value in ``lambda_range`` it keeps the Cholesky factor of
+    ``X_S^T X_S + n lambda I``, where ``X_S`` are the selected columns of
+    the data matrix.
+    When the selected set changes, the new columns are appended to the
+    factors (block bordering) and the dropped ones are removed with rank-one
+    updates, so that nested subsets (e.g. the supports along the `l1l2`
+    regularization path) do not need to be factorized from scratch.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,)  or (N, 1) ndarray
+        Labels vector.
+    lambda_range : array_like of `L` floats
+        Range of `l2-norm` penalties.
+    precomputed : PrecomputedData, optional (default is `None`)
+        Quantities precomputed on ``data``. If it holds the Gram matrix,
+        ``data`` is not used to compute the factors.
 
-        return np.dot(tmp, np.dot(data.T, labels.reshape(-1, 1)))
+    Attributes
+    ----------
+    columns : list of int
+        Columns of the current factors, in the order they were added.
+
+    """
+
+    def __init__(self, data, labels, lambda_range, precomputed=None):
+        if precomputed is not None:
+            precomputed.check(data, labels)
+            gram, XTY = precomputed.gram, precomputed.XTY
+        else:
+            gram, XTY = None, None
+        dtype = _float_dtype(data)
+        if XTY is None:
+            XTY = np.dot(data.T, np.ravel(labels).astype(dtype, copy=False))
+
+        self.data = data
+        self._gram = gram
+        self._XTY = np.ravel(XTY)
+        self._shifts = data.shape[0] * np.asarray(lambda_range, dtype=dtype)
+        self.reset()
+
+    def reset(self):
+        """Drop all the columns."""
+        self.columns = []
+        self._factors = np.empty((len(self._shifts), 0, 0),
+                                 dtype=self._shifts.dtype)
+
+    def solve(self, selected):
+        r"""Ridge regression solutions on the ``selected`` columns.
+
+        Parameters
+        ----------
+        selected : (P,) ndarray of bool or array_like of int
+            Selected columns.
+
+        Returns
+        -------
+        betas : (L, S, 1) ndarray
+            Ridge regression solutions on the `S` selected columns (in
+            increasing order), one for each value in ``lambda_range``.
+
+        Raises
+        ------
+        LinAlgError
+            If the selected columns are (nearly) linearly dependent and a
+            penalty is (almost) null. The factors are reset.
+
+        """
+        selected = np.asarray(selected)
+        if selected.dtype == np.bool_:
+            selected = np.flatnonzero(selected)
+
+        target = set(selected.tolist())
+        removed = [c for c in self.columns if c not in target]
+        current = set(self.columns)
+        added = [c for c in selected.tolist() if c not in current]
+
+        # Too many changes: factorizing from scratch is cheaper
+        if len(removed) + len(added) > len(self.columns) - len(removed):
+            self.reset()
+            removed = []
+            added = selected.tolist()
+
+        for c in removed:
+            self._remove(self.columns.index(c))
+        if added:
+            try:
+                self._add(added)
+            except np.linalg.LinAlgError:
+                self.reset()
+                raise
+
+        XTY = self._XTY[self.columns]
+        betas = np.empty((len(self._shifts), len(self.columns)),
+                         dtype=self._shifts.dtype)
+        for k, factor in enumerate(self._factors):
+            tmp = _solve_triangular(factor, XTY, lower=True)
+            betas[k] = _solve_triangular(factor.T, tmp, lower=False)
+
+        order = np.argsort(self.columns)
+        return betas[:, order, np.newaxis]
+
+    def _gram_block(self, rows, columns):
+        if self._gram is not None:
+            return self._gram[np.ix_(rows, columns)]
+        return np.dot(self.data[:, rows].T, self.data[:, columns])
+
+    def _add(self, added):
+        m, k = len(self.columns), len(added)
+        cross = self._gram_block(self.columns, added)
+        block = self._gram_block(added, added)
+
+        factors = np.zeros((len(self._shifts), m + k, m + k),
+                           dtype=self._shifts.dtype)
+        factors[:, :m, :m] = self._factors
+        for i, shift in enumerate(self._shifts):
+            if m:
+                border = _solve_triangular(self._factors[i], cross,
+                                           lower=True)
+                schur = block - np.dot(border.T, border)
+                factors[i, m:, :m] = border.T
+            else:
+                schur = block.copy()
+            schur.flat[::k + 1] += shift
+            factors[i, m:, m:] = _cholesky_checked(schur,
+                                                   np.diag(block) + shift)
+
+        self._factors = factors
+        self.columns.extend(added)
+
+    def _remove(self, position):
+        factors = self._factors
+        tail = factors[:, position + 1:, position].copy()
+
+        keep = np.arange(factors.shape[1]) != position
+        factors = factors[:, keep][:, :, keep]
+        _cholesky_update(factors[:, position:, position:], tail)
+
+        self._factors = factors
+        del self.columns[position]
+
+
+def _cholesky_checked(matrix, diagonal):
+    r"""Lower Cholesky factor of ``matrix``, a Schur complement of a matrix
+    with the given ``diagonal``.
+    A ``LinAlgError`` is raised if a pivot is negligible with respect to
+    ``diagonal``, in the precision of ``matrix``."""
+    factor = np.linalg.cholesky(matrix)
+    tolerance = np.sqrt(np.finfo(factor.dtype).eps)
+    if np.any(np.diag(factor) ** 2 <= tolerance * diagonal):
+        raise np.linalg.LinAlgError("selected columns are (nearly) "
+                                    "linearly dependent")
+    return factor
+
+
+def _cholesky_update(factors, x):
+    r"""In place rank-one update of a stack of lower Cholesky factors,
+    from ``L L^T`` to ``L L^T + x x^T`` (one row of ``x`` per factor)."""
+    for i in xrange(factors.shape[1]):
+        diag = factors[:, i, i]
+        r = np.hypot(diag, x[:, i])
+        c = (r / diag)[:, np.newaxis]
+        s = (x[:, i] / diag)[:, np.newaxis]
+
+        factors[:, i, i] = r
+        factors[:, i + 1:, i] = (factors[:, i + 1:, i] + s * x[:, i + 1:]) / c
+        x[:, i + 1:] = c * x[:, i + 1:] - s * factors[:, i + 1:, i]
+
+
+def _solve_triangular(matrix, b, lower):
+    if hasattr(la, 'solve_triangular'):
+        return la.solve_triangular(matrix, b, lower=lower)
+    return np.linalg.solve(matrix, b)  # numpy only
 
 
 def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
-              tolerance=1e-5, adaptive=False, input_key=None):
+              tolerance=1e-5, adaptive=False, input_key=None,
+              precomputed=None, batch=False, screening=True,
+              extrapolate=True, sparse=False):
     r"""Efficient solution of different `l1l2` regularization problems on
     increasing values of the `l1-norm` parameter.
 
@@ -180,11 +795,36 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
     adaptive : bool, optional (default is `False`)
         If `True`, minimization is performed calculating an adaptive step size
         for each iteration.
+    precomputed : PrecomputedData, optional (default is `None`)
+        Precomputed quantities of ``data`` and ``labels``.
+        If `None`, they are computed once and shared by all the values of
+        ``tau``.
+    batch : bool, optional (default is `False`)
+        If `True`, all the values of ``tau`` are solved together, starting
+        from ``beta``, keeping a `(P, T)` block of solutions updated with one
+        matrix-matrix product per iteration (see ``l1l2_path_batch``).
+        Otherwise, each solution is the warm start of the next one.
+    screening : bool, optional (default is `True`)
+        If `True`, each solution is computed only on the columns selected by
+        the sequential strong rule, checking the optimality conditions on
+        the discarded ones (see ``l1l2py.screening``).
+    extrapolate : bool, optional (default is `True`)
+        If `True`, once two consecutive solutions have the same support and
+        signs, the next ones are first computed in closed form on that sign
+        pattern, where the functional is quadratic (a ridge problem), and
+        accepted if they keep the signs and satisfy the optimality
+        conditions. Otherwise the iterative solver is used again, and its
+        solution is refined in closed form on its own sign pattern (with
+        the same checks).
+    sparse : bool, optional (default is `False`)
+        If `True`, only the non-zero elements of the solutions are stored,
+        in a CSR matrix (see ``RegularizationPath``).
 
     Returns
     -------
-    beta_path : list of (P,) or (P, 1) ndarrays
-        `l1l2` solutions with at least one non-zero element.
+    beta_path : RegularizationPath
+        `l1l2` solutions with at least one non-zero element, as a sequence
+        of (P, 1) ndarrays backed by a single (T, P) array.
 
     """
     # if input_key is not None:
@@ -194,44 +834,517 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
 
     # emergency_log("l1l2_path [1]\n", emergency_log_file)
     n, p = data.shape
+    dtype = _float_dtype(data)
+    labels = np.asarray(labels, dtype=dtype)
+
+    if precomputed is None:
+        precomputed = PrecomputedData(data, labels)
+    else:
+        precomputed.check(data, labels)
+
+    if batch:
+        if adaptive:
+            raise ValueError('adaptive step size is not supported '
+                             'by the batch solver')
+        path = l1l2_path_batch(data, labels, mu, tau_range, beta, kmax,
+                               tolerance, precomputed=precomputed)
+        return path.tocsr() if sparse else path
 
     if mu == 0.0:
-        beta_ls = ridge_regression(data, labels)
+        if precomputed.gram is not None:
+            beta_ls = _ridge_gram(precomputed.gram, precomputed.XTY, n)
+        else:
+            beta_ls = ridge_regression(data, labels)
     if beta is None:
-        beta = np.zeros((p, 1))
+        beta = np.zeros((p, 1), dtype=dtype)
+    workspace = Workspace()
 
     # emergency_log("l1l2_path [2]\n", emergency_log_file)
 
-    out = deque()
+    if screening:
+        corr = correlation(data, labels, beta,
+                           precomputed.gram, precomputed.XTY)
+        tau_prev = np.abs(corr).max()
+
+    # For tau >= tau_null the solution is null, without iterations
+    corr_null = correlation(data, labels, np.zeros(p, dtype=dtype),
+                            precomputed.gram, precomputed.XTY)
+    tau_null = np.abs(corr_null).max()
+
+    # The solutions are the rows of a single block (or, if sparse, of a CSR
+    # matrix built at the end)
+    n_tau = len(tau_range)
+    if sparse:
+        indices, values = [None] * n_tau, [None] * n_tau
+    else:
+        coefs = np.zeros((n_tau, p), dtype=dtype)
     nonzero = 0
+    stable = False
     # Taus are used from the biggest (sparser solutions)
     # to the smallest (less sparse solutions)
-    for tau in reversed(tau_range):
-        if mu == 0.0 and nonzero >= n:  # lasso saturation
+    for i in xrange(n_tau - 1, -1, -1):
+        tau = tau_range[i]
+        null = tau >= tau_null
+        fixed = None
+        if (extrapolate and stable and not null
+                and not (mu == 0.0 and nonzero >= n)):
+            fixed = _fixed_signs_l1l2(data, labels, mu, tau, beta,
+                                      precomputed)
+
+        iterative = False
+        if null:
+            beta_next = np.zeros((p, 1), dtype=dtype)
+            corr, tau_prev = corr_null, tau
+        elif mu == 0.0 and nonzero >= n:  # lasso saturation
             beta_next = beta_ls
+        elif fixed is not None:
+            beta_next, corr = fixed
+            tau_prev = tau
+        elif screening:
+            beta_next, corr = _screened_l1l2(
+                data, labels, mu, tau, tau_prev, beta, corr, kmax, tolerance,
+                adaptive, precomputed, workspace)
+            tau_prev = tau
+            iterative = True
         else:
             beta_next = l1l2_regularization(data, labels, mu, tau, beta,
-                                            kmax, tolerance, adaptive=adaptive)
+                                            kmax, tolerance, adaptive=adaptive,
+                                            precomputed=precomputed,
+                                            workspace=workspace)
+            iterative = True
+
+        if iterative and extrapolate and np.any(beta_next):
+            refined = _fixed_signs_l1l2(data, labels, mu, tau, beta_next,
+                                        precomputed)
+            if refined is not None:
+                beta_next, corr = refined
 
         # emergency_log("l1l2_path [3] [inside tau]\n", emergency_log_file)
 
         nonzero = len(beta_next.nonzero()[0])
-        if nonzero > 0:
-            # vectors are appended to the left of the queue,
-            # so that the out list contains betas ordered from
-            # less sparse to sparser
-            out.appendleft(beta_next)
+        if sparse:
+            indices[i] = np.flatnonzero(beta_next)
+            values[i] = np.ravel(beta_next)[indices[i]]
+        else:
+            coefs[i] = np.ravel(beta_next)
 
+        stable = nonzero > 0 and np.array_equal(np.sign(beta_next),
+                                                np.sign(beta))
         beta = beta_next
 
     # emergency_log("l1l2_path [4]\n", emergency_log_file)
 
-    return out
+    if sparse:
+        from scipy import sparse as sp
+        indptr = np.concatenate(([0], np.cumsum([len(x) for x in indices])))
+        coefs = sp.csr_matrix((np.concatenate(values),
+                               np.concatenate(indices), indptr),
+                              shape=(n_tau, p))
+    return RegularizationPath(coefs)
+
+
+def _screened_l1l2(data, labels, mu, tau, tau_prev, beta, corr, kmax,
+                   tolerance, adaptive, precomputed, workspace=None):
+    r"""`l1l2` solution on the working set of the sequential strong rule.
+
+    ``corr`` is the correlation vector of ``beta``, the solution for
+    ``tau_prev``. Returns the solution for ``tau`` and its correlation
+    vector.
+    """
+    p = data.shape[1]
+    beta = np.reshape(beta, (p, 1))
+    working = strong_set(corr, tau, tau_prev, beta)
+
+    while True:
+        columns = np.flatnonzero(working)
+        beta_next = np.zeros((p, 1), dtype=_float_dtype(data))
+        if len(columns):
+            restricted = precomputed.restrict(columns)
+            beta_next[columns] = l1l2_regularization(
+                restricted.data, labels, mu, tau, beta[columns], kmax,
+                tolerance, adaptive=adaptive, precomputed=restricted,
+                workspace=workspace)
+
+        # KKT conditions on the discarded columns
+        corr = correlation(data, labels, beta_next,
+                           precomputed.gram, precomputed.XTY)
+        violations = kkt_violations(corr, tau, working)
+        if not violations.any():
+            return beta_next, corr
+        working |= violations
+
+
+def _fixed_signs_l1l2(data, labels, mu, tau, beta, precomputed):
+    r"""`l1l2` solution for ``tau`` with the support and the signs of
+    ``beta``, and its correlation vector, or `None` if there is no such
+    solution.
+
+    On the support `S` with signs `s` the functional is quadratic, and its
+    minimum solves ``(X_S^T X_S + N mu I) b = X_S^T Y - N tau s / 2``.
+    """
+    n, p = data.shape
+    dtype = _float_dtype(data)
+    labels = np.asarray(labels, dtype=dtype).reshape(-1, 1)
+    support = np.flatnonzero(beta)
+    signs = np.sign(np.ravel(beta)[support]).reshape(-1, 1)
+
+    if precomputed.XTY is not None:
+        XTY = precomputed.XTY[support]
+    else:
+        XTY = np.dot(data[:, support].T, labels)
+    rhs = XTY - (n * tau / 2.0) * signs
+
+    try:
+        if precomputed.gram is not None:
+            b = _cholesky_solve(_shifted(
+                precomputed.gram[np.ix_(support, support)], n * mu), rhs)
+        elif len(support) <= n:
+            X_S = data[:, support]
+            b = _cholesky_solve(_shifted(np.dot(X_S.T, X_S), n * mu), rhs)
+        elif mu > 0.0:
+            # more columns than rows: the system is solved in `N` dimensions
+            X_S = data[:, support]
+            tmp = _cholesky_solve(_shifted(np.dot(X_S, X_S.T), n * mu),
+                                  np.dot(X_S, rhs))
+            b = (rhs - np.dot(X_S.T, tmp)) / (n * mu)
+        else:
+            return None
+    except np.linalg.LinAlgError:
+        return None
+    if not np.array_equal(np.sign(b), signs):
+        return None
+
+    beta_next = np.zeros((p, 1), dtype=dtype)
+    beta_next[support] = b
+    corr = correlation(data, labels, beta_next,
+                       precomputed.gram, precomputed.XTY)
+    if kkt_violations(corr, tau, beta_next.ravel() != 0.0).any():
+        return None
+    return beta_next, corr
+
+
+def _shifted(matrix, shift):
+    r"""Copy of the square ``matrix`` with ``shift`` added to the
+    diagonal."""
+    matrix = np.array(matrix, copy=True)
+    matrix.flat[::matrix.shape[0] + 1] += shift
+    return matrix
+
+
+def l1l2_path_batch(data, labels, mu, tau_range, beta=None, kmax=100000,
+                    tolerance=1e-5, precomputed=None):
+    r"""Solution of the `l1l2` regularization path with all the values of
+    ``tau`` advanced together.
+
+    The solutions are kept in a `(P, T)` block and each FISTA step computes
+    the gradient of all the active columns with one matrix-matrix product.
+    Every column has its own convergence test and it is removed from the
+    active block as soon as it converges.
+
+    The output is the same of ``l1l2_path``: the solutions are null
+    (without iterations) for the values of ``tau`` not smaller than the
+    maximum correlation of the empty model, each converged solution is
+    refined in closed form on its own sign pattern (if it keeps the signs
+    and satisfies the optimality conditions), and the least squares
+    solutions are used when ``mu = 0.0`` and a larger value of ``tau`` has
+    more than `N` non-zero values.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    mu : float
+        `l2-norm` penalty.
+    tau_range : array_like of float
+        `l1-norm` penalties in increasing order.
+    beta : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Starting value of the iterations, for all the values of ``tau``.
+        If `None`, then iterations starts from the empty model.
+    kmax : int, optional (default is `1e5`)
+        Maximum number of iterations.
+    tolerance : float, optional (default is `1e-5`)
+        Convergence tolerance.
+    precomputed : PrecomputedData, optional (default is `None`)
+        Precomputed quantities of ``data`` and ``labels``.
+
+    Returns
+    -------
+    beta_path : RegularizationPath
+        `l1l2` solutions with at least one non-zero element.
+
+    """
+    X = np.asarray(data)
+    dtype = _float_dtype(X)
+    Y = np.asarray(labels, dtype=dtype).reshape(-1, 1)
+    n, d = X.shape
+    mu = float(mu)
+    taus = np.asarray(tau_range, dtype=dtype).ravel()
+    T = len(taus)
+
+    if precomputed is None:
+        precomputed = PrecomputedData(data, labels)
+    else:
+        precomputed.check(data, labels)
+    gram, XTY = precomputed.gram, precomputed.XTY
+    if XTY is None and (n > d or gram is not None):
+        XTY = np.dot(X.T, Y)
+
+    # The columns of betas are the rows of the output block
+    coefs = np.zeros((T, d), dtype=dtype)
+    betas = coefs.T
+    if beta is not None:
+        betas[:] = np.reshape(beta, (d, 1))
+
+    # For tau >= tau_null the solution is null, without iterations
+    corr_null = correlation(X, Y, np.zeros(d, dtype=dtype), gram, XTY)
+    null = taus >= np.abs(corr_null).max()
+    betas[:, null] = 0.0
+
+    sigma = precomputed.sigma(mu)
+    if sigma < np.finfo(float).eps:  # is zero...
+        return RegularizationPath(coefs)
+
+    mu_s = mu / sigma
+    taus_s = taus / (2.0 * sigma)
+    nsigma = n * sigma
+
+    # Starting conditions
+    aux_betas = betas.copy()
+    t = np.ones(T, dtype=dtype)
+    active = ~null
+    saturated = np.zeros(T, dtype=bool)
+
+    for k in xrange(kmax):
+        idx = np.flatnonzero(active)
+        if not len(idx):
+            break
+        aux_beta = aux_betas[:, idx]
+
+        # Pre-calculated "heavy" computation, one product for all the taus
+        if gram is not None:
+            precalc = XTY - np.dot(gram, aux_beta)
+        elif n > d:
+            precalc = XTY - np.dot(X.T, np.dot(X, aux_beta))
+        else:
+            precalc = np.dot(X.T, Y - np.dot(X, aux_beta))
+
+        # Soft-Thresholding (a different threshold for each column)
+        value = (precalc / nsigma) + ((1.0 - mu_s) * aux_beta)
+        beta_next = np.sign(value) * np.clip(np.abs(value) - taus_s[idx],
+                                             0, np.inf)
+
+        # FISTA ####################################################
+        beta_diff = (beta_next - betas[:, idx])
+        t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t[idx] * t[idx]))
+        aux_betas[:, idx] = beta_next + ((t[idx] - 1.0) / t_next) * beta_diff
+
+        # Convergence values
+        max_diff = np.abs(beta_diff).max(axis=0)
+        max_coef = np.abs(beta_next).max(axis=0)
+
+        # Values update
+        t[idx] = t_next
+        betas[:, idx] = beta_next
+
+        converged = (max_coef == 0.0) | (max_diff <= tolerance * max_coef)
+        active[idx[converged]] = False
+
+        # Lasso saturation: a converged solution with at least N non-zero
+        # values replaces the solutions of all the smaller taus
+        if mu == 0.0:
+            for j in idx[converged]:
+                if (not saturated[j] and
+                        np.count_nonzero(betas[:, j]) >= n):
+                    saturated[:j] = True
+                    active[:j] = False
+
+    for j in np.flatnonzero(~(null | saturated)):
+        if np.any(betas[:, j]):
+            refined = _fixed_signs_l1l2(X, Y, mu, taus[j], betas[:, j:j + 1],
+                                        precomputed)
+            if refined is not None:
+                betas[:, j:j + 1] = refined[0]
+
+    if saturated.any():
+        if gram is not None:
+            beta_ls = _ridge_gram(gram, XTY, n)
+        else:
+            beta_ls = ridge_regression(data, labels)
+        betas[:, saturated] = beta_ls
+
+    return RegularizationPath(coefs)
+
+
+def l1l2_path_folds(data, labels, mu, tau_range, masks, offsets=None,
+                    scales=None, kmax=100000, tolerance=1e-5):
+    r"""Solution of the `l1l2` regularization paths of several subsets of
+    the rows of the same data matrix (e.g. the training sets of the cross
+    validation splits), advanced together.
+
+    Each value of ``tau`` is solved on all the subsets at once, with a
+    `(P, K)` block of solutions: the residuals of all the subsets are
+    computed with one masked matrix-matrix product, so that each FISTA step
+    reads ``data`` twice, and not twice for each subset.
+    Every subset has its own step size and convergence test, and it is
+    removed from the active block as soon as it converges.
+
+    The subsets are not copied: their (optional) normalization is applied
+    implicitly, as if the rows of the `j`-th one were
+    ``(data - offsets[j]) / scales[j]`` (e.g. with the factors of
+    ``l1l2py.tools.fold_factors``).
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,) or (N, K) ndarray
+        Labels vector, or a labels vector for each subset (e.g. normalized
+        on its rows). The labels of the rows outside a subset are ignored.
+    mu : float
+        `l2-norm` penalty.
+    tau_range : array_like of float
+        `l1-norm` penalties in increasing order.
+    masks : (K, N) ndarray of bool
+        Rows of each subset.
+    offsets : (K, P) ndarray, optional (default is `None`)
+        Value subtracted from the columns of each subset.
+    scales : (K, P) ndarray, optional (default is `None`)
+        Value dividing the (shifted) columns of each subset.
+    kmax : int, optional (default is `1e5`)
+        Maximum number of iterations.
+    tolerance : float, optional (default is `1e-5`)
+        Convergence tolerance.
+
+    Returns
+    -------
+    beta_paths : list of `K` RegularizationPath
+        `l1l2` solutions of each subset, the same of ``l1l2_path`` (up to
+        the convergence tolerance).
+
+    """
+    X = np.asarray(data)
+    dtype = _float_dtype(X)
+    n, d = X.shape
+    mu = float(mu)
+    masks = np.asarray(masks, dtype=bool)
+    K = masks.shape[0]
+
+    W = masks.T.astype(dtype)
+    Y = W * np.asarray(labels, dtype=dtype).reshape(n, -1)
+    O = (np.zeros((d, K), dtype=dtype) if offsets is None
+         else np.asarray(offsets, dtype=dtype).T)
+    S = (np.ones((d, K), dtype=dtype) if scales is None
+         else np.asarray(scales, dtype=dtype).T)
+
+    def fold(j):
+        rows = masks[j]
+        return (X[rows] - O[:, j]) / S[:, j], Y[rows, j]
+
+    # Step size of each subset, from products with X only
+    n_rows = masks.sum(axis=1)
+    sigma = np.array([lipschitz_constant(_fold_operator(X, W[:, j], O[:, j],
+                                                        S[:, j]))
+                      for j in xrange(K)])
+    sigma = (sigma / n_rows + mu).astype(dtype)
+    valid = sigma >= np.finfo(float).eps  # otherwise, void solutions
+    sigma[~valid] = 1.0
+    mu_s = mu / sigma
+    nsigma = n_rows * sigma
+
+    betas = np.zeros((d, K), dtype=dtype)
+    beta_ls = [None] * K
+    saturated = np.zeros(K, dtype=bool)
+    coefs = np.empty((K, len(tau_range), d), dtype=dtype)
+
+    # Taus are used from the biggest (sparser solutions)
+    # to the smallest (less sparse solutions)
+    for i in xrange(len(tau_range) - 1, -1, -1):
+        tau = tau_range[i]
+        tau_s = float(tau) / (2.0 * sigma)
+        aux_betas = betas.copy()
+        t = np.ones(K, dtype=dtype)
+        active = valid & ~saturated
+
+        for k in xrange(kmax):
+            idx = np.flatnonzero(active)
+            if not len(idx):
+                break
+            aux_beta = aux_betas[:, idx]
+
+            # Masked residuals and gradients, one product for all the subsets
+            scaled = aux_beta / S[:, idx]
+            residual = np.dot(X, scaled)
+            residual -= np.einsum('ij,ij->j', O[:, idx], scaled)
+            residual = (Y[:, idx] - residual) * W[:, idx]
+            # (residual^T X)^T reads the rows of X, as the first product
+            precalc = np.dot(residual.T, X).T
+            precalc -= O[:, idx] * residual.sum(axis=0)
+            precalc /= S[:, idx]
+
+            # Soft-Thresholding (a different step for each subset)
+            value = (precalc / nsigma[idx]) + ((1.0 - mu_s[idx]) * aux_beta)
+            beta_next = _soft_threshold(value, tau_s[idx],
+                                        out=np.empty_like(value))
+
+            # FISTA ####################################################
+            beta_diff = (beta_next - betas[:, idx])
+            t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t[idx] * t[idx]))
+            aux_betas[:, idx] = (beta_next +
+                                 ((t[idx] - 1.0) / t_next) * beta_diff)
+
+            # Convergence values
+            max_diff = np.abs(beta_diff).max(axis=0)
+            max_coef = np.abs(beta_next).max(axis=0)
+
+            # Values update
+            t[idx] = t_next
+            betas[:, idx] = beta_next
+
+            converged = (max_coef == 0.0) | (max_diff <= tolerance * max_coef)
+            active[idx[converged]] = False
+
+        for j in xrange(K):
+            if saturated[j]:
+                betas[:, j:j + 1] = beta_ls[j]
+
+            # Lasso saturation: the solutions of the smaller taus are the
+            # least squares one
+            if (mu == 0.0 and not saturated[j] and
+                    np.count_nonzero(betas[:, j]) >= n_rows[j]):
+                beta_ls[j] = ridge_regression(*fold(j))
+                saturated[j] = True
+        coefs[:, i] = betas.T
+
+    return [RegularizationPath(coefs[j]) for j in xrange(K)]
+
+
+def _fold_operator(X, mask, offset, scale):
+    r"""Linear operator of ``X`` with the rows out of the (0, 1) ``mask``
+    set to zero, and ``offset`` subtracted from and ``scale`` dividing the
+    others, without copying ``X``."""
+    from scipy.sparse.linalg import LinearOperator
+
+    def matvec(v):
+        v = np.ravel(v) / scale
+        return (np.dot(X, v) - np.dot(offset, v)) * mask
+
+    def rmatvec(r):
+        r = np.ravel(r) * mask
+        return (np.dot(r, X) - offset * r.sum()) / scale
+
+    def matmat(V):
+        V = V / scale[:, np.newaxis]
+        return (np.dot(X, V) - np.dot(offset, V)) * mask[:, np.newaxis]
+
+    return LinearOperator(X.shape, matvec=matvec, rmatvec=rmatvec,
+                          matmat=matmat, dtype=X.dtype)
 
 
 def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
                         tolerance=1e-5, return_iterations=False,
-                        adaptive=False):
+                        adaptive=False, precomputed=None, workspace=None):
     r"""Implementation of the Fast Iterative Shrinkage-Thresholding Algorithm
     to solve a least squares problem with `l1l2` penalty.
 
@@ -262,6 +1375,13 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     adaptive : bool, optional (default is `False`)
         If `True`, minimization is performed calculating an adaptive step size
         for each iteration.
+    precomputed : PrecomputedData, optional (default is `None`)
+        Precomputed quantities of ``data`` and ``labels``.
+        If the Gram matrix is available, the iterations are performed in the
+        `P`-dimensional space only.
+    workspace : Workspace, optional (default is `None`)
+        Work buffers of the iterations, which may be shared by several
+        solves. If `None`, they are allocated for this solve only.
 
     Returns
     -------
@@ -282,20 +1402,30 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     """
     # Useful quantities
     X = np.asarray(data)
-    Y = np.asarray(labels).reshape(-1, 1)
+    dtype = _float_dtype(X)
+    Y = np.asarray(labels, dtype=dtype).reshape(-1, 1)
     n, d = data.shape
+    # Python scalars do not promote single precision arrays
+    mu, tau = float(mu), float(tau)
 
     # beta starts from 0 and we assume also that the previous value is 0
     if beta is None:
-        beta = np.zeros((d, 1))
+        beta = np.zeros((d, 1), dtype=dtype)
     else:
-        beta = beta.reshape((d, 1))
+        beta = beta.reshape((d, 1)).astype(dtype, copy=False)
 
-    if n > d:
+    gram = XTY = None
+    if precomputed is not None:
+        precomputed.check(data, labels)
+        gram, XTY = precomputed.gram, precomputed.XTY
+    if XTY is None and (n > d or gram is not None):
         XTY = np.dot(X.T, Y)
 
     # First iteration with standard sigma
-    sigma = _sigma(data, mu)
+    if precomputed is not None:
+        sigma = precomputed.sigma(mu)
+    else:
+        sigma = _sigma(data, mu)
     if sigma < np.finfo(float).eps:  # is zero...
         return beta, 0
 
@@ -303,24 +1433,44 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     tau_s = tau / (2.0 * sigma)
     nsigma = n * sigma
 
-    # Starting conditions
-    aux_beta = beta
+    # Starting conditions, in the work buffers (updated in place)
+    if workspace is None:
+        workspace = Workspace()
+    aux_beta = workspace.get('aux_beta', (d, 1), dtype)
+    aux_beta[:] = beta
+    beta = workspace.get('beta', (d, 1), dtype)
+    beta[:] = aux_beta
+    beta_next = workspace.get('beta_next', (d, 1), dtype)
+    beta_diff = workspace.get('beta_diff', (d, 1), dtype)
+    precalc = workspace.get('precalc', (d, 1), dtype)
+    value = workspace.get('value', (d, 1), dtype)
+    if gram is None:
+        residual = workspace.get('residual', (n, 1), dtype)
     t = 1.
 
     for k in xrange(kmax):
         # Pre-calculated "heavy" computation
-        if n > d:
-            precalc = XTY - np.dot(X.T, np.dot(X, aux_beta))
+        if gram is not None:
+            _dot_into(gram, aux_beta, precalc)
+            np.subtract(XTY, precalc, out=precalc)
+        elif n > d:
+            _dot_into(X, aux_beta, residual)
+            _dot_into(X.T, residual, precalc)
+            np.subtract(XTY, precalc, out=precalc)
         else:
-            precalc = np.dot(X.T, Y - np.dot(X, aux_beta))
+            _dot_into(X, aux_beta, residual)
+            np.subtract(Y, residual, out=residual)
+            _dot_into(X.T, residual, precalc)
 
         # Soft-Thresholding
-        value = (precalc / nsigma) + ((1.0 - mu_s) * aux_beta)
-        beta_next = np.sign(value) * np.clip(np.abs(value) - tau_s, 0, np.inf)
+        np.multiply(precalc, 1.0 / nsigma, out=value)
+        np.multiply(aux_beta, 1.0 - mu_s, out=beta_next)
+        value += beta_next
+        _soft_threshold(value, tau_s, out=beta_next)
 
         # ## Adaptive step size #######################################
         if adaptive:
-            beta_diff = (aux_beta - beta_next)
+            np.subtract(aux_beta, beta_next, out=beta_diff)
 
             # Only if there is an increment of the solution
             # we can calculate the adaptive step-size
@@ -328,46 +1478,44 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
                 # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
                 # num = np.dot(beta_diff, grad_diff)
                 tmp = np.dot(X, beta_diff)  # <-- adaptive-step-size drawback
-                num = np.dot(tmp, tmp) / n
+                num = np.vdot(tmp, tmp) / n
 
-                sigma = (num / np.dot(beta_diff, beta_diff))
+                sigma = float(num / np.vdot(beta_diff, beta_diff))
                 mu_s = mu / sigma
                 tau_s = tau / (2.0*sigma)
                 nsigma = n * sigma
 
                 # Soft-Thresholding
-                value = (precalc / nsigma) + ((1.0 - mu_s) * aux_beta)
-                beta_next = np.sign(value) * np.clip(
-                    np.abs(value) - tau_s, 0, np.inf)
+                np.multiply(precalc, 1.0 / nsigma, out=value)
+                np.multiply(aux_beta, 1.0 - mu_s, out=beta_next)
+                value += beta_next
+                _soft_threshold(value, tau_s, out=beta_next)
 
         # FISTA ####################################################
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
-        aux_beta = beta_next + ((t - 1.0) / t_next) * beta_diff
+        np.subtract(beta_next, beta, out=beta_diff)
+        t_next = 0.5 * (1.0 + sqrt(1.0 + 4.0 * t * t))
+        np.multiply(beta_diff, (t - 1.0) / t_next, out=aux_beta)
+        aux_beta += beta_next
 
         # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
+        max_diff = np.abs(beta_diff, out=value).max()
+        max_coef = np.abs(beta_next, out=value).max()
 
-        # Values update
+        # Values update (swapping the buffers)
         t = t_next
-        beta = beta_next
+        beta, beta_next = beta_next, beta
 
         # Stopping rule (exit even if beta_next contains only zeros)
         if max_coef == 0.0 or (max_diff / max_coef) <= tolerance:
             break
 
+    # the workspace may be reused by the next solve
+    beta = beta.copy()
     if return_iterations:
         return beta, k + 1
     return beta
 
 
 def _sigma(matrix, mu):
-    n, p = matrix.shape
-
-    if p > n:
-        tmp = np.dot(matrix, matrix.T)
-    else:
-        tmp = np.dot(matrix.T, matrix)
-
-    return (la.norm(tmp, 2) / n) + mu
+    n = matrix.shape[0]
+    return (lipschitz_constant(matrix) / n) + mu
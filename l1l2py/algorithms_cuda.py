@@ -36,7 +36,8 @@ except ImportError:
 
 
 from .algorithms import (
-    l1l2_regularization, l1_bound, _sigma, ridge_regression, _emergency_log)
+    l1l2_regularization, l1_bound, _sigma, ridge_regression, _emergency_log,
+    RegularizationPath)
 
 
 __all__ = ('l1_bound', 'ridge_regression', 'l1l2_regularization', 'l1l2_path')
@@ -94,7 +95,7 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
 
     Returns
     -------
-    beta_path : list of (P,) or (P, 1) ndarrays
+    beta_path : RegularizationPath
         `l1l2` solutions with at least one non-zero element.
     """
     if input_key is not None:
@@ -140,6 +141,7 @@ def l1l2_path(data, labels, mu, tau_range, beta=None, kmax=100000,
     )
 
     # emergency_log("l1l2_path_cuda [3]\n", emergency_log_file)
-    out_list = [out[i, :] for i in range(n_tau - n_betas_out.value, n_tau)]
+    # the solutions are the last rows of the block, wrapped without copies
+    path = RegularizationPath(out[n_tau - n_betas_out.value:])
     # emergency_log("l1l2_path_cuda [4]\n", emergency_log_file)
-    return out_list
+    return path
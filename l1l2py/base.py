@@ -1,24 +1,229 @@
 # Author: Salvatore Masecchia <salvatore.masecchia@disi.unige.it>
 # License: New-BSD
 
+import warnings
+
 import numpy as np
-from numpy import linalg as la
 from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
+from six import string_types
 
 from sklearn.linear_model.base import LinearModel, _pre_fit
+from sklearn.utils import check_array
+from sklearn.utils.extmath import safe_sparse_dot
+
+from l1l2py.algorithms import _ridge_solve
+
+
+def centered_operator(X, offset, scale=None):
+    """Linear operator of ``X`` with ``offset`` subtracted from each row and
+    (optionally) each column divided by ``scale``.
+
+    The products with the operator (and with its transpose) only need
+    products with ``X``, so ``X`` is implicitly centered (and scaled)
+    without being copied, or densified if sparse.
+    """
+    offset = np.asarray(offset, dtype=X.dtype).ravel()
+    if scale is None:
+        scale = np.ones_like(offset)
+    scale = np.asarray(scale, dtype=X.dtype).ravel()
+
+    def matvec(v):
+        v = np.ravel(v) / scale
+        return X.dot(v) - np.dot(offset, v)
+
+    def rmatvec(r):
+        r = np.ravel(r)
+        return (X.T.dot(r) - offset * r.sum()) / scale
+
+    def matmat(V):
+        V = V / scale[:, np.newaxis]
+        return X.dot(V) - np.dot(offset, V)
+
+    return LinearOperator(X.shape, matvec=matvec, rmatvec=rmatvec,
+                          matmat=matmat, dtype=X.dtype)
+
+
+def implicit_gram(X, offset, scale):
+    """Gram matrix of ``X`` centered with ``offset`` and scaled with
+    ``scale`` (see ``centered_operator``), without copying ``X``."""
+    gram = X.T.dot(X)
+    if sparse.issparse(gram):
+        gram = gram.toarray()
+    gram -= X.shape[0] * np.outer(offset, offset)
+    gram /= np.outer(scale, scale)
+    return gram
+
+
+def implicit_pre_fit(X, y, Xy, precompute, normalize, fit_intercept):
+    """Same as ``_pre_fit`` of scikit-learn, but ``X`` is neither centered
+    nor normalized: it is returned as it is, and the solvers have to center
+    it with ``X_offset`` and scale it with ``X_scale`` (see
+    ``centered_operator`` and ``implicit_gram``).
+    Only ``y`` is copied to be centered.
+
+    If ``precompute`` is `True` or `'auto'` (and ``X`` has more samples than
+    features), the Gram matrix is computed implicitly.
+    A sparse ``X`` is never used with a Gram matrix.
+    """
+    n_samples, n_features = X.shape
+
+    if fit_intercept:
+        X_offset = np.asarray(X.mean(axis=0), dtype=np.float64).ravel()
+        y_offset = y.mean(axis=0)
+        y = y - y_offset
+        if normalize:
+            if sparse.issparse(X):
+                squares = np.asarray(X.multiply(X).sum(axis=0)).ravel()
+            else:
+                squares = np.einsum('ij,ij->j', X, X)
+            X_scale = np.sqrt(np.maximum(
+                squares - n_samples * X_offset ** 2, 0.0))
+            X_scale[X_scale == 0] = 1.0
+        else:
+            X_scale = np.ones(n_features)
+    else:
+        X_offset = np.zeros(n_features)
+        X_scale = np.ones(n_features)
+        y_offset = np.zeros(y.shape[1]) if y.ndim == 2 else 0.
+
+    if sparse.issparse(X):
+        return X, y, X_offset, y_offset, X_scale, False, None
+
+    if isinstance(precompute, string_types) and precompute == 'auto':
+        precompute = n_samples > n_features
+    if (hasattr(precompute, '__array__') and fit_intercept and
+            (normalize or not np.allclose(X_offset, 0))):
+        warnings.warn("Gram matrix was provided but X was centered to fit "
+                      "intercept, or X was normalized : recomputing Gram "
+                      "matrix.", UserWarning)
+        precompute, Xy = True, None
+    if precompute is True:
+        precompute = implicit_gram(X, X_offset, X_scale)
+    if hasattr(precompute, '__array__') and Xy is None:
+        # y is centered, so the offset does not change X^T y
+        Xy = X.T.dot(y)
+        Xy /= X_scale if Xy.ndim == 1 else X_scale[:, np.newaxis]
+
+    return X, y, X_offset, y_offset, X_scale, precompute, Xy
+
+
+def compact_coef(coef):
+    """Indices of the features with a non-zero coefficient (for at least
+    one target) and the coefficients of ``coef`` restricted to them."""
+    coef = np.asarray(coef)
+    nonzero = coef if coef.ndim == 1 else np.any(coef, axis=0)
+    indices = np.flatnonzero(nonzero)
+    return indices, coef[..., indices]
+
+
+def compact_decision_function(X, indices, values, intercept, n_features):
+    """Linear predictions ``X w + intercept``, with ``w`` in compact form
+    (see ``compact_coef``).
+
+    Only the columns ``indices`` of ``X`` are read (and checked), so the
+    cost of the predictions does not depend on the number of features with
+    a null coefficient.
+    """
+    if sparse.issparse(X):
+        if X.format not in ('csr', 'csc'):
+            X = X.tocsr()
+    else:
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError("Expected 2D array, got %dD array instead"
+                             % X.ndim)
+    if X.shape[1] != n_features:
+        raise ValueError("X has %d features per sample; expecting %d"
+                         % (X.shape[1], n_features))
+    X = check_array(X[:, indices], accept_sparse=['csr', 'csc'],
+                    ensure_min_features=0)
+    return safe_sparse_dot(X, values.T, dense_output=True) + intercept
+
+
+class CompactCoefMixin(object):
+    """Mixin for linear models with few non-zero coefficients.
+
+    Assigning ``coef_`` also stores its compact form: the indices of the
+    features with a non-zero coefficient (``coef_indices_``) and their
+    coefficients (``coef_values_``). If ``compact`` is `True`, the dense
+    ``coef_`` is not kept, and it is rebuilt each time it is read.
+
+    ``_compact_decision_function`` computes the predictions from the compact
+    form, reading only the columns of the selected features.
+    Assigning ``coef_`` also drops the support mask cached by the feature
+    selectors (``_support``).
+    """
+
+    @property
+    def coef_(self):
+        coef = self.__dict__.get('_coef')
+        if coef is None and '_coef_shape' in self.__dict__:
+            coef = np.zeros(self._coef_shape, dtype=self.coef_values_.dtype)
+            coef[..., self.coef_indices_] = self.coef_values_
+        return coef
+
+    @coef_.setter
+    def coef_(self, coef):
+        self.__dict__.pop('_support', None)
+        if coef is None:
+            for name in ('coef_indices_', 'coef_values_', '_coef_shape'):
+                self.__dict__.pop(name, None)
+        else:
+            coef = np.asarray(coef)
+            self.coef_indices_, self.coef_values_ = compact_coef(coef)
+            self._coef_shape = coef.shape
+            if self.compact:
+                coef = None
+        self._coef = coef
+
+    def _set_compact_coef(self, indices, values, n_features):
+        """Set the coefficients from their compact form, without building
+        the dense ``coef_`` if ``compact`` is `True`."""
+        values = np.asarray(values)
+        self.__dict__.pop('_support', None)
+        self.coef_indices_, self.coef_values_ = np.asarray(indices), values
+        self._coef_shape = values.shape[:-1] + (n_features, )
+        self._coef = None
+        if not self.compact:
+            self._coef = self.coef_
+
+    def _compact_decision_function(self, X):
+        return compact_decision_function(
+            X, self.coef_indices_, self.coef_values_, self.intercept_,
+            self._coef_shape[-1])
 
 
 class AbstractLinearModel(LinearModel):
-    """Abstract Linear Model. """
+    """Abstract Linear Model.
+
+    If ``_implicit_centering`` is `True`, ``_fit`` receives a linear
+    operator (see ``centered_operator``) and the data matrix is not copied
+    to be centered. A sparse matrix is always centered implicitly.
+    """
+
+    _implicit_centering = False
 
     def fit(self, X, y, *args, **kwargs):
-        X = np.asanyarray(X)
+        if sparse.issparse(X):
+            X = X.tocsc()
+        else:
+            X = np.asanyarray(X)
         y = np.asanyarray(y)
 
-        # Centering Data
-        X, y, X_offset, y_offset, X_scale, precompute, Xy = \
-            _pre_fit(X, y, None, self.precompute, self.normalize,
-                     self.fit_intercept, copy=False)
+        if sparse.issparse(X) or self._implicit_centering:
+            if X.dtype.kind != 'f':
+                X = X.astype(np.float64)
+            X, y, X_offset, y_offset, X_scale, _, _ = \
+                implicit_pre_fit(X, np.asarray(y, dtype=X.dtype), None,
+                                 False, self.normalize, self.fit_intercept)
+            if self.fit_intercept:
+                X = centered_operator(X, X_offset, X_scale)
+        else:
+            # Centering Data
+            X, y, X_offset, y_offset, X_scale, precompute, Xy = \
+                _pre_fit(X, y, None, self.precompute, self.normalize,
+                         self.fit_intercept, copy=False)
 
         # Calling the class-specific train method
         self._fit(X, y, *args, **kwargs)
@@ -31,31 +236,22 @@ class AbstractLinearModel(LinearModel):
 
 
 class RidgeRegression(AbstractLinearModel):
-    """Ridge regression solved as direct method. """
+    """Ridge regression.
+
+    The linear system is solved with a Cholesky factorization, from the
+    SVD or with LSQR, depending on the shape of the data and on ``mu``
+    (see ``l1l2py.algorithms.ridge_solver``), unless ``solver`` is given.
+    The solver actually used is stored in the ``solver_`` attribute.
+    """
 
     def __init__(self, mu=0.0, fit_intercept=True, precompute=False,
-                 normalize=False):
+                 normalize=False, solver='auto'):
         self.mu = mu
         self.fit_intercept = fit_intercept
         self.precompute = precompute
         self.normalize = normalize
+        self.solver = solver
 
     def _fit(self, X, y):
         # Calling the class-specific train method
-        n, d = X.shape
-
-        if n < d:
-            tmp = np.dot(X, X.T)
-            if self.mu != 0.0:
-                tmp += self.mu * n * np.eye(n)
-            tmp = la.pinv(tmp)
-
-            coef_ = np.dot(np.dot(X.T, tmp), y)
-        else:
-            tmp = np.dot(X.T, X)
-            if self.mu != 0.0:
-                tmp += self.mu * n * np.eye(d)
-            tmp = la.pinv(tmp)
-
-            coef_ = np.dot(tmp, np.dot(X.T, y))
-        self.coef_ = coef_
+        self.coef_, self.solver_ = _ridge_solve(X, y, self.mu, self.solver)
@@ -30,7 +30,9 @@ from sklearn.model_selection import GridSearchCV
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import LabelBinarizer
 from sklearn.utils import column_or_1d
+from sklearn.utils.validation import check_is_fitted
 
+from l1l2py.base import CompactCoefMixin
 from l1l2py.regression import L1L2
 
 
@@ -101,10 +103,18 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
         If ``True``, X will be copied; else, it may be overwritten.
 
     tol : float, optional
-        The tolerance for the optimization: if the updates are
-        smaller than ``tol``, the optimization code checks the
-        dual gap for optimality and continues until it is smaller
-        than ``tol``.
+        The tolerance for the optimization, see ``stopping``.
+
+    stopping : 'coef' | 'gap', default 'coef'
+        Stopping rule of the FISTA iterations. If 'coef', they stop when the
+        relative change of the coefficients is smaller than ``tol``.
+        If 'gap', they stop when the duality gap is smaller than ``tol``
+        times the objective of the null solution.
+
+    multi_task : bool, default False
+        Only used with more than two classes, whose one-vs-rest problems are
+        all solved at once. If True, the same features are selected for all
+        the classes (l2,1 penalty on the coefficients of each feature).
 
     warm_start : bool, optional
         When set to ``True``, reuse the solution of the previous call to fit as
@@ -124,6 +134,11 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    compact : bool, optional, default False
+        If ``True``, only the compact form of the coefficients is kept
+        (``coef_indices_`` and ``coef_values_``), and ``coef_`` is rebuilt
+        each time it is read. Useful with many features and few selected.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -133,6 +148,12 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
             (n_targets, n_features)
         ``sparse_coef_`` is a readonly property derived from ``coef_``
 
+    coef_indices_ : array, shape (n_selected,)
+        indices of the features with a non-zero coefficient.
+
+    coef_values_ : array, shape (n_selected,) | (n_targets, n_selected)
+        coefficients of the features in ``coef_indices_``.
+
     intercept_ : float | array, shape (n_targets,)
         independent term in decision function.
 
@@ -145,7 +166,8 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', stopping='coef',
+                 multi_task=False, compact=False):
         self.mu = mu
         self.tau = tau
         self.use_gpu = use_gpu
@@ -165,6 +187,9 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.stopping = stopping
+        self.multi_task = multi_task
+        self.compact = compact
 
     def fit(self, X, y, check_input=True):
         """Fit model with fista.
@@ -201,12 +226,22 @@ class L1L2Classifier(LinearClassifierMixin, L1L2):
 
         return self
 
+    def decision_function(self, X):
+        """Predict confidence scores for samples.
+
+        Only the features with a non-zero coefficient are read.
+        """
+        check_is_fitted(self, 'n_iter_')
+        scores = self._compact_decision_function(X)
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
     @property
     def classes_(self):
         return self._label_binarizer.classes_
 
 
-class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
+class L1L2TwoStepClassifier(CompactCoefMixin, Pipeline,
+                            LinearClassifierMixin):
     r"""L1L2 penalized linear classification with overshrinking correction.
 
     Linear regression with combined L1 and L2 priors as regularizer,
@@ -303,6 +338,11 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    compact : bool, optional, default False
+        If ``True``, only the compact form of the coefficients is kept
+        (``coef_indices_`` and ``coef_values_``), and ``coef_`` is rebuilt
+        each time it is read. Useful with many features and few selected.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -312,6 +352,12 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
             (n_targets, n_features)
         ``sparse_coef_`` is a readonly property derived from ``coef_``
 
+    coef_indices_ : array, shape (n_selected,)
+        indices of the features with a non-zero coefficient.
+
+    coef_values_ : array, shape (n_selected,) | (n_targets, n_selected)
+        coefficients of the features in ``coef_indices_``.
+
     intercept_ : float | array, shape (n_targets,)
         independent term in decision function.
 
@@ -324,13 +370,14 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', compact=False):
         vs = L1L2(mu=mu, tau=tau, use_gpu=use_gpu, threshold=threshold,
                   alpha=alpha, l1_ratio=l1_ratio, fit_intercept=fit_intercept,
                   normalize=normalize, precompute=precompute,
                   max_iter=max_iter, copy_X=copy_X, tol=tol,
                   warm_start=warm_start, positive=positive,
-                  random_state=random_state, selection=selection)
+                  random_state=random_state, selection=selection,
+                  compact=compact)
         mdl = RidgeClassifier(
             alpha=lamda, fit_intercept=fit_intercept,
             normalize=normalize, copy_X=copy_X, max_iter=max_iter,
@@ -357,6 +404,7 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.compact = compact
 
     def fit(self, X, y, **fit_params):
         """Fit Ridge regression model on top of L1L2 selected features.
@@ -397,19 +445,13 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
                 fit_params_['__'.join(('ridge', mapped))] = fit_params[param]
         super(L1L2TwoStepClassifier, self).fit(X, y, **fit_params_)
 
-        # self.coef_ contains a zero vector apart from coef_ selected by Ridge
-        l1l2_coef_ = self.steps[0][1].coef_
-        ridge_coef_ = self.steps[1][1].coef_
-        selected_ = np.nonzero(l1l2_coef_)[0]
-        coef_ = np.zeros_like(l1l2_coef_)
-        coef_[selected_] = ridge_coef_
-        self.coef_ = coef_
-
-        if self.classes_.shape[0] > 2:
-            ndim = self.classes_.shape[0]
-        else:
-            ndim = 1
-        self.coef_ = self.coef_.reshape(ndim, -1)
+        # coef_ is null apart from the coefficients selected by Ridge,
+        # with one row per class (only one for two classes)
+        support = self.steps[0][1].get_support()
+        self._set_compact_coef(np.flatnonzero(support),
+                               np.atleast_2d(self.steps[1][1].coef_),
+                               support.shape[0])
+        self.intercept_ = self.steps[1][1].intercept_
 
         return self
 
@@ -434,7 +476,8 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
             normalize='normalize', precompute='precompute',
             max_iter='max_iter', copy_X='copy_X', tol='tol',
             warm_start='warm_start', positive='positive',
-            random_state='random_state', selection='selection')
+            random_state='random_state', selection='selection',
+            compact='compact')
         for mapped, param in six.iteritems(map_l1l2):
             if kwargs.get(param, None) is not None:
                 kwargs['__'.join(('l1l2', mapped))] = kwargs[param]
@@ -447,6 +490,16 @@ class L1L2TwoStepClassifier(Pipeline, LinearClassifierMixin):
                 kwargs['__'.join(('ridge', mapped))] = kwargs[param]
         return super(L1L2TwoStepClassifier, self).set_params(**kwargs)
 
+    def decision_function(self, X):
+        """Predict confidence scores for samples.
+
+        The selected columns of X are multiplied by ``coef_values_`` at
+        once, without the ``transform`` of the L1L2 step.
+        """
+        check_is_fitted(self, 'coef_values_')
+        scores = self._compact_decision_function(X)
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
     def predict(self, X):
         return LinearClassifierMixin.predict(self, X)
 
@@ -30,8 +30,17 @@ double optimization variable selection.
 from __future__ import print_function
 import numpy as np
 
+from six import string_types
 from six.moves import xrange, zip as izip
 from l1l2py.algorithms import ridge_regression, l1l2_regularization
+from l1l2py.algorithms import ridge_path, PrecomputedData, IncrementalRidge
+from l1l2py.algorithms import _ridge_gram_path, l1l2_path_folds
+from l1l2py import tools
+
+try:
+    from sklearn.externals.joblib import Parallel, delayed
+except ImportError:
+    from joblib import Parallel, delayed
 
 
 __all__ = ('model_selection', 'minimal_model', 'nested_models')
@@ -43,7 +52,8 @@ def model_selection(
     cv_splits, cv_error_function, error_function,
     data_normalizer=None, labels_normalizer=None,
     sparse=False, regularized=True, return_predictions=False,
-        algorithm_version='CPU', shuffle_labels=False, random_seed=None):
+        algorithm_version='CPU', shuffle_labels=False, random_seed=None,
+        batch=False, n_jobs=1, backend=None, warm_start=False):
     r"""Complete model selection procedure.
 
     It executes the two stages implemented in ``minimal_model`` and
@@ -65,6 +75,9 @@ def model_selection(
         meaning of each parameter. The **Parameters** section
         describes only the ``sparse`` and ``regularized`` parameters.
 
+    The data matrices (and the labels) may also be given as paths of
+    ``.npy`` files, which are memory mapped read-only.
+
     Parameters
     ----------
     sparse : bool, optional (default is `False`)
@@ -104,6 +117,9 @@ def model_selection(
             training set.
 
     """
+    data, labels = _as_dataset(data), _as_dataset(labels)
+    test_data = _as_dataset(test_data)
+
     if shuffle_labels:
         # Use a seed to initialize the random number generator
         np.random.seed(random_seed)
@@ -116,7 +132,8 @@ def model_selection(
                                tau_range, lambda_range,
                                cv_splits, cv_error_function,
                                data_normalizer, labels_normalizer,
-                               algorithm_version=algorithm_version)
+                               algorithm_version=algorithm_version,
+                               batch=batch, n_jobs=n_jobs, backend=backend)
     out = dict(izip(('kcv_err_ts', 'kcv_err_tr'), stage1_out))
 
     # KCV MINIMUM SELECTION
@@ -133,7 +150,8 @@ def model_selection(
                                mu_range, out['tau_opt'], out['lambda_opt'],
                                error_function,
                                data_normalizer, labels_normalizer,
-                               return_predictions)
+                               return_predictions, warm_start=warm_start,
+                               n_jobs=n_jobs, backend=backend)
 
     keys = ['beta_list', 'selected_list', 'err_ts_list', 'err_tr_list']
     if return_predictions:
@@ -145,6 +163,38 @@ def model_selection(
     return out
 
 
+def _as_dataset(data):
+    r"""Strings are paths of ``.npy`` files, memory mapped read-only
+    (see ``numpy.load``). Other inputs are returned as they are."""
+    if isinstance(data, string_types):
+        return np.load(data, mmap_mode='r')
+    return data
+
+
+def _take_rows(data, idxs):
+    r"""Rows ``idxs`` of ``data``.
+
+    Increasing contiguous indexes give a view (of the memory map, for a
+    memory mapped ``data``), otherwise the rows are gathered in a new array.
+    """
+    idxs = np.asarray(idxs)
+    if idxs.dtype == np.bool_:
+        idxs = np.flatnonzero(idxs)
+
+    if len(idxs) and np.all(np.diff(idxs) == 1):
+        return data[idxs[0]:idxs[-1] + 1]
+    return np.asarray(data[idxs])
+
+
+def _writable_rows(data, rows):
+    r"""``rows`` of ``data``, copied only if they are a view of ``data`` or
+    if they are not floating point numbers."""
+    if (rows.dtype.kind == 'f' and rows.flags.writeable and
+            not np.may_share_memory(data, rows)):
+        return rows
+    return np.array(rows, dtype=np.result_type(rows.dtype, np.float32))
+
+
 def _minimum_selection(tau_idxs, lambda_idxs, sparse=False, regularized=False):
     r"""Selection of the miminum error coordinates.
 
@@ -166,7 +216,8 @@ def _minimum_selection(tau_idxs, lambda_idxs, sparse=False, regularized=False):
 def minimal_model(data, labels, mu, tau_range, lambda_range,
                   cv_splits, error_function,
                   data_normalizer=None, labels_normalizer=None, input_key=None,
-                  algorithm_version='CPU'):
+                  algorithm_version='CPU', batch=False, n_jobs=1,
+                  backend=None):
     r"""Minimal model selection.
 
     Given a supervised training set (``data`` and ``labels``), for a fixed
@@ -193,10 +244,13 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
 
     Parameters
     ----------
-    data : (N, P) ndarray
-        Data matrix.
-    labels : (N,)  or (N, 1) ndarray
-        Labels vector.
+    data : (N, P) ndarray or str
+        Data matrix, or path of a ``.npy`` file memory mapped read-only.
+        The rows of each split are gathered once, or taken as a view if
+        they are contiguous, so that a memory mapped matrix is never loaded
+        as a whole.
+    labels : (N,)  or (N, 1) ndarray or str
+        Labels vector, or path of a ``.npy`` file.
     mu : float
         Minimum `l2` norm penalty (`l1l2` functional).
     tau_range : array_like of `T` floats
@@ -212,6 +266,25 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
         Data normalization function.
     labels_normalizer : function object, optional (default is `None`)
         Labels normalization function.
+    batch : bool or 'folds', optional (default is `False`)
+        If `True`, on each split all the values of ``tau`` are solved
+        together with one matrix-matrix product per iteration
+        (see ``l1l2py.algorithms.l1l2_path_batch``).
+        If `'folds'`, each value of ``tau`` is solved on all the splits
+        together, reading ``data`` once per iteration for all of them
+        (see ``l1l2py.algorithms.l1l2_path_folds``); ``data_normalizer``
+        must be `None`, ``tools.center`` or ``tools.standardize``, and the
+        splits must not repeat the samples.
+        Only available with the `'CPU'` algorithm version.
+    n_jobs : int, optional (default is `1`)
+        Number of cross validation splits evaluated in parallel
+        (`-1` means all the CPUs). With more than one job, each split
+        computes the solutions on the whole ``tau_range``, and the errors
+        are merged in the order of ``cv_splits``.
+    backend : str, optional (default is `None`)
+        ``joblib`` backend of the parallel jobs. With process-based
+        backends, big arrays are shared with the workers through read-only
+        memory maps. With `'threading'` the data are shared directly.
 
     Returns
     -------
@@ -231,6 +304,12 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
         the given data splits.
 
     """
+    data, labels = _as_dataset(data), _as_dataset(labels)
+
+    if batch == 'folds' and algorithm_version != 'CPU':
+        raise ValueError("batch='folds' is only available with the 'CPU' "
+                         "algorithm version")
+
     # Load the correct version of the algorithm
     if algorithm_version == 'CPU':
         from l1l2py.algorithms import l1l2_path
@@ -239,49 +318,54 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
     else:
         raise ValueError('Unknown algorithm version')
 
-    err_ts = list()
-    err_tr = list()
-    max_tau_num = len(tau_range)
-
-    for train_idxs, test_idxs in cv_splits:
-        # First create a view and then normalize (eventually)
-        data_tr, data_ts = data[train_idxs, :], data[test_idxs, :]
-        if data_normalizer is not None:
-            data_tr, data_ts = data_normalizer(data_tr, data_ts)
-
-        # labels_tr, labels_ts = labels[train_idxs, :], labels[test_idxs, :]
-        labels_tr, labels_ts = labels[train_idxs], labels[test_idxs]
-        if labels_normalizer is not None:
-            labels_tr, labels_ts = labels_normalizer(labels_tr, labels_ts)
-
-        # Builds a classifier for each value of tau
-        beta_casc = l1l2_path(
-            data_tr, labels_tr, mu, tau_range[:max_tau_num],
-            input_key=input_key)
-
-        if len(beta_casc) == 0:
-            raise ValueError("the given range of 'tau' values produces all "
-                             "void solutions with the given data splits")
-
-        max_tau_num = min(max_tau_num, len(beta_casc))
-        _err_ts = np.empty((max_tau_num, len(lambda_range)))
-        _err_tr = np.empty_like(_err_ts)
-
-        # For each sparse model builds a
-        # rls classifier for each value of lambda
-        for j, beta in izip(xrange(max_tau_num), beta_casc):
-            selected = (beta.flat != 0)
-            for k, lam in enumerate(lambda_range):
-                beta = ridge_regression(data_tr[:, selected], labels_tr, lam)
-
-                prediction = np.dot(data_ts[:, selected], beta)
-                _err_ts[j, k] = error_function(labels_ts, prediction)
-
-                prediction = np.dot(data_tr[:, selected], beta)
-                _err_tr[j, k] = error_function(labels_tr, prediction)
-
-        err_ts.append(_err_ts)
-        err_tr.append(_err_tr)
+    # The standard normalizers are evaluated on each split from the
+    # statistics of the whole data
+    data_statistics = None
+    if data_normalizer in (tools.center, tools.standardize):
+        data_statistics = tools.column_statistics(data)
+
+    fold_params = dict(
+        mu=mu, lambda_range=lambda_range, error_function=error_function,
+        data_normalizer=data_normalizer, labels_normalizer=labels_normalizer,
+        data_statistics=data_statistics,
+        l1l2_path=l1l2_path, path_params=dict(input_key=input_key),
+        share_precomputed=(algorithm_version == 'CPU'))
+    if algorithm_version == 'CPU' and batch != 'folds':
+        fold_params['path_params']['batch'] = batch
+
+    # The paths of all the splits may be computed at once
+    cv_splits = list(cv_splits)
+    beta_paths = [None] * len(cv_splits)
+    if batch == 'folds':
+        beta_paths = _fold_paths(data, labels, mu, tau_range, cv_splits,
+                                 data_normalizer, labels_normalizer,
+                                 data_statistics)
+
+    if n_jobs == 1:
+        err_ts = list()
+        err_tr = list()
+        max_tau_num = len(tau_range)
+
+        for (train_idxs, test_idxs), beta_casc in izip(cv_splits, beta_paths):
+            _err_ts, _err_tr = _fold_errors(
+                data, labels, train_idxs, test_idxs,
+                tau_range=tau_range[:max_tau_num], beta_casc=beta_casc,
+                **fold_params)
+            max_tau_num = min(max_tau_num, len(_err_ts))
+
+            err_ts.append(_err_ts)
+            err_tr.append(_err_tr)
+    else:
+        # The folds are independent: each one computes the whole path.
+        # Big arrays are memory mapped (read-only) by the workers.
+        out = Parallel(n_jobs=n_jobs, backend=backend)(
+            delayed(_fold_errors)(data, labels, train_idxs, test_idxs,
+                                  tau_range=tau_range, beta_casc=beta_casc,
+                                  **fold_params)
+            for (train_idxs, test_idxs), beta_casc in izip(cv_splits,
+                                                           beta_paths))
+        err_ts, err_tr = [list(x) for x in izip(*out)]
+        max_tau_num = min(len(a) for a in err_ts)
 
     # cut columns and computes the mean
     err_ts = np.asarray([a[:max_tau_num] for a in err_ts]).mean(axis=0)
@@ -289,10 +373,134 @@ def minimal_model(data, labels, mu, tau_range, lambda_range,
     return err_ts, err_tr
 
 
+def _fold_paths(data, labels, mu, tau_range, cv_splits, data_normalizer,
+                labels_normalizer, data_statistics):
+    r"""`l1l2` paths of all the cross validation splits, computed together
+    by ``l1l2_path_folds`` on the (implicitly normalized) whole ``data``.
+    """
+    n, p = data.shape
+    masks = np.zeros((len(cv_splits), n), dtype=bool)
+    Y = np.zeros((n, len(cv_splits)))
+    offsets = scales = None
+    if data_statistics is not None:
+        offsets = np.empty((len(cv_splits), p))
+        scales = np.ones((len(cv_splits), p))
+    elif data_normalizer is not None:
+        raise ValueError("batch='folds' needs data_normalizer to be None, "
+                         "tools.center or tools.standardize")
+
+    for j, (train_idxs, test_idxs) in enumerate(cv_splits):
+        masks[j, train_idxs] = True
+        if data_statistics is not None:
+            mean, std = tools.fold_factors(data_statistics,
+                                           _take_rows(data, test_idxs))
+            offsets[j] = mean
+            if data_normalizer is tools.standardize:
+                scales[j] = std
+
+        labels_tr = _take_rows(labels, train_idxs)
+        if labels_normalizer is not None:
+            labels_tr, _ = labels_normalizer(labels_tr,
+                                             _take_rows(labels, test_idxs))
+        Y[train_idxs, j] = np.ravel(labels_tr)
+
+    return l1l2_path_folds(data, Y, mu, tau_range, masks, offsets, scales)
+
+
+def _fold_errors(data, labels, train_idxs, test_idxs, mu, tau_range,
+                 lambda_range, error_function, data_normalizer,
+                 labels_normalizer, data_statistics, l1l2_path, path_params,
+                 share_precomputed, beta_casc=None):
+    r"""Errors of *Stage I* on a cross validation split.
+
+    Returns the test and training errors, as two (< T, L) ndarrays with a
+    row for each valid value of ``tau``.
+    If ``data_statistics`` are given (see ``tools.column_statistics``),
+    ``data_normalizer`` is either ``tools.center`` or ``tools.standardize``
+    and it is applied in place.
+    If ``share_precomputed``, the quantities precomputed on the training
+    data are passed also to ``l1l2_path``.
+    If ``beta_casc`` is given, it is the path of the split (see
+    ``_fold_paths``) and ``l1l2_path`` is not called.
+    """
+    # First take the rows and then normalize (eventually)
+    data_tr = _take_rows(data, train_idxs)
+    data_ts = _take_rows(data, test_idxs)
+    if data_statistics is not None:
+        mean, std = tools.fold_factors(data_statistics, data_ts)
+        data_tr = _writable_rows(data, data_tr)
+        data_ts = _writable_rows(data, data_ts)
+        for rows in (data_tr, data_ts):
+            rows -= mean
+            if data_normalizer is tools.standardize:
+                rows /= std
+    elif data_normalizer is not None:
+        data_tr, data_ts = data_normalizer(data_tr, data_ts)
+
+    labels_tr = _take_rows(labels, train_idxs)
+    labels_ts = _take_rows(labels, test_idxs)
+    if labels_normalizer is not None:
+        labels_tr, labels_ts = labels_normalizer(labels_tr, labels_ts)
+
+    # Quantities shared by all the values of tau and lambda on the split
+    precomputed = PrecomputedData(data_tr, labels_tr)
+    if share_precomputed:
+        path_params = dict(path_params, precomputed=precomputed)
+
+    # Builds a classifier for each value of tau
+    if beta_casc is None:
+        beta_casc = l1l2_path(data_tr, labels_tr, mu, tau_range,
+                              **path_params)
+
+    if len(beta_casc) == 0:
+        raise ValueError("the given range of 'tau' values produces all "
+                         "void solutions with the given data splits")
+
+    tau_num = min(len(tau_range), len(beta_casc))
+    _err_ts = np.empty((tau_num, len(lambda_range)))
+    _err_tr = np.empty_like(_err_ts)
+
+    # For each sparse model builds a
+    # rls classifier for each value of lambda
+    n_tr = data_tr.shape[0]
+    ridge = IncrementalRidge(data_tr, labels_tr, lambda_range, precomputed)
+    for j in xrange(tau_num):
+        selected = beta_casc.support(j)
+        data_tr_sel = data_tr[:, selected]
+        data_ts_sel = data_ts[:, selected]
+
+        # Consecutive supports are (almost) nested: the factors of the
+        # previous one are updated, unless the columns are dependent
+        betas = None
+        tall = n_tr >= data_tr_sel.shape[1]
+        if tall:
+            try:
+                betas = ridge.solve(selected)
+            except np.linalg.LinAlgError:
+                pass
+
+        # Otherwise, one decomposition of the selected columns
+        if betas is None and tall and precomputed.gram is not None:
+            betas = _ridge_gram_path(
+                precomputed.gram[np.ix_(selected, selected)],
+                precomputed.XTY[selected], n_tr, lambda_range)
+        elif betas is None:
+            betas = ridge_path(data_tr_sel, labels_tr, lambda_range)
+
+        predictions_ts = np.matmul(data_ts_sel, betas)
+        predictions_tr = np.matmul(data_tr_sel, betas)
+        for k in xrange(len(lambda_range)):
+            _err_ts[j, k] = error_function(labels_ts, predictions_ts[k])
+            _err_tr[j, k] = error_function(labels_tr, predictions_tr[k])
+
+    return _err_ts, _err_tr
+
+
 def nested_models(data, labels, test_data, test_labels,
                   mu_range, tau, lambda_, error_function,
                   data_normalizer=None, labels_normalizer=None,
-                  return_predictions=False):
+                  return_predictions=False, warm_start=False, n_jobs=1,
+                  backend=None):
     r"""The function generates the models with the (almost) nested lists of
     selected variables.
 
@@ -311,12 +519,12 @@ def nested_models(data, labels, test_data, test_labels,
 
     Parameters
     ----------
-    data : (N, P) ndarray
-        Data matrix.
-    labels : (N,)  or (N, 1) ndarray
-        Labels vector.
-    test_data : (T, P) ndarray
-        Test set matrix.
+    data : (N, P) ndarray or str
+        Data matrix, or path of a ``.npy`` file memory mapped read-only.
+    labels : (N,)  or (N, 1) ndarray or str
+        Labels vector, or path of a ``.npy`` file.
+    test_data : (T, P) ndarray or str
+        Test set matrix, or path of a ``.npy`` file.
     test_labels : (T,)  or (T, 1) ndarray
         Test set labels vector.
     mu_range : array_like of M floats
@@ -331,6 +539,18 @@ def nested_models(data, labels, test_data, test_labels,
         Data normalization function.
     labels_normalizer : function object, optional (default is `None`)
         Labels normalization function.
+    return_predictions : bool, optional (default is `False`)
+        If `True`, the function returns also the prediction vectors.
+    warm_start : bool, optional (default is `False`)
+        If `True`, the models are computed serially and the `l1l2` solution
+        for each value of ``mu`` is the starting point for the next one.
+        Otherwise, the models are independent and they may be computed in
+        parallel (see ``n_jobs``).
+    n_jobs : int, optional (default is `1`)
+        Number of values of ``mu`` evaluated in parallel
+        (`-1` means all the CPUs). Ignored if ``warm_start`` is `True`.
+    backend : str, optional (default is `None`)
+        ``joblib`` backend of the parallel jobs.
 
     Returns
     -------
@@ -356,46 +576,70 @@ def nested_models(data, labels, test_data, test_labels,
         given data.
 
     """
+    data, labels = _as_dataset(data), _as_dataset(labels)
+    test_data = _as_dataset(test_data)
+
     if data_normalizer is not None:
         data, test_data = data_normalizer(data, test_data)
 
     if labels_normalizer is not None:
         labels, test_labels = labels_normalizer(labels, test_labels)
 
-    beta_list = list()
-    selected_list = list()
-    err_ts_list = list()
-    err_tr_list = list()
+    # Only the step size depends on mu
+    precomputed = PrecomputedData(data, labels)
+    model_params = dict(test_data=test_data, test_labels=test_labels,
+                        tau=tau, lambda_=lambda_,
+                        error_function=error_function,
+                        precomputed=precomputed)
+
+    if warm_start:
+        out = list()
+        beta = None
+        for mu in mu_range:
+            out.append(_nested_model(labels, mu, beta=beta, **model_params))
+            beta = out[-1][-1]
+    elif n_jobs == 1:
+        out = [_nested_model(labels, mu, **model_params) for mu in mu_range]
+    else:
+        out = Parallel(n_jobs=n_jobs, backend=backend)(
+            delayed(_nested_model)(labels, mu, **model_params)
+            for mu in mu_range)
 
-    if return_predictions:
-        prediction_ts_list = list()
-        prediction_tr_list = list()
+    (beta_list, selected_list, err_ts_list, err_tr_list,
+     prediction_ts_list, prediction_tr_list) = [
+        list(x) for x in izip(*out)][:6]
 
-    for mu in mu_range:
-        beta = l1l2_regularization(data, labels, mu, tau)
-        selected = (beta.flat != 0)
+    if return_predictions:
+        return (beta_list, selected_list, err_ts_list, err_tr_list,
+                prediction_ts_list, prediction_tr_list)
+    else:
+        return beta_list, selected_list, err_ts_list, err_tr_list
 
-        if not selected.any():
-            raise ValueError("the given value of 'tau' produces a void "
-                             "solution with the given data")
 
-        beta = ridge_regression(data[:, selected], labels, lambda_)
+def _nested_model(labels, mu, test_data, test_labels, tau, lambda_,
+                  error_function, precomputed, beta=None):
+    r"""Model of *Stage II* for a value of ``mu``.
 
-        beta_list.append(beta)
-        selected_list.append(selected)
+    The training data are ``precomputed.data`` and ``beta`` is the starting
+    point of the `l1l2` iterations.
+    Returns the model, the selected variables, the test and training errors,
+    the test and training predictions and the `l1l2` solution.
+    """
+    data = precomputed.data
+    beta_l1l2 = l1l2_regularization(data, labels, mu, tau, beta=beta,
+                                    precomputed=precomputed)
+    selected = (beta_l1l2.flat != 0)
 
-        prediction_ts = np.dot(test_data[:, selected], beta)
-        err_ts_list.append(error_function(test_labels, prediction_ts))
+    if not selected.any():
+        raise ValueError("the given value of 'tau' produces a void "
+                         "solution with the given data")
 
-        prediction_tr = np.dot(data[:, selected], beta)
-        err_tr_list.append(error_function(labels, prediction_tr))
+    beta = ridge_regression(data[:, selected], labels, lambda_)
 
-        if return_predictions:
-            prediction_ts_list.append(prediction_ts)
-            prediction_tr_list.append(prediction_tr)
+    prediction_ts = np.dot(test_data[:, selected], beta)
+    prediction_tr = np.dot(data[:, selected], beta)
 
-    if return_predictions:
-        return (beta_list, selected_list, err_ts_list, err_tr_list,
-                prediction_ts_list, prediction_tr_list)
-    else:
-        return beta_list, selected_list, err_ts_list, err_tr_list
+    return (beta, selected,
+            error_function(test_labels, prediction_ts),
+            error_function(labels, prediction_tr),
+            prediction_ts, prediction_tr, beta_l1l2)
@@ -1,4 +1,8 @@
+import numbers
+
 import numpy as np
+from six.moves import xrange
+
 
 def _check_random_state(seed):
     """Turn seed into a np.random.RandomState instance
@@ -10,46 +14,47 @@ def _check_random_state(seed):
     """
     if seed is None or seed is np.random:
         return np.random.mtrand._rand
-    if isinstance(seed, int):
+    if isinstance(seed, numbers.Integral):
         return np.random.RandomState(seed)
     if isinstance(seed, np.random.RandomState):
         return seed
     raise ValueError('%r cannot be used to seed a numpy.random.RandomState'
                      ' instance' % seed)
 
+
 class KFold(object):
     r"""k-fold cross validation splits.
 
-    Given a list of labels, the function produces a list of ``k`` splits.
-    Each split is a pair of tuples containing the indexes of the training set
-    and the indexes of the test set.
+    Given the number of samples, the iterator produces ``k`` splits.
+    Each split is a pair of integer arrays containing the indexes of the
+    training set and the indexes of the test set.
+    The splits are generated lazily, from a single random permutation of the
+    samples.
 
     Parameters
     ----------
-    labels : array_like, shape (N,)
-        Data labels.
-    k : int, greater than `0`
+    n : int
+        Number of samples.
+    k : int, greater than `1`
         Number of splits.
-    rseed : int, optional (default is `0`)
-        Random seed.
-
-    Returns
-    -------
-    splits : list of ``k`` tuples
-        Each tuple contains two lists with the training set and test set
-        indexes.
+    random_state : int, RandomState or None, optional (default is `None`)
+        Random seed or random number generator. With an int, each iteration
+        produces the same splits. With `None`, the global ``numpy.random``
+        generator is used.
 
     Raises
     ------
     ValueError
-        If ``k`` is less than 2 or greater than `N`.
+        If ``k`` is less than 2 or greater than `n`.
 
     Examples
     --------
-    >>> labels = range(10)
-    >>> l1l2py.tools.kfold_splits(labels, 2)
-    [([7, 1, 3, 6, 8], [9, 4, 0, 5, 2]), ([9, 4, 0, 5, 2], [7, 1, 3, 6, 8])]
-    >>> l1l2py.tools.kfold_splits(labels, 1)
+    >>> splits = list(l1l2py.cross_val.KFold(10, 2, random_state=0))
+    >>> len(splits)
+    2
+    >>> splits[0]
+    (array([6, 7, 3, 0, 5]), array([2, 8, 4, 9, 1]))
+    >>> list(l1l2py.cross_val.KFold(10, 1))
     Traceback (most recent call last):
         ...
     ValueError: 'k' must be greater than one and smaller or equal than the number of samples
@@ -58,48 +63,50 @@ class KFold(object):
     def __init__(self, n, k, random_state=None):
         self.n = n
         self.k = k
-        self.random_state = _check_random_state(random_state)
-        
+        self.random_state = random_state
+
     def __iter__(self):
         if not (2 <= self.k <= self.n):
-            raise ValueError("'k' must be greater than one and smaller or equal "
-                             "than the number of samples")
+            raise ValueError("'k' must be greater than one and smaller or "
+                             "equal than the number of samples")
 
-        indexes = range(self.n)
-        self.random_state.shuffle(indexes)
+        random_state = _check_random_state(self.random_state)
+        indexes = random_state.permutation(self.n)
 
         for split in KFold._splits(indexes, self.k):
             yield split
-    
+
     @staticmethod
     def _splits(indexes, k):
-        """Splits the 'indexes' list in input in k disjoint chunks."""
+        """Splits the 'indexes' array in input in k disjoint chunks."""
         for start, end in KFold._split_dimensions(len(indexes), k):
-            yield (indexes[:start] + indexes[end:], indexes[start:end])
-                
+            yield (np.concatenate((indexes[:start], indexes[end:])),
+                   indexes[start:end])
+
     @staticmethod
     def _split_dimensions(num_items, num_splits):
         """Generator wich gives the pairs of indexes to split 'num_items' data
            in 'num_splits' chunks."""
         start = 0
         remaining_items = float(num_items)
-    
+
         for remaining_splits in xrange(num_splits, 0, -1):
             split_size = int(round(remaining_items / remaining_splits))
             end = start + split_size
-    
+
             yield start, end
-    
+
             start = end
             remaining_items -= split_size
-            
+
     def __len__(self):
         return self.k
-    
+
+
 class StratifiedKFold(KFold):
-    """Sstratified k-fold cross validation splits.
+    """Stratified k-fold cross validation splits.
 
-    This function is a variation of ``kfold_splits``, which
+    This iterator is a variation of ``KFold``, which
     returns stratified splits. The divisions are made by preserving
     the percentage of samples for each class, assuming that the problem
     is binary.
@@ -108,16 +115,10 @@ class StratifiedKFold(KFold):
     ----------
     labels : array_like, shape (N,)
         Data labels (usually contains only 1s and -1s).
-    k : int, greater than `0`
+    k : int, greater than `1`
         Number of splits.
-    rseed : int, optional (default is `0`)
-        Random seed.
-
-    Returns
-    -------
-    splits : list of ``k`` tuples
-        Each tuple contains two lists with the training set and test set
-        indexes.
+    random_state : int, RandomState or None, optional (default is `None`)
+        Random seed or random number generator (see ``KFold``).
 
     Raises
     ------
@@ -130,45 +131,136 @@ class StratifiedKFold(KFold):
     Examples
     --------
     >>> labels = range(10)
-    >>> l1l2py.tools.stratified_kfold_splits(labels, 2)
+    >>> list(l1l2py.cross_val.StratifiedKFold(labels, 2))
     Traceback (most recent call last):
         ...
     ValueError: 'labels' must contains only two class labels
     >>> labels = [1, 1, 1, 1, 1, 1, -1, -1, -1, -1]
-    >>> l1l2py.tools.stratified_kfold_splits(labels, 2)
-    [([8, 9, 5, 2, 1], [7, 6, 3, 0, 4]), ([7, 6, 3, 0, 4], [8, 9, 5, 2, 1])]
-    >>> l1l2py.tools.stratified_kfold_splits(labels, 1)
-    Traceback (most recent call last):
-        ...
-    ValueError: 'k' must be greater than one and smaller or equal than number of positive and negative samples
+    >>> splits = list(l1l2py.cross_val.StratifiedKFold(labels, 2, 0))
+    >>> splits[0]
+    (array([7, 6, 4, 5, 3]), array([8, 9, 0, 2, 1]))
 
     """
     def __init__(self, labels, k, random_state=None):
         self.labels = labels
         self.k = k
-        self.random_state = _check_random_state(random_state)
-        
+        self.random_state = random_state
+
     def __iter__(self):
-        classes = np.unique(self.labels)
+        labels = np.asarray(self.labels)
+        classes = np.unique(labels)
         if classes.size != 2:
             raise ValueError("'labels' must contains only two class labels")
-    
-        n_indexes = (np.where(self.labels == classes[0])[0]).tolist()
-        p_indexes = (np.where(self.labels == classes[1])[0]).tolist()
-    
+
+        n_indexes = np.flatnonzero(labels == classes[0])
+        p_indexes = np.flatnonzero(labels == classes[1])
+
         if not (2 <= self.k <= min(len(n_indexes), len(p_indexes))):
-            raise ValueError("'k' must be greater than oen and smaller or equal "
-                             "than number of positive and negative samples")
-    
-        self.random_state.shuffle(n_indexes)
-        n_splits = list(KFold._splits(n_indexes, self.k))
-        
-        self.random_state.shuffle(p_indexes)
-        p_splits = list(KFold._splits(p_indexes, self.k))
-    
+            raise ValueError("'k' must be greater than one and smaller or "
+                             "equal than number of positive and negative "
+                             "samples")
+
+        random_state = _check_random_state(self.random_state)
+        n_splits = KFold._splits(random_state.permutation(n_indexes), self.k)
+        p_splits = KFold._splits(random_state.permutation(p_indexes), self.k)
+
         for ns, ps in zip(n_splits, p_splits):
-            train = ns[0] + ps[0]
-            test = ns[1] + ps[1]
-            yield (train, test)
-    
-    
+            yield (np.concatenate((ns[0], ps[0])),
+                   np.concatenate((ns[1], ps[1])))
+
+
+class RepeatedKFold(KFold):
+    r"""Repeated k-fold cross validation splits.
+
+    The ``k`` splits of ``KFold`` are repeated ``n_repeats`` times, each
+    time on a different random permutation of the samples.
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+    k : int, greater than `1`
+        Number of splits of each repetition.
+    n_repeats : int, optional (default is `10`)
+        Number of repetitions.
+    random_state : int, RandomState or None, optional (default is `None`)
+        Random seed or random number generator (see ``KFold``).
+
+    Examples
+    --------
+    >>> len(list(l1l2py.cross_val.RepeatedKFold(10, 2, 3, random_state=0)))
+    6
+
+    """
+    def __init__(self, n, k, n_repeats=10, random_state=None):
+        self.n = n
+        self.k = k
+        self.n_repeats = n_repeats
+        self.random_state = random_state
+
+    def __iter__(self):
+        if not (2 <= self.k <= self.n):
+            raise ValueError("'k' must be greater than one and smaller or "
+                             "equal than the number of samples")
+
+        random_state = _check_random_state(self.random_state)
+        for _ in xrange(self.n_repeats):
+            indexes = random_state.permutation(self.n)
+            for split in KFold._splits(indexes, self.k):
+                yield split
+
+    def __len__(self):
+        return self.k * self.n_repeats
+
+
+class ShuffleSplit(object):
+    r"""Monte Carlo cross validation splits.
+
+    Each split is an independent random partition of the samples in a
+    training and a test set, of ``test_size`` samples.
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+    n_splits : int, optional (default is `10`)
+        Number of splits.
+    test_size : float or int, optional (default is `0.1`)
+        Fraction (if float) or number (if int) of test samples.
+    random_state : int, RandomState or None, optional (default is `None`)
+        Random seed or random number generator (see ``KFold``).
+
+    Raises
+    ------
+    ValueError
+        If the test or the training set would be empty.
+
+    Examples
+    --------
+    >>> splits = list(l1l2py.cross_val.ShuffleSplit(10, 3, 0.2, 0))
+    >>> [(len(train), len(test)) for train, test in splits]
+    [(8, 2), (8, 2), (8, 2)]
+
+    """
+    def __init__(self, n, n_splits=10, test_size=0.1, random_state=None):
+        self.n = n
+        self.n_splits = n_splits
+        self.test_size = test_size
+        self.random_state = random_state
+
+    def __iter__(self):
+        if isinstance(self.test_size, numbers.Integral):
+            n_test = self.test_size
+        else:
+            n_test = int(np.ceil(self.test_size * self.n))
+        if not (0 < n_test < self.n):
+            raise ValueError("'test_size' must leave non empty training "
+                             "and test sets")
+
+        random_state = _check_random_state(self.random_state)
+        for _ in xrange(self.n_splits):
+            indexes = random_state.permutation(self.n)
+            yield indexes[n_test:], indexes[:n_test]
+
+    def __len__(self):
+        return self.n_splits
@@ -1,3 +1,5 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# cython: cdivision=True
 # This code is written by
 #       Federico Tomasi <federico.tomasi@dibris.unige.it>
 # Copyright (C) 2017 SlipGURU -
@@ -18,208 +20,303 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+"""Compiled FISTA solver for the l1l2 regularization.
 
-from libc.math cimport fabs
+Same algorithm (and same iterates, up to rounding) of
+``l1l2py.regression.fista_l1l2``, with the whole loop running without the
+GIL on BLAS level 1 and 2 calls (``scipy.linalg.cython_blas``).
+"""
+
+from libc.math cimport fabs, sqrt
+from libc.string cimport memcpy
 cimport numpy as np
 import numpy as np
-import numpy.linalg as linalg
 
 cimport cython
-from cpython cimport bool
 from cython cimport floating
-import warnings
+from scipy.linalg.cython_blas cimport sdot, ddot
+from scipy.linalg.cython_blas cimport sasum, dasum, sgemv, dgemv
 
-ctypedef np.float64_t DOUBLE
-ctypedef np.uint32_t UINT32_t
-ctypedef floating (*DOT)(int N, floating *X, int incX, floating *Y,
-                         int incY) nogil
-ctypedef void (*AXPY)(int N, floating alpha, floating *X, int incX,
-                      floating *Y, int incY) nogil
-ctypedef floating (*ASUM)(int N, floating *X, int incX) nogil
+from l1l2py.lipschitz import lipschitz_constant
 
 np.import_array()
 
-# from l1l2py.algorithms import l1l2_regularization
-try:
-    from scipy import linalg as la
-except ImportError:
-    from numpy import linalg as la
-# from l1l2py.algorithms import ridge_regression
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-cdef floating get_lipschitz(np.ndarray[floating, ndim=2, mode='fortran'] X):
-    """Get the Lipschitz constant for a specific loss function.
-
-    Only square loss implemented.
-
-    Parameters
-    ----------
-    data : (n, d) float ndarray
-        data matrix
-    loss : string
-        the selected loss function in {'square', 'logit'}
-    Returns
-    ----------
-    L : float
-        the Lipschitz constant
-    """
 
-    cdef unsigned int n_samples = X.shape[0]
-    cdef unsigned int n_features = X.shape[1]
+# BLAS wrappers on contiguous vectors #########################################
 
-    if n_features > n_samples:
-        tmp = np.dot(X, X.T)
+cdef inline floating _dot(int n, floating *x, floating *y) noexcept nogil:
+    cdef int inc = 1
+    if floating is float:
+        return sdot(&n, x, &inc, y, &inc)
     else:
-        tmp = np.dot(X.T, X)
-    return la.norm(tmp, 2)
+        return ddot(&n, x, &inc, y, &inc)
 
 
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-cdef np.ndarray[floating, ndim=1] least_square_step(
-                      np.ndarray[floating, ndim=1, mode='c'] y,
-                      np.ndarray[floating, ndim=2, mode='fortran'] X,
-                      np.ndarray[floating, ndim=1] Z):
-    """
-    Returns the point in witch we apply gradient descent
-    parameters
-    ----------
-    y : np-array
-        the labels vector
-    K : 2D np-array
-        the concatenation of all the kernels, of shape
-        n_samples, n_kernels*n_samples
-    Z : a linear combination of the last two coefficient vectors
-    returns
-    -------
-    res : np-array of shape n_samples*,_kernels
-          a point of the space where we will apply gradient descent
-    """
-    return np.dot(X.transpose(), y - np.dot(X, Z))
-
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-cdef np.ndarray[floating, ndim=1] prox_l1(np.ndarray[floating, ndim=1] w, floating alpha):
-    r"""Proximity operator for l1 norm.
-
-    :math:`\\hat{\\alpha}_{l,m} = sign(u_{l,m})\\left||u_{l,m}| - \\alpha \\right|_+`
-    Parameters
-    ----------
-    u : ndarray
-        The vector (of the n-dimensional space) on witch we want
-        to compute the proximal operator
-    alpha : float
-        regularisation parameter
-    Returns
-    -------
-    ndarray : the vector corresponding to the application of the
-             proximity operator to u
-    """
-    return np.sign(w) * np.maximum(np.abs(w) - alpha, 0.)
+cdef inline floating _asum(int n, floating *x) noexcept nogil:
+    cdef int inc = 1
+    if floating is float:
+        return sasum(&n, x, &inc)
+    else:
+        return dasum(&n, x, &inc)
+
+
+cdef inline void _gemv(bint transpose, int m, int n, floating alpha,
+                       floating *A, floating *x, floating beta,
+                       floating *y) noexcept nogil:
+    """``y = alpha A x + beta y`` (or ``alpha A^T x + beta y``) for a
+    Fortran ordered (m, n) ``A``."""
+    cdef int inc = 1
+    cdef char trans = b'T' if transpose else b'N'
+    if floating is float:
+        sgemv(&trans, &m, &n, &alpha, A, &m, x, &inc, &beta, y, &inc)
+    else:
+        dgemv(&trans, &m, &n, &alpha, A, &m, x, &inc, &beta, y, &inc)
+
+
+# Products with the (implicitly centered and scaled) data matrix ##############
+
+cdef struct Data:
+    int n_samples
+    int n_features
+    bint fortran        # memory layout of X
+    bint centered       # X is centered with offset and scaled with scale
+    void *X
+    void *offset
+    void *scale
+    void *scaled        # (n_features, ) scratch vector
+
+
+cdef inline void _residual(Data *data, floating *beta, floating *y,
+                           floating *out) noexcept nogil:
+    """``out = y - X_c beta``, where ``X_c = (X - 1 offset^T) / scale``."""
+    cdef int n = data.n_samples, p = data.n_features, i
+    cdef floating *X = <floating *> data.X
+    cdef floating *w = beta
+    cdef floating shift = 0., one = 1.
+
+    if data.centered:
+        w = <floating *> data.scaled
+        for i in range(p):
+            w[i] = beta[i] / (<floating *> data.scale)[i]
+        shift = _dot(p, <floating *> data.offset, w)
+
+    memcpy(out, y, n * sizeof(floating))
+    if data.fortran:
+        _gemv(False, n, p, -one, X, w, one, out)
+    else:
+        _gemv(True, p, n, -one, X, w, one, out)
+    if shift != 0.:
+        for i in range(n):
+            out[i] += shift
+
 
+cdef inline void _correlation(Data *data, floating *residual,
+                              floating *out) noexcept nogil:
+    """``out = X_c^T residual``."""
+    cdef int n = data.n_samples, p = data.n_features, i
+    cdef floating *X = <floating *> data.X
+    cdef floating total = 0., one = 1.
 
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-def fista_l1l2(np.ndarray[floating, ndim=1] beta, floating tau, floating mu,
-               np.ndarray[floating, ndim=2, mode='fortran'] X,
-               np.ndarray[floating, ndim=1, mode='c'] y,
-               int max_iter, floating tol, object rng, bint random=0,
-               bint positive=0, bint adaptive=0):
+    if data.fortran:
+        _gemv(True, n, p, one, X, residual, total, out)
+    else:
+        _gemv(False, p, n, one, X, residual, total, out)
+    if data.centered:
+        for i in range(n):
+            total += residual[i]
+        for i in range(p):
+            out[i] = ((out[i] - (<floating *> data.offset)[i] * total) /
+                      (<floating *> data.scale)[i])
+
+
+cdef floating _duality_gap(int n, int p, floating *beta, floating *residual,
+                           floating *grad, floating *y, floating tau,
+                           floating mu) noexcept nogil:
+    """Same as ``l1l2py.regression.duality_gap``."""
+    cdef floating l1_reg = 0.5 * tau * n
+    cdef floating l2_reg = mu * n
+    cdef floating dual_norm_XtA = 0., const, gap, R_norm2, R_y
+    cdef int j
+
+    for j in range(p):
+        dual_norm_XtA = max(dual_norm_XtA, fabs(grad[j] - l2_reg * beta[j]))
+    R_norm2 = _dot(n, residual, residual)
+    R_y = _dot(n, residual, y)
+
+    if dual_norm_XtA > l1_reg:
+        const = l1_reg / dual_norm_XtA
+        gap = 0.5 * R_norm2 * (1. + const * const)
+    else:
+        const = 1.
+        gap = R_norm2
+
+    gap += (l1_reg * _asum(p, beta) - const * R_y +
+            0.5 * l2_reg * (1. + const * const) * _dot(p, beta, beta))
+    return gap * 2. / n
+
+
+# Solver ######################################################################
+
+def fista_l1l2(floating[::1] beta, double tau, double mu, X,
+               floating[::1] y, int max_iter, double tol, rng, bint random=0,
+               bint positive=0, bint adaptive=0, stopping='coef',
+               workspace=None, X_offset=None, X_scale=None):
     """Fista algorithm for l1l2 regularization.
 
     We minimize
     (1/n) * norm(y - X w, 2)^2 + tau norm(w, 1) + mu norm(w, 2)^2
-    """
-    cdef unsigned int n_samples = X.shape[0]
-    cdef unsigned int n_features = X.shape[1]
 
-    # XTY = np.dot(Xt, y)
-    # XTX = np.dot(Xt, X)
-    # if n_samples > n_features:
-    #     XTY = np.dot(Xt, y)
+    Same as ``l1l2py.regression.fista_l1l2``, for a dense (C or Fortran
+    contiguous) ``X`` with the same floating point type of ``beta`` and
+    ``y``. If ``X_offset`` and ``X_scale`` are given, ``X`` is implicitly
+    centered and scaled with them.
+    The adaptive step size is not supported.
+    """
+    cdef Data data
+    cdef int n_samples = X.shape[0]
+    cdef int n_features = X.shape[1]
+    cdef int n_iter = 0, j
+    cdef bint gap_stopping
+    cdef floating gap = 0., lipschitz, sigma, mu_s, tau_s, gamma
+    cdef floating t = 1., t_next, momentum, value, max_diff, max_coef
+    cdef floating ftol, ftau = tau, fmu = mu
+    cdef floating *swap
+
+    if stopping not in ('coef', 'gap'):
+        raise ValueError("stopping should be either 'coef' or 'gap', "
+                         "got %r" % stopping)
+    if adaptive:
+        raise ValueError("the adaptive step size is not supported")
+    dtype = np.float32 if floating is float else np.float64
+    if X.dtype != dtype or not (X.flags.f_contiguous or X.flags.c_contiguous):
+        raise ValueError("X must be a contiguous array of %s"
+                         % np.dtype(dtype).name)
+    gap_stopping = stopping == 'gap'
+
+    if workspace is None:
+        from l1l2py.algorithms import Workspace
+        workspace = Workspace()
+    get = workspace.get
+
+    cdef floating[::1] aux_beta = get('aux_beta', (n_features, ), dtype)
+    cdef floating[::1] beta_cur = get('beta', (n_features, ), dtype)
+    cdef floating[::1] beta_next = get('beta_next', (n_features, ), dtype)
+    cdef floating[::1] beta_diff = get('beta_diff', (n_features, ), dtype)
+    cdef floating[::1] grad = get('grad', (n_features, ), dtype)
+    cdef floating[::1] grad_beta = get('grad_beta', (n_features, ), dtype)
+    cdef floating[::1] grad_next = get('grad_next', (n_features, ), dtype)
+    cdef floating[::1] scaled = get('scaled', (n_features, ), dtype)
+    cdef floating[::1] residual = get('residual', (n_samples, ), dtype)
+    cdef floating[::1] residual_next = get('residual_next', (n_samples, ),
+                                           dtype)
+    cdef floating[::1] offset, scale
+
+    data.n_samples = n_samples
+    data.n_features = n_features
+    data.fortran = X.flags.f_contiguous
+    data.X = np.PyArray_DATA(<np.ndarray> X)
+    data.scaled = &scaled[0] if n_features else NULL
+    data.centered = X_offset is not None
+    if data.centered:
+        offset = np.ascontiguousarray(X_offset, dtype=dtype)
+        scale = np.ascontiguousarray(X_scale, dtype=dtype)
+        data.offset = &offset[0] if n_features else NULL
+        data.scale = &scale[0] if n_features else NULL
+        from l1l2py.base import centered_operator
+        lipschitz = lipschitz_constant(centered_operator(X, X_offset,
+                                                         X_scale))
+    else:
+        lipschitz = lipschitz_constant(X)
+
+    # pointers to the vectors swapped at each iteration
+    cdef floating *b = &beta_cur[0] if n_features else NULL
+    cdef floating *b_next = &beta_next[0] if n_features else NULL
+    cdef floating *r = &residual[0] if n_samples else NULL
+    cdef floating *r_next = &residual_next[0] if n_samples else NULL
+    cdef floating *g_beta = &grad_beta[0] if n_features else NULL
+    cdef floating *g_next = &grad_next[0] if n_features else NULL
+    cdef floating *aux = &aux_beta[0] if n_features else NULL
+    cdef floating *diff = &beta_diff[0] if n_features else NULL
+    cdef floating *g = &grad[0] if n_features else NULL
+    cdef floating *Y = &y[0] if n_samples else NULL
 
     # First iteration with standard sigma
-    cdef floating lipschitz_constant = get_lipschitz(X)
-    cdef floating sigma = lipschitz_constant / n_samples + mu
+    sigma = lipschitz / n_samples + mu
+    beta_cur[:] = beta
+    with nogil:
+        _residual(&data, b, Y, r)
+        _correlation(&data, r, g_beta)
+    ftol = tol
+    if gap_stopping:
+        ftol = tol * _dot(n_samples, Y, Y) / n_samples
 
     if sigma < np.finfo(float).eps:  # is zero...
-        return beta, None, tol, 0
+        gap = _duality_gap(n_samples, n_features, b, r, g_beta, Y, ftau, fmu)
+        return np.array(beta_cur), gap, ftol, 0
 
-    # mu_s = 1 - mu / sigma
-    cdef floating mu_s = 1 - mu * n_samples / (lipschitz_constant + mu * n_samples)
-    # tau_s = tau / (2.0 * sigma)
-    cdef floating tau_s = tau * n_samples / (2. * lipschitz_constant + mu * n_samples)
-    # nsigma = n_samples * sigma
-    cdef floating gamma = 1. / (lipschitz_constant + mu * n_samples)
+    mu_s = 1 - mu * n_samples / (lipschitz + mu * n_samples)
+    tau_s = tau * n_samples * 0.5 / (lipschitz + mu * n_samples)
+    gamma = 1. / (lipschitz + mu * n_samples)
 
     # Starting conditions
-    cdef np.ndarray[floating, ndim=1] aux_beta = np.copy(beta)
-    cdef np.ndarray[floating, ndim=1] grad, value, beta_diff
-    cdef np.ndarray[floating, ndim=1] beta_next = np.empty(n_features)
-    cdef floating t = 1., t_next, max_coef, max_diff
-
-    for n_iter in range(max_iter):
-        # Pre-calculated "heavy" computation
-        # if n_samples > n_features:
-        #     grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        # else:
-        #     grad = np.dot(Xt, y - np.dot(X, aux_beta))
-        # grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        grad = least_square_step(y, X, aux_beta)
-
-        # Soft-Thresholding
-        # value = (precalc / nsigma) + (mu_s * aux_beta)
-        value = gamma * grad + (mu_s * aux_beta)
-        beta_next = prox_l1(value, tau_s)
-        # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-        # beta_next *= np.sign(value)
-
-        # ## Adaptive step size #######################################
-        # if adaptive:
-        #     beta_diff = (aux_beta - beta_next)
-        #
-        #     # Only if there is an increment of the solution
-        #     # we can calculate the adaptive step-size
-        #     if np.any(beta_diff):
-        #         # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
-        #         # num = np.dot(beta_diff, grad_diff)
-        #         tmp = np.dot(X, beta_diff)  # <-- adaptive-step-size drawback
-        #         num = np.dot(tmp, tmp) / n_samples
-        #
-        #         sigma = (num / np.dot(beta_diff, beta_diff))
-        #         mu_s = 1 - mu / sigma
-        #         tau_s = tau / (2. * sigma)
-        #         nsigma = n_samples * sigma
-        #
-        #         # Soft-Thresholding
-        #         value = grad / nsigma + mu_s * aux_beta
-        #         beta_next = prox_l1(value, tau_s)
-        #         # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-        #         # beta_next *= np.sign(value)
-
-        # FISTA
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1 + np.sqrt(1 + 4 * t * t))
-        aux_beta = beta_next + ((t - 1) / t_next) * beta_diff
-
-        # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
-
-        # Values update
-        t = t_next
-        # beta = np.copy(beta_next)
-        beta = beta_next
-
-        # Stopping rule (exit even if beta_next contains only zeros)
-        if max_coef == 0.0 or (max_diff / max_coef) <= tol:
-            break
-
-    return beta, None, tol, n_iter + 1
+    aux_beta[:] = beta
+    grad[:] = grad_beta
+
+    with nogil:
+        for n_iter in range(max_iter):
+            # Soft-Thresholding
+            for j in range(n_features):
+                value = gamma * g[j] + mu_s * aux[j]
+                if value > tau_s:
+                    b_next[j] = value - tau_s
+                elif value < -tau_s:
+                    b_next[j] = value + tau_s
+                else:
+                    b_next[j] = 0.
+
+            # Pre-calculated "heavy" computation, on the new iterate
+            _residual(&data, b_next, Y, r_next)
+            _correlation(&data, r_next, g_next)
+
+            # FISTA
+            t_next = 0.5 * (1 + sqrt(1 + 4 * t * t))
+            momentum = (t - 1) / t_next
+            max_diff = 0.
+            max_coef = 0.
+            for j in range(n_features):
+                diff[j] = b_next[j] - b[j]
+                aux[j] = b_next[j] + momentum * diff[j]
+                g[j] = (1 + momentum) * g_next[j] - momentum * g_beta[j]
+                max_diff = max(max_diff, fabs(diff[j]))
+                max_coef = max(max_coef, fabs(b_next[j]))
+
+            # Values update (swapping the buffers)
+            t = t_next
+            swap = b
+            b = b_next
+            b_next = swap
+            swap = r
+            r = r_next
+            r_next = swap
+            swap = g_beta
+            g_beta = g_next
+            g_next = swap
+
+            # Stopping rule (exit even if beta_next contains only zeros)
+            if gap_stopping:
+                gap = _duality_gap(n_samples, n_features, b, r, g_beta, Y,
+                                   ftau, fmu)
+                if gap <= ftol:
+                    break
+            elif max_coef == 0.0 or (max_diff / max_coef) <= ftol:
+                break
+
+        if not gap_stopping:
+            gap = _duality_gap(n_samples, n_features, b, r, g_beta, Y,
+                               ftau, fmu)
+
+    out = np.empty(n_features, dtype=dtype)
+    cdef floating[::1] out_view = out
+    if n_features:
+        memcpy(&out_view[0], b, n_features * sizeof(floating))
+    return out, gap, ftol, n_iter + 1
@@ -0,0 +1,206 @@
+"""Lipschitz constant estimation.
+
+The proximal solvers fix their step size using the Lipschitz constant of
+the gradient of the least squares term, that is the largest eigenvalue of
+``X^T X`` (the squared spectral norm of ``X``).
+
+Computing it through the full Gram matrix and its `2-norm` costs a
+``min(N, P)^2 * max(N, P)`` product followed by a full SVD.
+This module estimates the same quantity with matrix-free power iterations,
+which only need products with ``X`` and ``X^T``.
+"""
+
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from six.moves import xrange
+
+try:
+    from scipy import linalg as la
+    from scipy.sparse.linalg import eigsh, LinearOperator, ArpackError
+except ImportError:
+    from numpy import linalg as la
+    eigsh = None
+
+__all__ = ('lipschitz_constant', )
+
+# With a smaller dimension up to this value the exact computation costs
+# less than a few tens of iterations (each one is a 2 * N * P product).
+_EXACT_MAX_DIM = 64
+
+
+def lipschitz_constant(data, tolerance=1e-4, max_iter=100, margin=1e-3,
+                       method='auto', gram=False, random_state=0):
+    r"""Estimation of the squared spectral norm of a data matrix.
+
+    The returned value is the Lipschitz constant of the gradient of
+    ``||y - X b||^2 / 2``, that is the largest eigenvalue of ``X^T X``.
+
+    The iterative methods work on ``X^T X`` (or ``X X^T``, whichever is
+    smaller) without building it, using only products with ``X`` and
+    ``X^T``.
+    They approach the largest eigenvalue from below, so the estimate is
+    inflated by a relative ``margin`` to keep the step size of the proximal
+    solvers on the safe side.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray, sparse matrix or LinearOperator
+        Data matrix (or Gram matrix, if ``gram`` is `True`).
+    tolerance : float, optional (default is `1e-4`)
+        Relative tolerance of the iterative estimate.
+    max_iter : int, optional (default is `100`)
+        Maximum number of power iterations (or Lanczos restarts).
+    margin : float, optional (default is `1e-3`)
+        Relative safety margin added to the iterative estimate.
+    method : {'auto', 'lanczos', 'power', 'exact'}, optional
+        If `'exact'`, the value is computed with a full SVD of the Gram
+        matrix. `'lanczos'` needs ``scipy``.
+        If `'auto'` (default), the exact computation is used only for
+        matrices with a very small dimension, otherwise `'lanczos'`
+        (or `'power'` if ``scipy`` is not available).
+    gram : bool, optional (default is `False`)
+        If `True`, ``data`` is a symmetric positive semi-definite Gram
+        matrix ``X^T X`` and its largest eigenvalue is returned.
+    random_state : int or RandomState, optional (default is `0`)
+        Seed of the starting vector of the iterations.
+
+    Returns
+    -------
+    L : float
+        Largest eigenvalue of ``X^T X``.
+
+    Raises
+    ------
+    ValueError
+        If ``method`` is not valid.
+
+    Examples
+    --------
+    >>> X = numpy.array([[0.1, 1.1, 0.3], [0.2, 1.2, 1.6], [0.3, 1.3, -0.6]])
+    >>> L = l1l2py.lipschitz.lipschitz_constant(X, method='power')
+    >>> numpy.allclose(L, numpy.linalg.norm(X, 2) ** 2, rtol=1e-2)
+    True
+
+    """
+    if method not in ('auto', 'lanczos', 'power', 'exact'):
+        raise ValueError("method should be one of 'auto', 'lanczos', "
+                         "'power' or 'exact', got %r" % method)
+
+    n, p = data.shape
+    if method == 'auto':
+        if min(n, p) <= _EXACT_MAX_DIM:
+            method = 'exact'
+        else:
+            method = 'power' if eigsh is None else 'lanczos'
+
+    if method == 'exact':
+        return _exact_lipschitz(data, gram)
+
+    if gram:
+        dim = n
+
+        def operator(v):
+            return data.dot(v)
+    elif p > n:
+        dim = n
+
+        def operator(v):
+            return data.dot(data.T.dot(v))
+    else:
+        dim = p
+
+        def operator(v):
+            return data.T.dot(data.dot(v))
+
+    if isinstance(random_state, np.random.RandomState):
+        rng = random_state
+    else:
+        rng = np.random.RandomState(random_state)
+    # float32 data are iterated in single precision
+    dtype = np.float32 if data.dtype == np.float32 else np.float64
+    v0 = rng.randn(dim).astype(dtype)
+
+    if method == 'lanczos':
+        estimate = _lanczos(operator, dim, v0, tolerance, max_iter)
+    else:
+        estimate = _power_iteration(operator, v0, tolerance, max_iter)
+
+    return estimate * (1.0 + margin)
+
+
+def _lanczos(operator, dim, v0, tolerance, max_iter):
+    """Largest eigenvalue with the implicitly restarted Lanczos method."""
+    A = LinearOperator((dim, dim), matvec=operator, dtype=v0.dtype)
+    try:
+        value = eigsh(A, k=1, which='LA', v0=v0, tol=tolerance,
+                      maxiter=max_iter, return_eigenvectors=False)
+    except ArpackError:  # no convergence or null operator
+        return _power_iteration(operator, v0, tolerance, max_iter)
+    return max(float(value[0]), 0.0)
+
+
+def _power_iteration(operator, v0, tolerance, max_iter):
+    """Largest eigenvalue with the power method.
+
+    The returned value is the Rayleigh quotient plus the norm of the
+    residual: there is an eigenvalue in that distance from the quotient.
+    """
+    v = v0 / np.sqrt(np.dot(v0, v0))
+    estimate = 0.0
+    for _ in xrange(max_iter):
+        w = operator(v)
+        theta = np.dot(v, w)
+        if theta <= 0.0:  # v in the null space (e.g. null matrix)
+            return 0.0
+
+        residual = w - theta * v
+        residual = np.sqrt(np.dot(residual, residual))
+        estimate = theta + residual
+        if residual <= tolerance * theta:
+            break
+        v = w / np.sqrt(np.dot(w, w))
+
+    return float(estimate)
+
+
+def _exact_lipschitz(data, gram=False):
+    """Largest eigenvalue of the Gram matrix through a full SVD."""
+    if hasattr(data, 'toarray'):  # scipy.sparse matrix
+        data = data.toarray()
+
+    n, p = data.shape
+    if hasattr(data, 'matmat'):  # LinearOperator
+        if gram:
+            tmp = data.matmat(np.eye(p, dtype=data.dtype))
+        elif p > n:
+            tmp = data.matmat(data.T.matmat(np.eye(n, dtype=data.dtype)))
+        else:
+            tmp = data.T.matmat(data.matmat(np.eye(p, dtype=data.dtype)))
+        return float(la.norm(tmp, 2))
+
+    if gram:
+        return float(la.norm(data, 2))
+
+    if p > n:
+        tmp = np.dot(data, data.T)
+    else:
+        tmp = np.dot(data.T, data)
+    return float(la.norm(tmp, 2))
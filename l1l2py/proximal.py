@@ -6,13 +6,10 @@ import warnings
 from math import sqrt
 
 import numpy as np
-
-try:
-    from scipy import linalg as la
-except ImportError:
-    from numpy import linalg as la
+from six.moves import xrange
 
 from .base import AbstractLinearModel
+from .lipschitz import lipschitz_constant
 from .metrics import regression_error
 from .cross_val import KFold
 
@@ -71,24 +68,27 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
 
     """
     n, d = data.shape
+    dtype = np.float32 if data.dtype == np.float32 else np.float64
+    # Python scalars do not promote single precision arrays
+    mu, tau = float(mu), float(tau)
 
     # beta starts from 0 and we assume also that the previous value is 0
     if beta is None:
-        beta = np.zeros(d)
+        beta = np.zeros(d, dtype=dtype)
     else:
-        beta = beta.ravel()
+        beta = beta.ravel().astype(dtype, copy=False)
 
     # Useful quantities
     X = data
-    Y = labels.ravel()
+    Y = labels.ravel().astype(dtype, copy=False)
 
     if n > d:
-        XTY = np.dot(X.T, Y)
+        XTY = X.T.dot(Y)
 
     # First iteration with standard sigma
     sigma = _sigma(data, mu)
     if sigma < np.finfo(float).eps: # is zero...
-        return np.zeros(d), 0
+        return np.zeros(d, dtype=dtype), 0
 
     mu_s = mu / sigma
     tau_s = tau / (2.0 * sigma)
@@ -101,9 +101,9 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
     for k in xrange(kmax):
         # Pre-calculated "heavy" computation
         if n > d:
-            precalc = XTY - np.dot(X.T, np.dot(X, auxcoef_))
+            precalc = XTY - X.T.dot(X.dot(auxcoef_))
         else:
-            precalc = np.dot(X.T, Y - np.dot(X, auxcoef_))
+            precalc = X.T.dot(Y - X.dot(auxcoef_))
 
         # TODO: stopping rule based on r = Y - Xbeta ??
 
@@ -120,7 +120,7 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
             if np.any(beta_diff):
                 # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
                 # num = np.dot(beta_diff, grad_diff)
-                tmp = np.dot(X, beta_diff) # <-- adaptive-step-size drawback
+                tmp = X.dot(beta_diff) # <-- adaptive-step-size drawback
                 num = np.dot(tmp, tmp) / n
 
                 sigma = (num / np.dot(beta_diff, beta_diff))
@@ -154,14 +154,8 @@ def l1l2_regularization(data, labels, mu, tau, beta=None, kmax=100000,
 
 
 def _sigma(matrix, mu):
-    n, p = matrix.shape
-
-    if p > n:
-        tmp = np.dot(matrix, matrix.T)
-    else:
-        tmp = np.dot(matrix.T, matrix)
-
-    return (la.norm(tmp, 2)/n) + mu
+    n = matrix.shape[0]
+    return (lipschitz_constant(matrix)/n) + mu
 
 
 ##############################################################################
@@ -192,6 +186,9 @@ class ElasticNet(AbstractLinearModel):
           between cd and prox???
 
     """
+    # the solver only needs products with X
+    _implicit_centering = True
+
     def __init__(self, fit_intercept=True, tau=0.5, mu=0.5,
                  adaptive_step_size=False, max_iter=10000, tol=1e-4,
                  precompute=False, normalize=False):
@@ -27,6 +27,7 @@
 import numpy as np
 import six
 
+from math import sqrt
 from six.moves import xrange
 from sklearn.exceptions import ConvergenceWarning
 from sklearn.feature_selection.base import SelectorMixin
@@ -41,23 +42,30 @@ from sklearn.model_selection import GridSearchCV
 from sklearn.base import BaseEstimator
 from sklearn.pipeline import Pipeline
 from sklearn.utils import check_array
+from sklearn.utils import check_X_y
 from sklearn.utils import check_random_state
 from sklearn.utils.validation import check_is_fitted
 
 # from l1l2py.algorithms import l1l2_regularization
-try:
-    from scipy import linalg as la
-except ImportError:
-    from numpy import linalg as la
 # from l1l2py.algorithms import ridge_regression
+from l1l2py.algorithms import Workspace, _dot_into, _soft_threshold
+from l1l2py.base import CompactCoefMixin
+from l1l2py.base import centered_operator, implicit_gram, implicit_pre_fit
+from l1l2py.lipschitz import lipschitz_constant
+from l1l2py.screening import correlation, strong_set, kkt_violations
 
-# from .fista_fast import fista_fast
+try:
+    from l1l2py.fista_fast import fista_fast
+except ImportError:  # the extension is not built
+    fista_fast = None
 
 
-def get_lipschitz(data):
+def get_lipschitz(data, gram=False):
     """Get the Lipschitz constant for a specific loss function.
 
     Only square loss implemented.
+    The constant is estimated without building the Gram matrix
+    (see :func:`l1l2py.lipschitz.lipschitz_constant`).
 
     Parameters
     ----------
@@ -65,18 +73,14 @@ def get_lipschitz(data):
         data matrix
     loss : string
         the selected loss function in {'square', 'logit'}
+    gram : bool
+        if True, data is the Gram matrix X^T X
     Returns
     ----------
     L : float
         the Lipschitz constant
     """
-    n, p = data.shape
-
-    if p > n:
-        tmp = np.dot(data, data.T)
-    else:
-        tmp = np.dot(data.T, data)
-    return la.norm(tmp, 2)
+    return lipschitz_constant(data, gram=gram)
 
 
 def least_square_step(y, X, Z):
@@ -118,27 +122,235 @@ def prox_l1(w, alpha):
     return np.sign(w) * np.maximum(np.abs(w) - alpha, 0.)
 
 
+def duality_gap(beta, residual, grad, y, tau, mu):
+    r"""Duality gap of the l1l2 problem.
+
+    It is the gap of the elastic-net formulation used in
+    ``sklearn.linear_model.ElasticNet``, rescaled to the objective
+    (1/n) * norm(y - X w, 2)^2 + tau norm(w, 1) + mu norm(w, 2)^2.
+    The dual point is obtained by rescaling the residual.
+
+    Parameters
+    ----------
+    beta : ndarray
+        Current solution.
+    residual : ndarray
+        Residual ``y - X beta``.
+    grad : ndarray
+        The vector ``X^T residual``.
+    y : ndarray
+        Label vector.
+    tau, mu : float
+        Constants that multiply the l1 and the l2 norm.
+
+    Returns
+    -------
+    gap : float
+        Upper bound of the distance of the objective from its minimum.
+    """
+    return _duality_gap(beta, grad, np.dot(residual, residual),
+                        np.dot(residual, y), y.shape[0], tau, mu)
+
+
+def _duality_gap(beta, grad, R_norm2, R_y, n_samples, tau, mu,
+                 multi_task=False):
+    """Duality gap from the squared norm of the residual ``R_norm2`` and its
+    product with the labels ``R_y``.
+
+    If ``multi_task`` is True, ``beta`` is a (n_features, n_targets) matrix
+    and the l1 norm is replaced by the l2,1 norm of its rows.
+    """
+    l1_reg = 0.5 * tau * n_samples
+    l2_reg = mu * n_samples
+
+    XtA = grad - l2_reg * beta
+    if not XtA.size:
+        dual_norm_XtA = 0.
+    elif multi_task:
+        dual_norm_XtA = np.sqrt(np.sum(XtA ** 2, axis=1)).max()
+    else:
+        dual_norm_XtA = np.abs(XtA).max()
+    if dual_norm_XtA > l1_reg:
+        const = l1_reg / dual_norm_XtA
+        gap = 0.5 * R_norm2 * (1. + const ** 2)
+    else:
+        const = 1.
+        gap = R_norm2
+
+    if multi_task:
+        l1_norm = np.sqrt(np.sum(beta ** 2, axis=1)).sum()
+    else:
+        l1_norm = np.abs(beta).sum()
+    gap += (l1_reg * l1_norm - const * R_y +
+            0.5 * l2_reg * (1. + const ** 2) * np.vdot(beta, beta))
+    return gap * 2. / n_samples
+
+
+def prox_l21(w, alpha):
+    """Proximity operator for the l2,1 norm of the rows of ``w``.
+
+    Each row is shrunk towards zero by ``alpha`` in l2 norm.
+    """
+    norms = np.sqrt(np.sum(w ** 2, axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.maximum(1. - alpha / norms, 0.)
+    scale[norms == 0] = 0.
+    return w * scale[:, np.newaxis]
+
+
+def fista_l1l2_multi(beta, tau, mu, X, Y, max_iter, tol, rng, random,
+                     positive, stopping='coef', multi_task=False):
+    """Fista algorithm for l1l2 regularization of multiple targets.
+
+    All the targets (columns of ``Y``) are solved at once, with a matrix of
+    coefficients ``beta`` of shape (n_features, n_targets), so that each
+    iteration costs two matrix-matrix products.
+    If ``multi_task`` is False the targets are independent problems,
+    otherwise the l1 norm is replaced by the l2,1 norm of the rows of
+    ``beta``, which selects the same features for all the targets.
+    """
+    n_samples = Y.shape[0]
+
+    if stopping not in ('coef', 'gap'):
+        raise ValueError("stopping should be either 'coef' or 'gap', "
+                         "got %r" % stopping)
+
+    def gap_of(beta, residual, grad):
+        if multi_task:
+            return _duality_gap(beta, grad, np.vdot(residual, residual),
+                                np.vdot(residual, Y), n_samples, tau, mu,
+                                multi_task=True)
+        # independent problems: sum of the gaps
+        return sum(duality_gap(beta[:, k], residual[:, k], grad[:, k],
+                               Y[:, k], tau, mu)
+                   for k in xrange(Y.shape[1]))
+
+    prox = prox_l21 if multi_task else prox_l1
+
+    # First iteration with standard sigma
+    lipschitz_constant = get_lipschitz(X)
+    sigma = lipschitz_constant / n_samples + mu
+
+    residual = Y - X.dot(beta)
+    grad_beta = X.T.dot(residual)
+    if stopping == 'gap':
+        tol = tol * np.vdot(Y, Y) / n_samples
+
+    if sigma < np.finfo(float).eps:  # is zero...
+        return beta, gap_of(beta, residual, grad_beta), tol, 0
+
+    mu_s = 1 - mu * n_samples / (lipschitz_constant + mu * n_samples)
+    tau_s = tau * n_samples * 0.5 / (lipschitz_constant + mu * n_samples)
+    gamma = 1. / (lipschitz_constant + mu * n_samples)
+
+    # Starting conditions
+    aux_beta = np.copy(beta)
+    grad = grad_beta
+    t = 1.
+
+    for n_iter in xrange(max_iter):
+        # Soft-Thresholding
+        beta_next = prox(gamma * grad + (mu_s * aux_beta), tau_s)
+
+        # Pre-calculated "heavy" computation, on the new iterate
+        residual_next = Y - X.dot(beta_next)
+        grad_next = X.T.dot(residual_next)
+
+        # FISTA
+        beta_diff = (beta_next - beta)
+        t_next = 0.5 * (1 + sqrt(1 + 4 * t * t))
+        momentum = (t - 1) / t_next
+        aux_beta = beta_next + momentum * beta_diff
+        grad = (1 + momentum) * grad_next - momentum * grad_beta
+
+        # Values update
+        t = t_next
+        beta = beta_next
+        residual, grad_beta = residual_next, grad_next
+
+        # Stopping rule (exit even if beta_next contains only zeros)
+        if stopping == 'gap':
+            gap = gap_of(beta, residual, grad_beta)
+            if gap <= tol:
+                break
+        else:
+            # Convergence values
+            max_diff = np.abs(beta_diff).max()
+            max_coef = np.abs(beta_next).max()
+            if max_coef == 0.0 or (max_diff / max_coef) <= tol:
+                break
+
+    if stopping != 'gap':
+        gap = gap_of(beta, residual, grad_beta)
+    return beta, gap, tol, n_iter + 1
+
+
+def _compiled(X, y, beta):
+    """Whether the compiled solver handles the data."""
+    return (isinstance(X, np.ndarray) and X.ndim == 2 and 0 not in X.shape and
+            X.dtype in (np.float32, np.float64) and
+            X.dtype == y.dtype == beta.dtype and
+            (X.flags.f_contiguous or X.flags.c_contiguous))
+
+
 def fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random, positive,
-               adaptive=False):
+               adaptive=False, stopping='coef', workspace=None,
+               X_offset=None, X_scale=None):
     """Fista algorithm for l1l2 regularization.
 
+    X is implicitly centered and scaled by ``X_offset`` and ``X_scale``, if
+    given (see :func:`l1l2py.base.centered_operator`).
+    The compiled solver of :mod:`l1l2py.fista_fast`, if built, is used for
+    dense contiguous data of the same floating point type of ``y``, without
+    the adaptive step; in any other case the pure Python one.
+    """
+    if fista_fast is not None and not adaptive and _compiled(X, y, beta):
+        return fista_fast.fista_l1l2(
+            np.ascontiguousarray(beta), tau, mu, X, np.ascontiguousarray(y),
+            max_iter, tol, rng, random, positive, stopping=stopping,
+            workspace=workspace, X_offset=X_offset, X_scale=X_scale)
+
+    if X_offset is not None:
+        X = centered_operator(X, X_offset, X_scale)
+    return _fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random,
+                       positive, adaptive, stopping, workspace)
+
+
+def _fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random, positive,
+                adaptive=False, stopping='coef', workspace=None):
+    """Pure Python implementation of :func:`fista_l1l2`.
+
     We minimize
     (1/n) * norm(y - X w, 2)^2 + tau norm(w, 1) + mu norm(w, 2)^2
+
+    The residual and the gradient are computed on the iterates, so that the
+    duality gap of each iterate comes for free: the ones on the
+    extrapolated points are their linear combination.
+    If ``stopping`` is 'gap', the iterations stop when the duality gap is
+    below ``tol`` times the objective of the null solution, otherwise
+    ('coef') when the relative change of the coefficients is below ``tol``.
+    The iterates are updated in place in the buffers of ``workspace`` (see
+    :class:`l1l2py.algorithms.Workspace`), which may be shared by the solves
+    of a path.
     """
     n_samples = y.shape[0]
-    n_features = beta.shape[0]
 
-    # XTY = np.dot(Xt, y)
-    # XTX = np.dot(Xt, X)
-    # if n_samples > n_features:
-    #     XTY = np.dot(Xt, y)
+    if stopping not in ('coef', 'gap'):
+        raise ValueError("stopping should be either 'coef' or 'gap', "
+                         "got %r" % stopping)
 
     # First iteration with standard sigma
     lipschitz_constant = get_lipschitz(X)
     sigma = lipschitz_constant / n_samples + mu
 
+    residual = y - X.dot(beta)
+    grad_beta = X.T.dot(residual)
+    if stopping == 'gap':
+        tol = tol * np.dot(y, y) / n_samples
+
     if sigma < np.finfo(float).eps:  # is zero...
-        return beta, None, tol, 0
+        return beta, duality_gap(beta, residual, grad_beta, y, tau, mu), \
+            tol, 0
 
     # mu_s = 1 - mu / sigma
     mu_s = 1 - mu * n_samples / (lipschitz_constant + mu * n_samples)
@@ -147,69 +359,256 @@ def fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random, positive,
     # nsigma = n_samples * sigma
     gamma = 1. / (lipschitz_constant + mu * n_samples)
 
-    # Starting conditions
-    aux_beta = np.copy(beta)
-    beta_next = np.empty(n_features)
+    # Starting conditions, in the work buffers (updated in place)
+    if workspace is None:
+        workspace = Workspace()
+    n_features, dtype = beta.shape[0], beta.dtype
+    aux_beta = workspace.get('aux_beta', (n_features, ), dtype)
+    aux_beta[:] = beta
+    beta = workspace.get('beta', (n_features, ), dtype)
+    beta[:] = aux_beta
+    beta_next = workspace.get('beta_next', (n_features, ), dtype)
+    beta_diff = workspace.get('beta_diff', (n_features, ), dtype)
+    value = workspace.get('value', (n_features, ), dtype)
+    grad = workspace.get('grad', (n_features, ), dtype)
+    grad[:] = grad_beta
+    grad_beta = workspace.get('grad_beta', (n_features, ), dtype)
+    grad_beta[:] = grad
+    grad_next = workspace.get('grad_next', (n_features, ), dtype)
+    residual_next = workspace.get('residual_next', residual.shape, dtype)
     t = 1.
 
     for n_iter in xrange(max_iter):
-        # Pre-calculated "heavy" computation
-        # if n_samples > n_features:
-        #     grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        # else:
-        #     grad = np.dot(Xt, y - np.dot(X, aux_beta))
-        # grad = XTY - np.dot(Xt, np.dot(X, aux_beta))
-        grad = least_square_step(y, X, aux_beta)
-
         # Soft-Thresholding
         # value = (grad / nsigma) + (mu_s * aux_beta)
-        value = gamma * grad + (mu_s * aux_beta)
-        beta_next = prox_l1(value, tau_s)
-        # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-        # beta_next *= np.sign(value)
+        np.multiply(grad, gamma, out=value)
+        np.multiply(aux_beta, mu_s, out=beta_next)
+        value += beta_next
+        _soft_threshold(value, tau_s, out=beta_next)
 
         # ## Adaptive step size #######################################
         if adaptive:
-            beta_diff = (aux_beta - beta_next)
+            np.subtract(aux_beta, beta_next, out=beta_diff)
 
             # Only if there is an increment of the solution
             # we can calculate the adaptive step-size
             if np.any(beta_diff):
-                # grad_diff = np.dot(XTn, np.dot(X, beta_diff))
-                # num = np.dot(beta_diff, grad_diff)
-                tmp = np.dot(X, beta_diff)  # <-- adaptive-step-size drawback
+                tmp = X.dot(beta_diff)  # <-- adaptive-step-size drawback
                 num = np.dot(tmp, tmp) / n_samples
 
-                sigma = (num / np.dot(beta_diff, beta_diff))
+                sigma = float(num / np.dot(beta_diff, beta_diff))
                 mu_s = 1 - mu / sigma
                 tau_s = 0.5 * tau / sigma
                 nsigma = n_samples * sigma
 
                 # Soft-Thresholding
-                value = grad / nsigma + mu_s * aux_beta
-                beta_next = prox_l1(value, tau_s)
-                # np.maximum(np.abs(value) - tau_s, 0, beta_next)
-                # beta_next *= np.sign(value)
+                np.multiply(grad, 1. / nsigma, out=value)
+                np.multiply(aux_beta, mu_s, out=beta_next)
+                value += beta_next
+                _soft_threshold(value, tau_s, out=beta_next)
+
+        # Pre-calculated "heavy" computation, on the new iterate
+        _dot_into(X, beta_next, residual_next)
+        np.subtract(y, residual_next, out=residual_next)
+        _dot_into(X.T, residual_next, grad_next)
 
         # FISTA
-        beta_diff = (beta_next - beta)
-        t_next = 0.5 * (1 + np.sqrt(1 + 4 * t * t))
-        aux_beta = beta_next + ((t - 1) / t_next) * beta_diff
+        np.subtract(beta_next, beta, out=beta_diff)
+        t_next = 0.5 * (1 + sqrt(1 + 4 * t * t))
+        momentum = (t - 1) / t_next
+        np.multiply(beta_diff, momentum, out=aux_beta)
+        aux_beta += beta_next
+        np.multiply(grad_next, 1 + momentum, out=grad)
+        np.multiply(grad_beta, momentum, out=value)
+        grad -= value
+
+        # Values update (swapping the buffers)
+        t = t_next
+        beta, beta_next = beta_next, beta
+        residual, residual_next = residual_next, residual
+        grad_beta, grad_next = grad_next, grad_beta
 
-        # Convergence values
-        max_diff = np.abs(beta_diff).max()
-        max_coef = np.abs(beta_next).max()
+        # Stopping rule (exit even if beta_next contains only zeros)
+        if stopping == 'gap':
+            gap = duality_gap(beta, residual, grad_beta, y, tau, mu)
+            if gap <= tol:
+                break
+        else:
+            # Convergence values
+            max_diff = np.abs(beta_diff, out=value).max()
+            max_coef = np.abs(beta, out=value).max()
+            if max_coef == 0.0 or (max_diff / max_coef) <= tol:
+                break
+
+    if stopping != 'gap':
+        gap = duality_gap(beta, residual, grad_beta, y, tau, mu)
+    # the workspace may be reused by the next solve
+    return beta.copy(), gap, tol, n_iter + 1
+
+
+def fista_l1l2_gram(beta, tau, mu, gram, Xy, y, max_iter, tol, rng, random,
+                    positive, stopping='coef', workspace=None):
+    """Fista algorithm for l1l2 regularization on the Gram matrix.
+
+    Same as ``fista_l1l2``, but the iterations only use the Gram matrix
+    ``X^T X`` and ``X^T y``: each one costs a (p, p) product instead of two
+    (n, p) ones.
+    The norm of the residual for the duality gap is expanded as
+    ``y^T y - 2 w^T X^T y + w^T X^T X w``.
+    """
+    n_samples = y.shape[0]
 
-        # Values update
+    if stopping not in ('coef', 'gap'):
+        raise ValueError("stopping should be either 'coef' or 'gap', "
+                         "got %r" % stopping)
+
+    yTy = np.dot(y, y)
+
+    def gap_of(beta, Gbeta):
+        bXy = np.dot(beta, Xy)
+        R_norm2 = max(yTy - 2 * bXy + np.dot(beta, Gbeta), 0.)
+        return _duality_gap(beta, Xy - Gbeta, R_norm2, yTy - bXy,
+                            n_samples, tau, mu)
+
+    lipschitz_constant = get_lipschitz(gram, gram=True)
+    sigma = lipschitz_constant / n_samples + mu
+
+    Gbeta = np.dot(gram, beta)
+    if stopping == 'gap':
+        tol = tol * yTy / n_samples
+
+    if sigma < np.finfo(float).eps:  # is zero...
+        return beta, gap_of(beta, Gbeta), tol, 0
+
+    mu_s = 1 - mu * n_samples / (lipschitz_constant + mu * n_samples)
+    tau_s = tau * n_samples * 0.5 / (lipschitz_constant + mu * n_samples)
+    gamma = 1. / (lipschitz_constant + mu * n_samples)
+
+    # Starting conditions, in the work buffers (updated in place)
+    if workspace is None:
+        workspace = Workspace()
+    n_features, dtype = beta.shape[0], beta.dtype
+    aux_beta = workspace.get('aux_beta', (n_features, ), dtype)
+    aux_beta[:] = beta
+    beta = workspace.get('beta', (n_features, ), dtype)
+    beta[:] = aux_beta
+    beta_next = workspace.get('beta_next', (n_features, ), dtype)
+    beta_diff = workspace.get('beta_diff', (n_features, ), dtype)
+    value = workspace.get('value', (n_features, ), dtype)
+    grad = workspace.get('grad', (n_features, ), dtype)
+    np.subtract(Xy, Gbeta, out=grad)
+    Gbeta_next = workspace.get('Gbeta_next', (n_features, ), dtype)
+    t = 1.
+
+    for n_iter in xrange(max_iter):
+        # Soft-Thresholding
+        np.multiply(grad, gamma, out=value)
+        np.multiply(aux_beta, mu_s, out=beta_next)
+        value += beta_next
+        _soft_threshold(value, tau_s, out=beta_next)
+
+        # Pre-calculated "heavy" computation, on the new iterate
+        _dot_into(gram, beta_next, Gbeta_next)
+
+        # FISTA
+        np.subtract(beta_next, beta, out=beta_diff)
+        t_next = 0.5 * (1 + sqrt(1 + 4 * t * t))
+        momentum = (t - 1) / t_next
+        np.multiply(beta_diff, momentum, out=aux_beta)
+        aux_beta += beta_next
+        np.multiply(Gbeta_next, -(1 + momentum), out=grad)
+        grad += Xy
+        np.multiply(Gbeta, momentum, out=value)
+        grad += value
+
+        # Values update (swapping the buffers)
         t = t_next
-        # beta = np.copy(beta_next)
-        beta = beta_next
+        beta, beta_next = beta_next, beta
+        Gbeta, Gbeta_next = Gbeta_next, Gbeta
 
         # Stopping rule (exit even if beta_next contains only zeros)
-        if max_coef == 0.0 or (max_diff / max_coef) <= tol:
-            break
+        if stopping == 'gap':
+            gap = gap_of(beta, Gbeta)
+            if gap <= tol:
+                break
+        else:
+            # Convergence values
+            max_diff = np.abs(beta_diff, out=value).max()
+            max_coef = np.abs(beta, out=value).max()
+            if max_coef == 0.0 or (max_diff / max_coef) <= tol:
+                break
+
+    if stopping != 'gap':
+        gap = gap_of(beta, Gbeta)
+    # the workspace may be reused by the next solve
+    return beta.copy(), gap, tol, n_iter + 1
+
+
+def screened_fista_l1l2(beta, tau, mu, X, y, max_iter, tol, rng, random,
+                        positive, corr, tau_prev, stopping='coef',
+                        gram=None, Xy=None, X_offset=None, X_scale=None,
+                        workspace=None):
+    """Fista algorithm on the working set of the sequential strong rule.
+
+    ``corr`` is the correlation vector of ``beta``, the solution for
+    ``tau_prev`` (see :mod:`l1l2py.screening`). The discarded features
+    violating the KKT conditions are added back to the working set.
+    The correlation vector of the solution is returned as last value.
+    If ``gram`` and ``Xy`` are given, ``fista_l1l2_gram`` is used on the
+    working set and ``X`` is not needed.
+    If ``X_offset`` and ``X_scale`` are given, ``X`` (dense or sparse) is
+    implicitly centered and scaled with them (see
+    :func:`l1l2py.base.centered_operator`).
+    """
+    n_samples = y.shape[0]
+    working = strong_set(corr, tau, tau_prev, beta)
 
-    return beta, None, tol, n_iter + 1
+    if X_offset is None:
+        X_full = X
+    else:
+        X_full = centered_operator(X, X_offset, X_scale)
+    n_iter = 0
+
+    while True:
+        columns = np.flatnonzero(working)
+        beta_next = np.zeros_like(beta)
+        if len(columns) and gram is not None:
+            beta_next[columns], _, _, n_iter_ = fista_l1l2_gram(
+                beta[columns], tau, mu, gram[np.ix_(columns, columns)],
+                Xy[columns], y, max_iter, tol, rng, random, positive,
+                stopping=stopping, workspace=workspace)
+            n_iter += n_iter_
+        elif len(columns):
+            beta_next[columns], _, _, n_iter_ = fista_l1l2(
+                beta[columns], tau, mu, X[:, columns], y, max_iter, tol, rng,
+                random, positive, stopping=stopping, workspace=workspace,
+                X_offset=None if X_offset is None else X_offset[columns],
+                X_scale=None if X_scale is None else X_scale[columns])
+            n_iter += n_iter_
+
+        if gram is not None:
+            Gbeta = np.dot(gram, beta_next)
+            grad = Xy - Gbeta
+        else:
+            residual = y - X_full.dot(beta_next)
+            grad = X_full.T.dot(residual)
+        corr = grad * (2. / n_samples)
+        violations = kkt_violations(corr, tau, working)
+        if not violations.any():
+            break
+        working |= violations
+
+    yTy = np.dot(y, y)
+    if stopping == 'gap':
+        tol = tol * yTy / n_samples
+    if gram is not None:
+        bXy = np.dot(beta_next, Xy)
+        gap = _duality_gap(beta_next, grad,
+                           max(yTy - 2 * bXy + np.dot(beta_next, Gbeta), 0.),
+                           yTy - bXy, n_samples, tau, mu)
+    else:
+        gap = duality_gap(beta_next, residual, grad, y, tau, mu)
+    return beta_next, gap, tol, n_iter, corr
 
 
 def l1l2_regularization(
@@ -234,25 +633,37 @@ def l1l2_regularization(
         multi_output = True
         _, n_outputs = y.shape
 
-    # MultiTaskElasticNet does not support sparse matrices
     from scipy import sparse
-    if not multi_output and sparse.isspmatrix(X):
-        if 'X_offset' in params:
-            # As sparse matrices are not actually centered we need this
-            # to be passed to the CD solver.
-            X_sparse_scaling = params['X_offset'] / params['X_scale']
-            X_sparse_scaling = np.asarray(X_sparse_scaling, dtype=X.dtype)
-        else:
-            X_sparse_scaling = np.zeros(n_features, dtype=X.dtype)
-
-    # X should be normalized and fit already if function is called
-    # from ElasticNet.fit
-    if check_input:
+    # If X_offset is given (e.g. by L1L2.fit), X is not centered nor
+    # normalized: the solvers do it implicitly (as for sparse matrices)
+    implicit = 'X_offset' in params or sparse.isspmatrix(X)
+    if implicit:
+        X_offset = np.asarray(params.get('X_offset', np.zeros(n_features)),
+                              dtype=X.dtype)
+        X_scale = np.asarray(params.get('X_scale', np.ones(n_features)),
+                             dtype=X.dtype)
+        X_centered = centered_operator(X, X_offset, X_scale)
+    else:
+        X_centered = X
+
+    if check_input and implicit:
+        if sparse.isspmatrix(X):
+            precompute = False
+        elif (isinstance(precompute, six.string_types) and
+              precompute == 'auto'):
+            precompute = X.shape[0] > n_features
+        if precompute is True:
+            precompute = implicit_gram(X, X_offset, X_scale)
+        if isinstance(precompute, np.ndarray) and Xy is None:
+            Xy = X_centered.T.dot(y)
+    elif check_input:
         X, y, X_offset, y_offset, X_scale, precompute, Xy = \
             _pre_fit(X, y, Xy, precompute, normalize=False,
                      fit_intercept=False, copy=False)
     if alphas is None:
         # No need to normalize of fit_intercept: it has been done above
+        if implicit and Xy is None:
+            Xy = X_centered.T.dot(y)
         alphas = _alpha_grid(X, y, Xy=Xy, l1_ratio=l1_ratio,
                              fit_intercept=False, eps=eps, n_alphas=n_alphas,
                              normalize=False, copy_X=False)
@@ -260,8 +671,6 @@ def l1l2_regularization(
         alphas = np.sort(alphas)[::-1]  # make sure alphas are properly ordered
 
     n_alphas = len(alphas)
-    tol = params.get('tol', 1e-4)
-    max_iter = params.get('max_iter', 1000)
     dual_gaps = np.empty(n_alphas)
     n_iters = []
 
@@ -270,6 +679,9 @@ def l1l2_regularization(
     if selection not in ['random', 'cyclic']:
         raise ValueError("selection should be either random or cyclic.")
     random = (selection == 'random')
+    screening = params.get('screening', True)
+    stopping = params.get('stopping', 'coef')
+    multi_task = params.get('multi_task', False)
 
     if not multi_output:
         coefs = np.empty((n_features, n_alphas), dtype=X.dtype)
@@ -282,37 +694,67 @@ def l1l2_regularization(
     else:
         coef_ = np.asfortranarray(coef_init, dtype=X.dtype)
 
+    if screening and not multi_output:
+        if isinstance(precompute, np.ndarray) and not sparse.isspmatrix(X):
+            if Xy is None:
+                Xy = X_centered.T.dot(y)
+            corr = correlation(X, y, coef_, precompute, Xy)
+        else:
+            corr = correlation(X_centered, y, coef_)
+        l1_prev = np.abs(corr).max()
+    else:
+        screening = False
+
+    # work buffers shared by all the solves of the path
+    workspace = Workspace()
+
     for i, alpha in enumerate(alphas):
-        l1_reg = alpha * l1_ratio * 2  # * n_samples
-        l2_reg = alpha * (1.0 - l1_ratio)  # * n_samples
-        if not multi_output and sparse.isspmatrix(X):
-            # model = cd_fast.sparse_enet_coordinate_descent(
-            #     coef_, l1_reg, l2_reg, X.data, X.indices,
-            #     X.indptr, y, X_sparse_scaling,
-            #     max_iter, tol, rng, random, positive)
-            raise NotImplementedError()
-        elif multi_output:
-            # model = cd_fast.enet_coordinate_descent_multi_task(
-            #     coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random)
-            raise NotImplementedError('Multi output not implemented')
-        elif isinstance(precompute, np.ndarray):
+        # Python scalars do not promote single precision arrays
+        l1_reg = float(alpha * l1_ratio * 2)  # * n_samples
+        l2_reg = float(alpha * (1.0 - l1_ratio))  # * n_samples
+        if multi_output:
+            model = fista_l1l2_multi(
+                coef_.T, l1_reg, l2_reg, X_centered, y, max_iter, tol, rng,
+                random, positive, stopping=stopping, multi_task=multi_task)
+            model = (model[0].T, ) + model[1:]
+        elif isinstance(precompute, np.ndarray) and not sparse.isspmatrix(X):
             # We expect precompute to be already Fortran ordered when bypassing
             # checks
             if check_input:
                 precompute = check_array(precompute, dtype=np.float64,
                                          order='C')
-            # model = cd_fast.enet_coordinate_descent_gram(
-            #     coef_, l1_reg, l2_reg, precompute, Xy, y, max_iter,
-            #     tol, rng, random, positive)
-            raise NotImplementedError()
-
-        elif precompute is False:
+            if Xy is None:
+                Xy = X_centered.T.dot(y)
+            if screening:
+                model = screened_fista_l1l2(
+                    coef_, l1_reg, l2_reg, None, y, max_iter, tol, rng,
+                    random, positive, corr, l1_prev, stopping=stopping,
+                    gram=precompute, Xy=Xy, workspace=workspace)
+                corr, l1_prev = model[-1], l1_reg
+                model = model[:-1]
+            else:
+                model = fista_l1l2_gram(
+                    coef_, l1_reg, l2_reg, precompute, Xy, y, max_iter, tol,
+                    rng, random, positive, stopping=stopping,
+                    workspace=workspace)
+        elif (precompute is False or sparse.isspmatrix(X)) and screening:
+            # Centering is implicit, through X_offset and X_scale
+            model = screened_fista_l1l2(
+                coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
+                positive, corr, l1_prev, stopping=stopping,
+                X_offset=X_offset if implicit else None,
+                X_scale=X_scale if implicit else None, workspace=workspace)
+            corr, l1_prev = model[-1], l1_reg
+            model = model[:-1]
+        elif precompute is False or sparse.isspmatrix(X):
             # model = cd_fast.enet_coordinate_descent(
             #     coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
             #     positive)
             model = fista_l1l2(
                 coef_, l1_reg, l2_reg, X, y, max_iter, tol, rng, random,
-                positive)
+                positive, stopping=stopping, workspace=workspace,
+                X_offset=X_offset if implicit else None,
+                X_scale=X_scale if implicit else None)
         else:
             raise ValueError("Precompute should be one of True, False, "
                              "'auto' or array-like. Got %r" % precompute)
@@ -320,8 +762,11 @@ def l1l2_regularization(
         coefs[..., i] = coef_
         dual_gaps[i] = dual_gap_
         n_iters.append(n_iter_)
-        #if dual_gap_ > eps_:  # TODO evaluate the dual gap
-        if n_iter_ >= max_iter:
+        if stopping == 'gap':
+            converged = dual_gap_ <= eps_
+        else:
+            converged = n_iter_ < max_iter
+        if not converged:
             import warnings
             warnings.warn('Objective did not converge.' +
                           ' You might want' +
@@ -344,7 +789,7 @@ def l1l2_regularization(
     return alphas, coefs, dual_gaps
 
 
-class L1L2(SelectorMixin, ElasticNet):
+class L1L2(CompactCoefMixin, SelectorMixin, ElasticNet):
     r"""Linear regression with combined L1 and L2 priors as regularizer.
 
     Minimizes the objective function::
@@ -396,22 +841,36 @@ class L1L2(SelectorMixin, ElasticNet):
         :class:`preprocessing.StandardScaler` before calling ``fit`` on an
         estimator with ``normalize=False``.
 
-    precompute : True | False | array-like
+    precompute : True | False | 'auto' | array-like
         Whether to use a precomputed Gram matrix to speed up
         calculations. The Gram matrix can also be passed as argument.
-        For sparse input this option is always ``True`` to preserve sparsity.
+        With the Gram matrix, the FISTA iterations are performed in the
+        features space only (each one costs a (n_features, n_features)
+        product instead of two (n_samples, n_features) ones), which is
+        convenient when ``n_samples > n_features``.
+        If 'auto', the Gram matrix is used only in that case.
 
     max_iter : int, optional
         The maximum number of iterations
 
     copy_X : boolean, optional, default True
-        If ``True``, X will be copied; else, it may be overwritten.
+        Unused: X is centered and normalized implicitly by the solver, so it
+        is never copied nor overwritten.
 
     tol : float, optional
-        The tolerance for the optimization: if the updates are
-        smaller than ``tol``, the optimization code checks the
-        dual gap for optimality and continues until it is smaller
-        than ``tol``.
+        The tolerance for the optimization, see ``stopping``.
+
+    stopping : 'coef' | 'gap', default 'coef'
+        Stopping rule of the FISTA iterations. If 'coef', they stop when the
+        relative change of the coefficients is smaller than ``tol``.
+        If 'gap', they stop when the duality gap is smaller than ``tol``
+        times the objective of the null solution.
+
+    multi_task : bool, default False
+        Only used with multiple targets, which are all solved at once.
+        If True, the l1 norm is replaced by the l2,1 norm of the rows of the
+        coefficients (``sum_j ||W[:, j]||_2``), so that the same features
+        are selected for all the targets.
 
     warm_start : bool, optional
         When set to ``True``, reuse the solution of the previous call to fit as
@@ -431,6 +890,11 @@ class L1L2(SelectorMixin, ElasticNet):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    compact : bool, optional, default False
+        If ``True``, only the compact form of the coefficients is kept
+        (``coef_indices_`` and ``coef_values_``), and ``coef_`` is rebuilt
+        each time it is read. Useful with many features and few selected.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -440,9 +904,19 @@ class L1L2(SelectorMixin, ElasticNet):
             (n_targets, n_features)
         ``sparse_coef_`` is a readonly property derived from ``coef_``
 
+    coef_indices_ : array, shape (n_selected,)
+        indices of the features with a non-zero coefficient.
+
+    coef_values_ : array, shape (n_selected,) | (n_targets, n_selected)
+        coefficients of the features in ``coef_indices_``.
+
     intercept_ : float | array, shape (n_targets,)
         independent term in decision function.
 
+    dual_gap_ : float
+        duality gap of the solution (an upper bound of the distance of the
+        objective from its minimum), summed over the targets.
+
     n_iter_ : array-like, shape (n_targets,)
         number of iterations run by the coordinate descent solver to reach
         the specified tolerance.
@@ -454,7 +928,8 @@ class L1L2(SelectorMixin, ElasticNet):
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', stopping='coef',
+                 multi_task=False, compact=False):
         self.mu = mu
         self.tau = tau
         self.use_gpu = use_gpu
@@ -474,6 +949,9 @@ class L1L2(SelectorMixin, ElasticNet):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.stopping = stopping
+        self.multi_task = multi_task
+        self.compact = compact
 
     def fit(self, X, y, check_input=True):
         """Fit model with fista.
@@ -501,22 +979,85 @@ class L1L2(SelectorMixin, ElasticNet):
                 self.l1_ratio = self.tau / (self.tau + self.mu * 2.)
             self.alpha = 0.5 * self.tau + self.mu
 
-        # self.coef_ = self.path(
-        #     X, y, self.mu, self.tau, beta=None, kmax=self.max_iter,
-        #     tolerance=self.tol, return_iterations=False, adaptive=False)
-        # print "l1l2 fit tau", self.tau, "mu", self.mu, "alpha", self.alpha, "l1_ratio", self.l1_ratio
-        super(L1L2, self).fit(X, y, check_input)
+        # We expect X and y to be float64 or float32 Fortran ordered arrays
+        # when bypassing checks
+        if check_input:
+            # X is centered and normalized implicitly, so it is never copied
+            X, y = check_X_y(X, y, accept_sparse='csc',
+                             order='F', dtype=[np.float64, np.float32],
+                             copy=False, multi_output=True, y_numeric=True)
+            y = check_array(y, order='F', copy=False, dtype=X.dtype.type,
+                            ensure_2d=False)
+
+        X, y, X_offset, y_offset, X_scale, precompute, Xy = \
+            implicit_pre_fit(X, y, None, self.precompute, self.normalize,
+                             self.fit_intercept)
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+        if Xy is not None and Xy.ndim == 1:
+            Xy = Xy[:, np.newaxis]
+
+        n_samples, n_features = X.shape
+        n_targets = y.shape[1]
+
+        if not self.warm_start or self.coef_ is None:
+            coef_ = np.zeros((n_targets, n_features), dtype=X.dtype,
+                             order='F')
+        else:
+            coef_ = self.coef_
+            if coef_.ndim == 1:
+                coef_ = coef_[np.newaxis, :]
+
+        path_params = dict(
+            l1_ratio=self.l1_ratio, eps=None, n_alphas=None,
+            alphas=[self.alpha], precompute=precompute, copy_X=True,
+            verbose=False, tol=self.tol, positive=self.positive,
+            X_offset=X_offset, X_scale=X_scale, return_n_iter=True,
+            max_iter=self.max_iter, random_state=self.random_state,
+            selection=self.selection, stopping=self.stopping,
+            multi_task=self.multi_task, check_input=False)
+
+        if n_targets > 1:
+            # all the targets are solved at once
+            _, this_coef, this_dual_gap, this_iter = self.path(
+                X, y, coef_init=coef_, **path_params)
+            coef_ = this_coef[..., 0]
+            dual_gaps_ = this_dual_gap[0]
+            self.n_iter_ = this_iter[0]
+        else:
+            this_Xy = None if Xy is None else Xy[:, 0]
+            _, this_coef, this_dual_gap, this_iter = self.path(
+                X, y[:, 0], coef_init=coef_[0], Xy=this_Xy, **path_params)
+            coef_[0] = this_coef[:, 0]
+            dual_gaps_ = this_dual_gap[0]
+            self.n_iter_ = this_iter[0]
+
+        self.coef_, self.dual_gap_ = np.squeeze(coef_), dual_gaps_
+        self._set_intercept(X_offset, y_offset, X_scale)
+
+        # workaround since _set_intercept will cast self.coef_ into float64
+        self.coef_ = np.asarray(self.coef_, dtype=X.dtype)
 
         return self
 
-    def _get_support_mask(self):
+    def _decision_function(self, X):
         check_is_fitted(self, "n_iter_")
-        scores = _get_feature_importances(self)
-        self.threshold_ = _calculate_threshold(self, scores, self.threshold)
-        return scores >= self.threshold_
+        return self._compact_decision_function(X)
 
-
-class L1L2TwoStep(Pipeline):
+    def _get_support_mask(self):
+        check_is_fitted(self, "n_iter_")
+        # cached until coef_ or threshold change
+        support = self.__dict__.get('_support')
+        if support is None or support[0] != self.threshold:
+            scores = _get_feature_importances(self)
+            self.threshold_ = _calculate_threshold(
+                self, scores, self.threshold)
+            support = self._support = (self.threshold,
+                                       scores >= self.threshold_)
+        return support[1]
+
+
+class L1L2TwoStep(CompactCoefMixin, Pipeline):
     r"""L1L2 penalized linear regression with overshrinking correction.
 
     Linear regression with combined L1 and L2 priors as regularizer,
@@ -613,6 +1154,11 @@ class L1L2TwoStep(Pipeline):
         a random feature to update. Useful only when selection is set to
         'random'.
 
+    compact : bool, optional, default False
+        If ``True``, only the compact form of the coefficients is kept
+        (``coef_indices_`` and ``coef_values_``), and ``coef_`` is rebuilt
+        each time it is read. Useful with many features and few selected.
+
     Attributes
     ----------
     coef_ : array, shape (n_features,) | (n_targets, n_features)
@@ -622,6 +1168,12 @@ class L1L2TwoStep(Pipeline):
             (n_targets, n_features)
         ``sparse_coef_`` is a readonly property derived from ``coef_``
 
+    coef_indices_ : array, shape (n_selected,)
+        indices of the features with a non-zero coefficient.
+
+    coef_values_ : array, shape (n_selected,) | (n_targets, n_selected)
+        coefficients of the features in ``coef_indices_``.
+
     intercept_ : float | array, shape (n_targets,)
         independent term in decision function.
 
@@ -634,13 +1186,14 @@ class L1L2TwoStep(Pipeline):
                  alpha=None, l1_ratio=None, fit_intercept=True,
                  normalize=False, precompute=False, max_iter=10000,
                  copy_X=True, tol=1e-4, warm_start=False, positive=False,
-                 random_state=None, selection='cyclic'):
+                 random_state=None, selection='cyclic', compact=False):
         vs = L1L2(mu=mu, tau=tau, use_gpu=use_gpu, threshold=threshold,
                   alpha=alpha, l1_ratio=l1_ratio, fit_intercept=fit_intercept,
                   normalize=normalize, precompute=precompute,
                   max_iter=max_iter, copy_X=copy_X, tol=tol,
                   warm_start=warm_start, positive=positive,
-                  random_state=random_state, selection=selection)
+                  random_state=random_state, selection=selection,
+                  compact=compact)
         mdl = Ridge(alpha=lamda, fit_intercept=fit_intercept,
                     normalize=normalize, copy_X=copy_X, max_iter=max_iter,
                     tol=tol, random_state=random_state)
@@ -666,6 +1219,7 @@ class L1L2TwoStep(Pipeline):
         self.intercept_ = 0.0
         self.random_state = random_state
         self.selection = selection
+        self.compact = compact
 
     def fit(self, X, y, **fit_params):
         """Fit Ridge regression model on top of L1L2 selected features.
@@ -697,20 +1251,25 @@ class L1L2TwoStep(Pipeline):
                 fit_params_['__'.join(('ridge', mapped))] = fit_params[param]
         super(L1L2TwoStep, self).fit(X, y, **fit_params_)
 
-        # self.coef_ contains a zero vector apart from coef_ selected by Ridge
-        l1l2_coef_ = self.steps[0][1].coef_
-        ridge_coef_ = self.steps[1][1].coef_
-        selected_ = np.nonzero(l1l2_coef_)[0]
-        coef_ = np.zeros_like(l1l2_coef_)
-        coef_[selected_] = ridge_coef_
-        self.coef_ = coef_
+        # coef_ is null apart from the coefficients selected by Ridge
+        support = self.steps[0][1].get_support()
+        self._set_compact_coef(np.flatnonzero(support),
+                               self.steps[1][1].coef_, support.shape[0])
+        self.intercept_ = self.steps[1][1].intercept_
 
         return self
 
-    # @property
-    # def coef_(self):
-    #     check_is_fitted(self.steps[1][1], "coef_")
-    #     return self.steps[1][1].coef_
+    def predict(self, X):
+        """Predict using the Ridge model on the L1L2 selected features.
+
+        The selected columns of X are multiplied by ``coef_values_`` at
+        once, without the ``transform`` of the L1L2 step.
+        """
+        check_is_fitted(self, 'coef_values_')
+        return self._compact_decision_function(X)
+
+    def score(self, X, y, sample_weight=None):
+        return RegressorMixin.score(self, X, y, sample_weight=sample_weight)
 
     def set_params(self, **kwargs):
         """Set the parameters of this estimator.
@@ -729,7 +1288,8 @@ class L1L2TwoStep(Pipeline):
             normalize='normalize', precompute='precompute',
             max_iter='max_iter', copy_X='copy_X', tol='tol',
             warm_start='warm_start', positive='positive',
-            random_state='random_state', selection='selection')
+            random_state='random_state', selection='selection',
+            compact='compact')
         for mapped, param in six.iteritems(map_l1l2):
             if kwargs.get(param, None) is not None:
                 kwargs['__'.join(('l1l2', mapped))] = kwargs[param]
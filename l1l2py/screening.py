@@ -0,0 +1,126 @@
+r"""Feature screening for the `l1l2` regularization path.
+
+Along the path the solutions are very sparse, so most of the columns of
+the data matrix are zero in the solution.
+The *sequential strong rule* guesses them from the solution of the
+previous (bigger) value of ``tau``, so that the solver only iterates on a
+working set of columns.
+The guess is not safe: the discarded columns are checked against the
+optimality (KKT) conditions and the violating ones are put back in the
+working set.
+
+For the `l1l2` functional
+
+.. math::
+
+    \frac{1}{n} \| Y - X\beta \|_2^2 + \tau \|\beta\|_1
+    + \mu \|\beta\|_2^2
+
+a null coefficient :math:`\beta_j` is optimal if and only if
+:math:`|c_j| \leq \tau`, where :math:`c = \frac{2}{n} X^T (Y - X\beta)`.
+"""
+
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+__all__ = ('correlation', 'strong_set', 'kkt_violations')
+
+
+def correlation(data, labels, beta, gram=None, XTY=None):
+    r"""Scaled correlation between the columns of ``data`` and the residual.
+
+    Parameters
+    ----------
+    data : (N, P) ndarray
+        Data matrix.
+    labels : (N,) or (N, 1) ndarray
+        Labels vector.
+    beta : (P,) or (P, 1) ndarray
+        Current solution.
+    gram : (P, P) ndarray, optional (default is `None`)
+        Gram matrix ``X^T X``. If given (with ``XTY``), ``data`` is not used.
+    XTY : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Correlation between data and labels.
+
+    Returns
+    -------
+    corr : (P,) ndarray
+        The vector ``2/N X^T (Y - X beta)``.
+
+    """
+    n = data.shape[0]
+    beta = np.ravel(beta)
+    if gram is not None and XTY is not None:
+        corr = np.ravel(XTY) - np.dot(gram, beta)
+    else:
+        corr = data.T.dot(np.ravel(labels) - data.dot(beta))
+    return np.ravel(corr) * (2. / n)
+
+
+def strong_set(corr, tau, tau_prev, beta=None):
+    r"""Sequential strong rule.
+
+    The column `j` is kept if ``|corr_j| >= 2 tau - tau_prev``, where
+    ``corr`` is evaluated on the solution for ``tau_prev``, or if it is
+    non-zero in ``beta``.
+
+    Parameters
+    ----------
+    corr : (P,) ndarray
+        Correlation vector (see ``correlation``) of the previous solution.
+    tau : float
+        Current `l1-norm` penalty.
+    tau_prev : float
+        `l1-norm` penalty of the previous solution.
+    beta : (P,) or (P, 1) ndarray, optional (default is `None`)
+        Previous solution.
+
+    Returns
+    -------
+    working : (P,) ndarray of bool
+        Working set of columns.
+
+    """
+    working = np.abs(corr) >= (2. * tau - tau_prev)
+    if beta is not None:
+        working |= (np.ravel(beta) != 0.0)
+    return working
+
+
+def kkt_violations(corr, tau, working):
+    r"""Discarded columns violating the optimality conditions.
+
+    Parameters
+    ----------
+    corr : (P,) ndarray
+        Correlation vector (see ``correlation``) of the current solution.
+    tau : float
+        Current `l1-norm` penalty.
+    working : (P,) ndarray of bool
+        Working set of columns used to find the current solution.
+
+    Returns
+    -------
+    violations : (P,) ndarray of bool
+        Columns out of ``working`` with ``|corr_j| > tau``.
+
+    """
+    return ~working & (np.abs(corr) > tau)
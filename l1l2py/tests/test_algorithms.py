@@ -20,11 +20,12 @@
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
-from nose.tools import assert_equals, assert_equal, assert_true
+from nose.tools import assert_equals, assert_equal, assert_true, assert_raises
 from six.moves import xrange
 
 from l1l2py.algorithms import (
-    ridge_regression, l1l2_regularization, l1_bound, l1l2_path)
+    ridge_regression, ridge_path, l1l2_regularization, l1_bound, l1l2_path,
+    l1l2_path_batch, l1l2_path_folds, RegularizationPath)
 from l1l2py.tests import _TEST_DATA_PATH
 
 
@@ -60,6 +61,79 @@ class TestAlgorithms(object):
         value = ridge_regression(X, Y)
         assert_true(np.allclose(expected, value))
 
+    def test_ridge_solvers(self):
+        from scipy import sparse
+        from l1l2py.algorithms import ridge_solver
+
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0, :])):
+            for penalty in (0.0, 0.1):
+                expected = ridge_regression(X, Y, penalty, solver='svd')
+                for solver in ('cholesky', 'lsqr'):
+                    value = ridge_regression(X, Y, penalty, solver=solver)
+                    assert_equal(value.shape, (X.shape[1], 1))
+                    assert_true(np.allclose(expected, value, atol=1e-6))
+
+            assert_equal(ridge_solver(X), 'svd')
+            assert_equal(ridge_solver(X, 0.1), 'cholesky')
+            assert_equal(ridge_solver(sparse.csr_matrix(X), 0.1), 'lsqr')
+
+        assert_raises(ValueError, ridge_regression, self.X, self.Y,
+                      solver='qr')
+
+    def test_ridge_gram(self):
+        from l1l2py.algorithms import _ridge_gram
+
+        # full rank, and rank deficient Gram matrices
+        for X, Y in ((self.X[:, :10], self.Y), (self.X, self.Y)):
+            gram, XTY = np.dot(X.T, X), np.dot(X.T, Y).reshape(-1, 1)
+            for penalty in (0.0, 0.1):
+                expected = ridge_regression(X, Y, penalty)
+                value = _ridge_gram(gram, XTY, X.shape[0], penalty)
+                assert_equal(value.shape, (X.shape[1], 1))
+                assert_true(np.allclose(expected, value))
+
+    def test_ridge_path(self):
+        from l1l2py.algorithms import _ridge_gram_path
+
+        penalties = np.linspace(0.0, 1.0, 5)
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0, :]),
+                     (self.X[:, :10], self.Y)):
+            betas = ridge_path(X, Y, penalties)
+            assert_equal(betas.shape, (len(penalties), X.shape[1], 1))
+
+            betas_gram = _ridge_gram_path(np.dot(X.T, X), np.dot(X.T, Y),
+                                          X.shape[0], penalties)
+            for beta, beta_gram, penalty in zip(betas, betas_gram, penalties):
+                expected = ridge_regression(X, Y, penalty)
+                assert_true(np.allclose(expected, beta))
+                assert_true(np.allclose(expected, beta_gram))
+
+    def test_incremental_ridge(self):
+        from l1l2py.algorithms import IncrementalRidge, PrecomputedData
+
+        random_state = np.random.RandomState(0)
+        X = random_state.randn(60, 30)
+        Y = random_state.randn(60)
+        penalties = [0.0, 0.01, 1.0]
+
+        for precomputed in (None, PrecomputedData(X, Y, gram=True)):
+            ridge = IncrementalRidge(X, Y, penalties, precomputed)
+            for i in xrange(20):
+                selected = random_state.rand(30) < 0.2 + 0.02 * i
+                expected = ridge_path(X[:, selected], Y, penalties)
+                assert_true(np.allclose(expected, ridge.solve(selected)))
+
+        # dependent columns
+        X[:, 1] = X[:, 0]
+        ridge = IncrementalRidge(X, Y, penalties)
+        ridge.solve([0, 2])
+        assert_raises(np.linalg.LinAlgError, ridge.solve, [0, 1, 2])
+        assert_equal(ridge.columns, [])
+
+        ridge = IncrementalRidge(X, Y, penalties[1:])
+        assert_true(np.allclose(ridge_path(X[:, :3], Y, penalties[1:]),
+                                ridge.solve([0, 1, 2])))
+
     def test_l1l2_bigd(self):
         self.l1l2_regtest(self.X, self.Y)
 
@@ -128,6 +202,125 @@ class TestAlgorithms(object):
 
             assert_true(selected <= len(b))
 
+    def test_regularization_path(self):
+        values = [0.1, 0.5, 1.0, 1e4]
+        path = l1l2_path(self.X, self.Y, 0.1, values)
+        assert_equals((3, self.X.shape[1]), path.coefs.shape)
+        for i, beta in enumerate(path):
+            assert_equals((self.X.shape[1], 1), beta.shape)
+            assert_true(np.may_share_memory(beta, path.coefs))
+            assert_equals(np.count_nonzero(beta), path.nonzero[i])
+            assert_true(np.array_equal(np.flatnonzero(beta), path.support(i)))
+
+        # the sparse storage keeps the same solutions
+        for value in (path.tocsr(),
+                      l1l2_path(self.X, self.Y, 0.1, values, sparse=True)):
+            assert_true(value.sparse)
+            assert_equals(len(path), len(value))
+            assert_true(np.array_equal(path.nonzero, value.nonzero))
+            for i in xrange(len(path)):
+                assert_true(np.allclose(path[i], value[i]))
+                assert_true(np.array_equal(path.support(i), value.support(i)))
+
+        # void solutions are dropped
+        coefs = np.zeros((3, 4))
+        coefs[1, 2] = 1.0
+        path = RegularizationPath(coefs)
+        assert_equals(1, len(path))
+        assert_raises(IndexError, path.__getitem__, 1)
+
+    def test_l1l2_path_batch(self):
+        values = [0.1, 0.5, 1.0, 1e4]
+        for mu in (0.1, 1.0):
+            expected = l1l2_path(self.X, self.Y, mu, values, tolerance=1e-8)
+            value = l1l2_path_batch(self.X, self.Y, mu, values,
+                                    tolerance=1e-8)
+            assert_equals(len(expected), len(value))
+            for b1, b2 in zip(expected, value):
+                assert_true(np.allclose(b1, b2, atol=1e-3))
+
+        # same null solutions and same values, also for mu = 0.0 and for
+        # tau equal to the maximum correlation of the empty model
+        tau_max = l1_bound(self.X, self.Y)
+        taus = list(np.linspace(0.05, 1.0, 19) * tau_max) + [tau_max]
+        for mu in (0.0, 0.1):
+            for tau_range in (values, taus):
+                expected = l1l2_path(self.X, self.Y, mu, tau_range,
+                                     tolerance=1e-8)
+                value = l1l2_path_batch(self.X, self.Y, mu, tau_range,
+                                        tolerance=1e-8)
+                assert_equals(len(expected), len(value))
+                assert_true(np.allclose(expected.coefs, value.coefs,
+                                        atol=1e-8))
+        assert_equals(0, len(l1l2_path_batch(self.X, self.Y, 0.1, [tau_max])))
+
+        value = l1l2_path(self.X, self.Y, 0.1, values, batch=True)
+        assert_equals(3, len(value))
+        assert_raises(ValueError, l1l2_path, self.X, self.Y, 0.1, values,
+                      batch=True, adaptive=True)
+
+    def test_l1l2_path_extrapolate(self):
+        from l1l2py.algorithms import PrecomputedData, _fixed_signs_l1l2
+        values = np.linspace(0.01, 0.1, 10)
+        for mu in (0.1, 1.0):
+            expected = l1l2_path(self.X, self.Y, mu, values, tolerance=1e-8,
+                                 extrapolate=False)
+            value = l1l2_path(self.X, self.Y, mu, values, tolerance=1e-8)
+            assert_equals(len(expected), len(value))
+            for b1, b2 in zip(expected, value):
+                assert_true(np.allclose(b1, b2, atol=1e-4))
+
+        # on the sign pattern of the solution, the closed form is the
+        # solution itself
+        precomputed = PrecomputedData(self.X, self.Y)
+        beta = l1l2_regularization(self.X, self.Y, 1.0, 0.1, tolerance=1e-12)
+        fixed = _fixed_signs_l1l2(self.X, self.Y, 1.0, 0.1, beta, precomputed)
+        assert_true(np.allclose(beta, fixed[0]))
+        # wrong signs are rejected
+        assert_equals(None, _fixed_signs_l1l2(self.X, self.Y, 1.0, 0.1, -beta,
+                                              precomputed))
+
+    def test_l1l2_path_folds(self):
+        values = [0.1, 0.5, 1.0, 1e4]
+        masks = np.zeros((3, 30), dtype=bool)
+        for j in xrange(3):
+            masks[j, j::3] = True
+        offsets = np.array([self.X[m].mean(axis=0) for m in masks])
+        scales = np.array([self.X[m].std(axis=0) for m in masks])
+
+        for mu in (0.1, 1.0):
+            value = l1l2_path_folds(self.X, self.Y, mu, values, masks,
+                                    offsets, scales, tolerance=1e-8)
+            assert_equals(3, len(value))
+            for j in xrange(3):
+                X = (self.X[masks[j]] - offsets[j]) / scales[j]
+                expected = l1l2_path(X, self.Y[masks[j]], mu, values,
+                                     tolerance=1e-8, screening=False,
+                                     extrapolate=False)
+                assert_equals(len(expected), len(value[j]))
+                for b1, b2 in zip(expected, value[j]):
+                    assert_true(np.allclose(b1, b2))
+
+    def test_l1l2_path_screening(self):
+        from l1l2py.screening import correlation, kkt_violations
+
+        values = np.linspace(0.1, 1.0, 5)
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0, :])):
+            expected = l1l2_path(X, Y, 0.1, values, screening=False)
+            value = l1l2_path(X, Y, 0.1, values)
+            assert_equals(len(expected), len(value))
+            for tau, b1, b2 in zip(values, expected, value):
+                assert_true(np.allclose(b1, b2))
+
+                # optimality conditions on the null coefficients
+                corr = correlation(X, Y, b2)
+                assert_true(np.all(np.abs(corr[b2.ravel() == 0]) <=
+                                   tau * (1 + 1e-2)))
+
+        working = np.array([True, False, False])
+        assert_true(np.all(kkt_violations(np.array([2., 2., .5]), 1.0,
+                                          working) == [False, True, False]))
+
     def test_l1_bound(self):
         tau_max = l1_bound(self.X, self.Y)
 
@@ -136,3 +329,95 @@ class TestAlgorithms(object):
 
         beta = l1l2_regularization(self.X, self.Y, 0.0, tau_max - 1e-3)
         assert_equals(1, len(beta.nonzero()[0]))
+
+    def test_precomputed(self):
+        from l1l2py.algorithms import PrecomputedData
+
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0, :])):
+            precomputed = PrecomputedData(X, Y)
+            assert_equal(X.shape[0] > X.shape[1],
+                         precomputed.gram is not None)
+
+            for mu, tau in ((0.1, 0.1), (1.0, 0.5)):
+                expected = l1l2_regularization(X, Y, mu, tau)
+                value = l1l2_regularization(X, Y, mu, tau,
+                                            precomputed=precomputed)
+                assert_true(np.allclose(expected, value))
+
+            expected = l1l2_path(X, Y, 0.1, [0.1, 0.5])
+            value = l1l2_path(X, Y, 0.1, [0.1, 0.5],
+                              precomputed=precomputed)
+            for b1, b2 in zip(expected, value):
+                assert_true(np.allclose(b1, b2))
+
+        # bound to the data matrix
+        precomputed = PrecomputedData(self.X, self.Y)
+        assert_raises(ValueError, l1l2_regularization, self.X.copy(), self.Y,
+                      0.1, 0.1, precomputed=precomputed)
+
+        # and to the labels of XTY: the same data with different labels
+        # are not solved with a stale XTY
+        Y = self.Y[::-1].copy()
+        assert_raises(ValueError, l1l2_regularization, self.X, Y, 0.1, 0.1,
+                      precomputed=precomputed)
+        assert_raises(ValueError, l1l2_path, self.X, Y, 0.1, [0.1, 0.5],
+                      precomputed=precomputed)
+        assert_raises(ValueError, l1l2_path_batch, self.X, Y, 0.1,
+                      [0.1, 0.5], precomputed=precomputed)
+        l1l2_regularization(self.X, self.Y.reshape(-1, 1), 0.1, 0.1,
+                            precomputed=precomputed)
+
+        # without labels, any labels are accepted
+        precomputed = PrecomputedData(self.X)
+        expected = l1l2_regularization(self.X, Y, 0.1, 0.1)
+        value = l1l2_regularization(self.X, Y, 0.1, 0.1,
+                                    precomputed=precomputed)
+        assert_true(np.allclose(expected, value))
+
+    def test_single_precision(self):
+        from l1l2py.algorithms import IncrementalRidge
+
+        # float32 data stay in single precision, with a relative accuracy
+        # close to the single precision machine epsilon (~1e-7)
+        for X, Y in ((self.X, self.Y), (self.X.T, self.X[0, :])):
+            X32, Y32 = X.astype(np.float32), Y.astype(np.float32)
+
+            for solver in ('cholesky', 'svd', 'lsqr'):
+                expected = ridge_regression(X, Y, 0.1, solver=solver)
+                value = ridge_regression(X32, Y32, 0.1, solver=solver)
+                assert_equal(value.dtype, np.float32)
+                assert_true(np.allclose(expected, value, rtol=1e-4,
+                                        atol=1e-4 * np.abs(expected).max()))
+
+            betas = ridge_path(X32, Y32, [0.0, 0.1])
+            assert_equal(betas.dtype, np.float32)
+            betas = IncrementalRidge(X32, Y32, [0.1]).solve([0, 1, 2])
+            assert_equal(betas.dtype, np.float32)
+
+            expected = l1l2_regularization(X, Y, 0.1, 0.1, tolerance=1e-6)
+            value = l1l2_regularization(X32, Y32, 0.1, 0.1, tolerance=1e-6)
+            assert_equal(value.dtype, np.float32)
+            assert_true(np.allclose(expected, value, rtol=1e-4,
+                                    atol=1e-4 * np.abs(expected).max()))
+
+            for batch in (False, True):
+                path = l1l2_path(X32, Y32, 0.1, [0.1, 0.5], batch=batch)
+                for beta in path:
+                    assert_equal(beta.dtype, np.float32)
+
+    def test_workspace(self):
+        from l1l2py.algorithms import Workspace
+
+        workspace = Workspace()
+        expected = l1l2_regularization(self.X, self.Y, 0.1, 0.1)
+        beta = l1l2_regularization(self.X, self.Y, 0.1, 0.1,
+                                   workspace=workspace)
+        assert_true(np.allclose(expected, beta))
+
+        # buffers are reused by smaller problems, not by the solutions
+        other = l1l2_regularization(self.X[:, :10], self.Y, 0.1, 0.1,
+                                    workspace=workspace)
+        assert_equal(other.shape, (10, 1))
+        assert_true(np.allclose(expected, beta))
+        assert_true(np.allclose(
+            l1l2_regularization(self.X[:, :10], self.Y, 0.1, 0.1), other))
@@ -104,3 +104,18 @@ def test_ridge():
     assert_array_almost_equal([0.84210526, 0.84210526], model.coef_)
     assert_array_almost_equal([14.73684211, 18.10526316, 4.63157895],
                               model.predict(T))
+
+def test_ridge_solvers():
+    """Test Ridge regression solvers."""
+    X = [[1, 2], [3, 4], [5, 6]]
+    y = [sum(x)+1 for x in X]
+
+    assert_equal('svd', RidgeRegression(mu=0.0).fit(X, y).solver_)
+    assert_equal('cholesky', RidgeRegression(mu=0.5).fit(X, y).solver_)
+
+    for solver in ('cholesky', 'svd', 'lsqr'):
+        model = RidgeRegression(mu=0.5, solver=solver).fit(X, y)
+        assert_equal(solver, model.solver_)
+        assert_array_almost_equal([0.91428571, 0.91428571], model.coef_)
+
+    assert_raises(ValueError, RidgeRegression(solver='qr').fit, X, y)
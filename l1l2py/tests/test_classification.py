@@ -27,6 +27,7 @@ from nose.tools import assert_equals, assert_raises, assert_true
 from l1l2py.classification import L1L2Classifier
 from l1l2py.classification import L1L2StageOneClassifier
 from l1l2py.classification import L1L2StageTwoClassifier
+from l1l2py.classification import L1L2TwoStepClassifier
 from l1l2py.tests import _TEST_DATA_PATH
 
 class TestClassification(object):
@@ -84,6 +85,15 @@ class TestClassification(object):
         coef_1 = L1L2Classifier(l1_ratio=1, alpha=0.5).fit(self.X, self.Y).coef_
         assert_true(np.allclose(coef_0, coef_1))
 
+    def test_two_step_decision_function(self):
+        # two classes, and three classes
+        for Y in (self.Y, np.argmax(self.X[:, :3], axis=1)):
+            mdl = L1L2TwoStepClassifier(mu=.5, tau=.1).fit(self.X, Y)
+            selector, ridge = mdl.steps[0][1], mdl.steps[1][1]
+            expected = ridge.decision_function(selector.transform(self.X))
+            assert_true(np.allclose(expected, mdl.decision_function(self.X)))
+            assert_true(set(mdl.predict(self.X)) <= set(Y))
+
     def test_stage_two(self):
         mdl = L1L2StageTwoClassifier(None)
         assert_raises(TypeError, mdl.fit, None, None)
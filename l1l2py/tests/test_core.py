@@ -155,6 +155,92 @@ class TestCore(object):
             assert_equals((1, len(lambda_range)), kcv_err_ts.shape)
             assert_equals(kcv_err_tr.shape, kcv_err_ts.shape)
 
+    def test_minimal_model_parallel(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 3)
+
+        tau_range = [0.1, 0.5, 1e3, 1e4]
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        expected = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                 splits, tools.regression_error,
+                                 data_normalizer=tools.standardize,
+                                 labels_normalizer=tools.center)
+        for backend in ('threading', None):
+            out = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                splits, tools.regression_error,
+                                data_normalizer=tools.standardize,
+                                labels_normalizer=tools.center,
+                                n_jobs=2, backend=backend)
+            for e, o in zip(expected, out):
+                assert_equals(e.shape, o.shape)
+                assert_true(np.allclose(e, o))
+
+    def test_minimal_model_batch_folds(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 3)
+
+        tau_range = [0.1, 0.5, 1e3, 1e4]
+        lambda_range = np.linspace(0.1, 1.0, 5)
+
+        for normalizer in (None, tools.center, tools.standardize):
+            expected = minimal_model(self.X, self.Y, 0.1, tau_range,
+                                     lambda_range, splits,
+                                     tools.regression_error,
+                                     data_normalizer=normalizer,
+                                     labels_normalizer=tools.center)
+            out = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                splits, tools.regression_error,
+                                data_normalizer=normalizer,
+                                labels_normalizer=tools.center,
+                                batch='folds')
+            for e, o in zip(expected, out):
+                assert_equals(e.shape, o.shape)
+                assert_true(np.allclose(e, o, rtol=1e-3))
+
+        assert_raises(ValueError, minimal_model, self.X, self.Y, 0.1,
+                      tau_range, lambda_range, splits,
+                      tools.regression_error, batch='folds',
+                      algorithm_version='GPU')
+
+    def test_memory_mapped_data(self):
+        import os
+        import shutil
+        import tempfile
+        from l1l2py import tools
+        from l1l2py.core import _take_rows
+
+        splits = tools.kfold_splits(self.Y, 3)
+        tau_range = [0.1, 0.5, 1e3, 1e4]
+        lambda_range = np.linspace(0.1, 1.0, 5)
+        expected = minimal_model(self.X, self.Y, 0.1, tau_range, lambda_range,
+                                 splits, tools.regression_error,
+                                 data_normalizer=tools.standardize,
+                                 labels_normalizer=tools.center)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'data.npy')
+            np.save(path, self.X)
+
+            # contiguous rows are views
+            data = np.load(path, mmap_mode='r')
+            rows = _take_rows(data, np.arange(5, 15))
+            assert_true(np.may_share_memory(data, rows))
+            assert_true(np.all(self.X[[3, 1]] == _take_rows(data, [3, 1])))
+
+            for data in (path, np.load(path, mmap_mode='r')):
+                out = minimal_model(data, self.Y, 0.1, tau_range,
+                                    lambda_range, splits,
+                                    tools.regression_error,
+                                    data_normalizer=tools.standardize,
+                                    labels_normalizer=tools.center)
+                for e, o in zip(expected, out):
+                    assert_true(np.allclose(e, o))
+            del data, rows
+        finally:
+            shutil.rmtree(tmpdir)
+
     def test_void_minimal_model(self):
         from l1l2py import tools
         from l1l2py.algorithms import l1_bound
@@ -201,6 +287,34 @@ class TestCore(object):
             s = selected_list[i]
             assert_true(len(s_prev[s_prev]) <= len(s[s]))
 
+    def test_nested_models_modes(self):
+        from l1l2py import tools
+        splits = tools.kfold_splits(self.Y, 2)
+        tr_idx, ts_idx = splits[0]
+        data, test_data = self.X[tr_idx, :], self.X[ts_idx, :]
+        labels, test_labels = self.Y[tr_idx], self.Y[ts_idx]
+
+        mu_range = np.linspace(0.1, 1.0, 5)
+        params = dict(error_function=tools.regression_error,
+                      data_normalizer=tools.standardize,
+                      labels_normalizer=tools.center,
+                      return_predictions=True)
+        expected = nested_models(data, labels, test_data, test_labels,
+                                 mu_range, 0.1, 0.1, **params)
+
+        for mode in (dict(warm_start=True), dict(n_jobs=2),
+                     dict(n_jobs=2, backend='threading')):
+            params.update(mode)
+            out = nested_models(data, labels, test_data, test_labels,
+                                mu_range, 0.1, 0.1, **params)
+            assert_equals(len(expected), len(out))
+            assert_true(all(np.array_equal(e, o) for e, o in
+                            zip(expected[1], out[1])))
+            for e_list, o_list in zip(expected, out):
+                assert_equals(len(e_list), len(o_list))
+                for e, o in zip(e_list, o_list):
+                    assert_true(np.allclose(e, o, atol=1e-4))
+
     def test_nested_models_predictions(self):
         from l1l2py import tools
         splits = tools.kfold_splits(self.Y, 2)
@@ -1,8 +1,9 @@
 import numpy as np
 from numpy.testing import assert_array_almost_equal, assert_almost_equal
 from nose.tools import *
+from six.moves import xrange
 
-from ..cross_val import KFold, StratifiedKFold
+from ..cross_val import KFold, StratifiedKFold, RepeatedKFold, ShuffleSplit
 
 def test_kfold_splits():
     """Test KFold splits generation."""
@@ -50,9 +51,9 @@ def test_rseed():
     X = random_state.randn(10, 100)
     y = random_state.randn(10)
     
-    splits1 = list(KFold(len(y), 2, random_state=10))
-    splits2 = list(KFold(len(y), 2, random_state=10))
-    splits3 = list(KFold(len(y), 2, random_state=1))
+    splits1 = _as_lists(KFold(len(y), 2, random_state=10))
+    splits2 = _as_lists(KFold(len(y), 2, random_state=10))
+    splits3 = _as_lists(KFold(len(y), 2, random_state=1))
     assert_equal(splits1, splits2)
     assert_not_equal(splits1, splits3)
     assert_not_equal(splits2, splits3)
@@ -60,9 +61,9 @@ def test_rseed():
     labels = np.ones(100)
     negative = np.arange(0, labels.size, 2)
     labels[negative] = -1
-    splits1 = list(StratifiedKFold(labels, 2, random_state=10))
-    splits2 = list(StratifiedKFold(labels, 2, random_state=10))
-    splits3 = list(StratifiedKFold(labels, 2, random_state=1))
+    splits1 = _as_lists(StratifiedKFold(labels, 2, random_state=10))
+    splits2 = _as_lists(StratifiedKFold(labels, 2, random_state=10))
+    splits3 = _as_lists(StratifiedKFold(labels, 2, random_state=1))
     assert_equal(splits1, splits2)
     assert_not_equal(splits1, splits3)
     assert_not_equal(splits2, splits3)
@@ -114,12 +115,42 @@ def test_exceptions():
     assert_raises(ValueError, list, StratifiedKFold(labels, 26))
     
         
+def test_repeated_kfold_splits():
+    """Test RepeatedKFold splits generation."""
+    splits = list(RepeatedKFold(10, 5, n_repeats=3, random_state=0))
+    assert_equal(15, len(splits))
+    for i in xrange(3):
+        _test_splits(10, splits[5 * i:5 * (i + 1)])
+
+    # different permutations on each repetition
+    assert_not_equal(_as_lists(splits[:5]), _as_lists(splits[5:10]))
+    assert_equal(_as_lists(splits),
+                 _as_lists(RepeatedKFold(10, 5, n_repeats=3, random_state=0)))
+
+def test_shuffle_splits():
+    """Test ShuffleSplit splits generation."""
+    splits = list(ShuffleSplit(20, 4, test_size=0.25, random_state=0))
+    assert_equal(4, len(splits))
+    for train, test in splits:
+        assert_equal(15, len(train))
+        assert_equal(5, len(test))
+        assert_equal(set(range(20)), set(train) | set(test))
+
+    splits = list(ShuffleSplit(20, 2, test_size=3))
+    assert_equal(3, len(splits[0][1]))
+
+    assert_raises(ValueError, list, ShuffleSplit(20, test_size=0.0))
+    assert_raises(ValueError, list, ShuffleSplit(20, test_size=20))
+
+def _as_lists(splits):
+    return [(list(train), list(test)) for train, test in splits]
+
 def _test_splits(labels_size, splits):
     cum_train = list()
     cum_test = list()
 
     for train, test in splits:
-        assert_equal(labels_size, len(train + test))
+        assert_equal(labels_size, len(train) + len(test))
         assert_true(set(test).isdisjoint(set(train)))
 
         cum_train.extend(train)
@@ -87,3 +87,15 @@ class TestDataTools(object):
         assert_equals(2, len(standardize(self.X, self.X)))
         assert_equals(3, len(standardize(self.X, return_factors=True)))
         assert_equals(4, len(standardize(self.X, self.X, return_factors=True)))
+
+    def test_fold_factors(self):
+        X = self.X + 1e3  # far from zero
+        statistics = column_statistics(X, chunk_size=7)
+        assert_equals(X.shape[0], statistics[0])
+
+        for train, test in kfold_splits(self.Y, 3):
+            mean, std = fold_factors(statistics, X[test])
+            Xstd, exp_mean, exp_std = standardize(X[train],
+                                                  return_factors=True)
+            assert_true(np.allclose(exp_mean, mean))
+            assert_true(np.allclose(exp_std, std))
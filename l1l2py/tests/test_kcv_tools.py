@@ -90,9 +90,9 @@ class TestKCVTools(object):
         TestKCVTools._test_balancing(labels, splits)
 
     def test_rseed(self):
-        splits1 = kfold_splits(self.Y, 2, 10)
-        splits2 = kfold_splits(self.Y, 2, 10)
-        splits3 = kfold_splits(self.Y, 2, 1)
+        splits1 = TestKCVTools._as_lists(kfold_splits(self.Y, 2, 10))
+        splits2 = TestKCVTools._as_lists(kfold_splits(self.Y, 2, 10))
+        splits3 = TestKCVTools._as_lists(kfold_splits(self.Y, 2, 1))
         assert_equal(splits1, splits2)
         assert_not_equal(splits1, splits3)
         assert_not_equal(splits2, splits3)
@@ -100,9 +100,10 @@ class TestKCVTools(object):
         labels = np.ones(100)
         negative = np.arange(0, labels.size, 2)
         labels[negative] = -1
-        splits1 = stratified_kfold_splits(labels, 2, 10)
-        splits2 = stratified_kfold_splits(labels, 2, 10)
-        splits3 = stratified_kfold_splits(labels, 2, 1)
+        as_lists = TestKCVTools._as_lists
+        splits1 = as_lists(stratified_kfold_splits(labels, 2, 10))
+        splits2 = as_lists(stratified_kfold_splits(labels, 2, 10))
+        splits3 = as_lists(stratified_kfold_splits(labels, 2, 1))
         assert_equal(splits1, splits2)
         assert_not_equal(splits1, splits3)
         assert_not_equal(splits2, splits3)
@@ -128,6 +129,10 @@ class TestKCVTools(object):
             assert_not_equal(indexes_1, indexes_3)
             assert_not_equal(indexes_2, indexes_3)
 
+    @staticmethod
+    def _as_lists(splits):
+        return [(list(train), list(test)) for train, test in splits]
+
     @staticmethod
     def _test_splits(labels_size, splits):
 
@@ -135,7 +140,7 @@ class TestKCVTools(object):
         cum_test = list()
 
         for train, test in splits:
-            assert_equal(labels_size, len(train + test))
+            assert_equal(labels_size, len(train) + len(test))
             assert_true(set(test).isdisjoint(set(train)))
 
             cum_train.extend(train)
@@ -0,0 +1,97 @@
+# Copyright (C) 2017 SlipGURU -
+# Statistical Learning and Image Processing Genoa University Research Group
+# Via Dodecaneso, 35 - 16146 Genova, ITALY.
+#
+# This file is part of L1L2Py.
+#
+# L1L2Py is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# L1L2Py is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from nose.tools import assert_equals, assert_raises, assert_true
+
+from l1l2py.lipschitz import lipschitz_constant
+from l1l2py.tests import _TEST_DATA_PATH
+
+
+class TestLipschitz(object):
+
+    def setup(self):
+        data = np.loadtxt(_TEST_DATA_PATH)
+        self.X = data[:, :-1]
+        self.Y = data[:, -1]
+
+        random_state = np.random.RandomState(0)
+        self.wide = random_state.randn(80, 300)
+        self.tall = random_state.randn(300, 80)
+
+    def test_exact(self):
+        expected = np.linalg.norm(self.X, 2) ** 2
+        assert_true(np.allclose(expected,
+                                lipschitz_constant(self.X, method='exact')))
+        assert_true(np.allclose(expected,
+                                lipschitz_constant(self.X.T, method='exact')))
+
+        # small matrices are computed exactly
+        assert_equals(lipschitz_constant(self.X, method='exact'),
+                      lipschitz_constant(self.X))
+
+    def test_iterative(self):
+        for X in (self.wide, self.tall):
+            expected = np.linalg.norm(X, 2) ** 2
+            for method in ('auto', 'lanczos', 'power'):
+                value = lipschitz_constant(X, method=method)
+
+                # upper estimate, within the given tolerances
+                assert_true(value >= expected * (1 - 1e-4))
+                assert_true(np.allclose(expected, value, rtol=1e-2))
+
+    def test_margin(self):
+        exact = lipschitz_constant(self.wide, margin=0.0, method='lanczos')
+        value = lipschitz_constant(self.wide, margin=0.1, method='lanczos')
+        assert_true(np.allclose(1.1 * exact, value))
+
+    def test_gram(self):
+        for X in (self.wide, self.tall):
+            expected = np.linalg.norm(X, 2) ** 2
+            gram = np.dot(X.T, X)
+            for method in ('exact', 'lanczos', 'power'):
+                value = lipschitz_constant(gram, gram=True, method=method)
+                assert_true(np.allclose(expected, value, rtol=1e-2))
+
+    def test_sparse(self):
+        from scipy import sparse
+        X = self.wide.copy()
+        X[np.abs(X) < 1.5] = 0.0
+        expected = np.linalg.norm(X, 2) ** 2
+        for method in ('exact', 'lanczos', 'power'):
+            value = lipschitz_constant(sparse.csr_matrix(X), method=method)
+            assert_true(np.allclose(expected, value, rtol=1e-2))
+
+    def test_single_precision(self):
+        for X in (self.wide, self.tall):
+            expected = np.linalg.norm(X, 2) ** 2
+            for method in ('exact', 'lanczos', 'power'):
+                value = lipschitz_constant(X.astype(np.float32),
+                                           method=method)
+                assert_true(isinstance(value, float))
+                assert_true(np.allclose(expected, value, rtol=1e-2))
+
+    def test_null_matrix(self):
+        for shape in ((10, 20), (100, 200)):
+            for method in ('exact', 'lanczos', 'power'):
+                assert_equals(0.0, lipschitz_constant(np.zeros(shape),
+                                                      method=method))
+
+    def test_exceptions(self):
+        assert_raises(ValueError, lipschitz_constant, self.X, method='svd')
@@ -198,3 +198,20 @@ def _test_lasso_cv():
     model = LassoCV(n_taus=100, eps=1e-3, max_iter=10)
     model.fit(X, y)
     assert_almost_equal(model.tau, 0.02099, 2)
+
+
+def test_sparse_input():
+    """Test the fit on a sparse matrix, implicitly centered."""
+    from scipy import sparse
+
+    np.random.seed(0)
+    X = np.random.randn(50, 100)
+    X[np.abs(X) < 1.5] = 0.0
+    y = np.dot(X[:, :5], np.ones(5)) + 1.0
+
+    dense = ElasticNet(tau=0.1, mu=0.1, tol=1e-8).fit(X, y)
+    for fmt in (sparse.csr_matrix, sparse.csc_matrix):
+        model = ElasticNet(tau=0.1, mu=0.1, tol=1e-8).fit(fmt(X), y)
+        assert_array_almost_equal(dense.coef_, model.coef_)
+        assert_array_almost_equal(dense.intercept_, model.intercept_)
+        assert_array_almost_equal(dense.predict(X), model.predict(fmt(X)))
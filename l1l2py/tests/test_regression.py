@@ -22,11 +22,14 @@
 # along with L1L2Py. If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
+from nose import SkipTest
 from nose.tools import assert_equals, assert_raises, assert_true
 
 from l1l2py.linear_model import L1L2
 from l1l2py.regression import L1L2StageOne
+from l1l2py.regression import L1L2TwoStep
 from l1l2py.regression import L1L2StageTwo
+from l1l2py import regression
 from l1l2py.tests import _TEST_DATA_PATH
 
 class TestLinearModel(object):
@@ -55,7 +58,10 @@ class TestLinearModel(object):
 
         assert_true(np.allclose(true_coef, coef_))
 
-        coef_ = L1L2(mu=0, tau=1.0).fit(self.X, self.Y).coef_
+        # without the l2 term the convergence is slow: the reference values
+        # are the ones reached after 1000 iterations
+        coef_ = L1L2(mu=0, tau=1.0, max_iter=1000, tol=1e-4).fit(
+            self.X, self.Y).coef_
 
         true_coef = np.array([
              0.        ,  10.93683418,   3.46579585,   0.        ,
@@ -84,6 +90,145 @@ class TestLinearModel(object):
         coef_1 = L1L2(l1_ratio=1, alpha=0.5).fit(self.X, self.Y).coef_
         assert_true(np.allclose(coef_0, coef_1))
 
+    def test_duality_gap(self):
+        null_objective = self.Y.dot(self.Y) / len(self.Y)
+        for stopping in ('coef', 'gap'):
+            mdl = L1L2(mu=.5, tau=1.0, fit_intercept=False, tol=1e-6,
+                       stopping=stopping).fit(self.X, self.Y)
+            assert_true(0 <= mdl.dual_gap_ <= 1e-4 * null_objective)
+
+        gaps = [L1L2(mu=.5, tau=1.0, tol=tol, stopping='gap').fit(
+            self.X, self.Y).dual_gap_ for tol in (1e-2, 1e-8)]
+        assert_true(gaps[1] < gaps[0])
+
+        assert_raises(ValueError, L1L2(stopping='dual').fit, self.X, self.Y)
+
+    def test_precompute(self):
+        X, Y = self.X[:, :20], self.Y  # n_samples > n_features
+        expected = L1L2(mu=.5, tau=1.0, tol=1e-8).fit(X, Y).coef_
+        for precompute in (True, 'auto'):
+            coef_ = L1L2(mu=.5, tau=1.0, tol=1e-8,
+                         precompute=precompute).fit(X, Y).coef_
+            assert_true(np.allclose(expected, coef_))
+
+        expected = L1L2(mu=.5, tau=1.0, tol=1e-8,
+                        fit_intercept=False).fit(X, Y).coef_
+        coef_ = L1L2(mu=.5, tau=1.0, tol=1e-8, fit_intercept=False,
+                     precompute=np.dot(X.T, X)).fit(X, Y).coef_
+        assert_true(np.allclose(expected, coef_))
+
+    def test_sparse_input(self):
+        from scipy import sparse
+        X = self.X.copy()
+        X[np.abs(X) < 2.0] = 0.0
+
+        for fit_intercept in (False, True):
+            dense = L1L2(mu=.5, tau=1.0, tol=1e-8,
+                         fit_intercept=fit_intercept).fit(X, self.Y)
+            for fmt in (sparse.csr_matrix, sparse.csc_matrix):
+                mdl = L1L2(mu=.5, tau=1.0, tol=1e-8,
+                           fit_intercept=fit_intercept).fit(
+                               fmt(X), self.Y)
+                assert_true(np.allclose(dense.coef_, mdl.coef_))
+                assert_true(np.allclose(dense.intercept_, mdl.intercept_))
+
+    def test_implicit_centering(self):
+        X = self.X + 5.
+        X_copy = X.copy()
+        for normalize in (False, True):
+            for precompute in (False, True):
+                mdl = L1L2(mu=.5, tau=1.0, tol=1e-8, normalize=normalize,
+                           precompute=precompute).fit(X, self.Y)
+                # the data are centered and scaled by the solver
+                assert_true(np.array_equal(X_copy, X))
+
+                X_centered = X - X.mean(axis=0)
+                scale = (np.sqrt(np.sum(X_centered ** 2, axis=0))
+                         if normalize else np.ones(X.shape[1]))
+                explicit = L1L2(mu=.5, tau=1.0, tol=1e-8, fit_intercept=False,
+                                precompute=precompute).fit(
+                                    X_centered / scale,
+                                    self.Y - self.Y.mean())
+                assert_true(np.allclose(explicit.coef_ / scale, mdl.coef_))
+
+    def test_single_precision(self):
+        expected = L1L2(mu=.5, tau=1.0, tol=1e-6).fit(self.X, self.Y).coef_
+        # the tolerance must be above the single precision epsilon (~1e-7)
+        mdl = L1L2(mu=.5, tau=1.0, tol=1e-6).fit(
+            self.X.astype(np.float32), self.Y.astype(np.float32))
+        assert_equals(np.float32, mdl.coef_.dtype)
+        assert_true(np.allclose(expected, mdl.coef_, rtol=1e-4, atol=1e-4))
+
+    def test_compiled_solver(self):
+        if regression.fista_fast is None:
+            raise SkipTest('the compiled solver is not built')
+        X = self.X + 5.
+        offset, scale = X.mean(axis=0), X.std(axis=0)
+        for data in (np.asfortranarray(X), np.ascontiguousarray(X)):
+            for stopping in ('coef', 'gap'):
+                args = (np.zeros(X.shape[1]), .1, .05, data, self.Y, 1000,
+                        1e-8, None, False, False)
+                compiled = regression.fista_l1l2(
+                    *args, stopping=stopping, X_offset=offset, X_scale=scale)
+                python = regression._fista_l1l2(
+                    *args[:3] + (regression.centered_operator(
+                        data, offset, scale), ) + args[4:],
+                    stopping=stopping)
+                assert_equals(python[3], compiled[3])
+                assert_true(np.allclose(python[0], compiled[0]))
+                assert_true(np.allclose(python[1], compiled[1]))
+
+    def test_multi_output(self):
+        Y = np.column_stack((self.Y, -self.Y + self.X[:, 0], self.X[:, 1]))
+        mdl = L1L2(mu=.5, tau=1.0, tol=1e-8).fit(self.X, Y)
+        assert_equals((3, 40), mdl.coef_.shape)
+        assert_equals((3, ), mdl.intercept_.shape)
+        for k in range(3):
+            coef_ = L1L2(mu=.5, tau=1.0, tol=1e-8).fit(self.X, Y[:, k]).coef_
+            assert_true(np.allclose(coef_, mdl.coef_[k], atol=1e-5))
+
+        # l2,1 penalty: same features for all the targets
+        coef_ = L1L2(mu=.5, tau=1.0, multi_task=True).fit(self.X, Y).coef_
+        selected = coef_ != 0
+        assert_true(np.all(selected == selected[0]))
+
+    def test_compact_coef(self):
+        from scipy import sparse
+        dense = L1L2(mu=.5, tau=1.0).fit(self.X, self.Y)
+        mdl = L1L2(mu=.5, tau=1.0, compact=True).fit(self.X, self.Y)
+        assert_true(np.array_equal(np.flatnonzero(dense.coef_),
+                                   mdl.coef_indices_))
+        assert_true(np.allclose(dense.coef_[mdl.coef_indices_],
+                                mdl.coef_values_))
+        assert_true(np.allclose(dense.coef_, mdl.coef_))
+
+        # only the selected columns are used to predict
+        expected = np.dot(self.X, dense.coef_) + dense.intercept_
+        for X in (self.X, sparse.csr_matrix(self.X)):
+            assert_true(np.allclose(expected, dense.predict(X)))
+            assert_true(np.allclose(expected, mdl.predict(X)))
+        assert_raises(ValueError, mdl.predict, self.X[:, 1:])
+
+        # the ridge coefficients on the selected features
+        two_step = L1L2TwoStep(mu=.5, tau=1.0, compact=True).fit(
+            self.X, self.Y)
+        ridge = two_step.steps[1][1]
+        assert_true(np.array_equal(
+            two_step.steps[0][1].get_support(indices=True),
+            two_step.coef_indices_))
+        assert_true(np.array_equal(ridge.coef_, two_step.coef_values_))
+        assert_true(np.array_equal(
+            ridge.coef_, two_step.coef_[two_step.coef_indices_]))
+
+    def test_two_step_predict(self):
+        mdl = L1L2TwoStep(mu=.5, tau=1.0).fit(self.X, self.Y)
+        selector, ridge = mdl.steps[0][1], mdl.steps[1][1]
+        # the support mask is computed only once
+        assert_true(selector.get_support() is selector.get_support())
+
+        expected = ridge.predict(selector.transform(self.X))
+        assert_true(np.allclose(expected, mdl.predict(self.X)))
+
     def test_stage_two(self):
         mdl = L1L2StageTwo(None)
         assert_raises(TypeError, mdl.fit, None, None)
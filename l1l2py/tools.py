@@ -28,8 +28,11 @@ with the rest of the package.
 import numpy as np
 from six.moves import xrange
 
+from l1l2py.cross_val import KFold, _check_random_state
+
 
 __all__ = ('geometric_range', 'standardize', 'center',
+           'column_statistics', 'fold_factors',
            'classification_error', 'balanced_classification_error',
            'regression_error', 'kfold_splits', 'stratified_kfold_splits')
 
@@ -228,6 +231,94 @@ def standardize(matrix, optional_matrix=None, return_factors=False):
     return (matrix - mean) / std, (optional_matrix - mean) / std, mean, std
 
 
+def column_statistics(matrix, chunk_size=4096):
+    r"""Sufficient statistics of the mean and standard deviation of the
+    columns of a matrix.
+
+    The statistics are sums of shifted values, so that they may be updated
+    removing some rows (see ``fold_factors``).
+    The rows are read in chunks of ``chunk_size``, so ``matrix`` may also be
+    memory mapped.
+
+    Parameters
+    ----------
+    matrix : (N, P) ndarray
+        Input matrix.
+    chunk_size : int, optional (default is `4096`)
+        Number of rows read at once.
+
+    Returns
+    -------
+    statistics : tuple
+        Number of rows `N`, the (P,) shift (the first row of ``matrix``),
+        and the (P,) sums and sums of squares of the shifted columns.
+
+    Examples
+    --------
+    >>> X = numpy.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    >>> statistics = l1l2py.tools.column_statistics(X)
+    >>> statistics[0]
+    3
+    >>> statistics[2]
+    array([ 9.,  9.,  9.])
+
+    """
+    n = matrix.shape[0]
+    shift = np.array(matrix[0], dtype=np.float64)
+    sums = np.zeros_like(shift)
+    squares = np.zeros_like(shift)
+
+    for start in xrange(0, n, chunk_size):
+        block = matrix[start:start + chunk_size] - shift
+        sums += block.sum(axis=0)
+        squares += np.einsum('ij,ij->j', block, block)
+
+    return n, shift, sums, squares
+
+
+def fold_factors(statistics, held_out):
+    r"""Mean and standard deviation of the columns of a matrix, without some
+    held out rows.
+
+    The factors are computed from the ``statistics`` of the whole matrix
+    (see ``column_statistics``) and the ``held_out`` rows only, so that on
+    each cross validation split the training matrix need not be
+    normalized with a copy (see ``center`` and ``standardize``).
+
+    Parameters
+    ----------
+    statistics : tuple
+        Statistics of the whole (N, P) matrix.
+    held_out : (T, P) ndarray
+        Rows to remove (e.g. the test set of a split).
+
+    Returns
+    -------
+    mean : (P,) ndarray
+        Mean of the columns of the remaining `N - T` rows.
+    std : (P,) ndarray
+        Standard deviation of the columns of the remaining rows.
+
+    Examples
+    --------
+    >>> X = numpy.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    >>> statistics = l1l2py.tools.column_statistics(X)
+    >>> l1l2py.tools.fold_factors(statistics, X[2:])
+    (array([ 2.5,  3.5,  4.5]), array([ 2.12132034,  2.12132034,  2.12132034]))
+
+    """
+    n, shift, sums, squares = statistics
+    n_tr = n - held_out.shape[0]
+
+    block = held_out - shift
+    sums = sums - block.sum(axis=0)
+    squares = squares - np.einsum('ij,ij->j', block, block)
+
+    mean = shift + sums / n_tr
+    variance = (squares - sums ** 2 / n_tr) / (n_tr - 1)
+    return mean, np.sqrt(np.maximum(variance, 0.0))
+
+
 # Error functions -------------------------------------------------------------
 def classification_error(labels, predictions):
     r"""Evaluate the binary classification error.
@@ -357,8 +448,8 @@ def kfold_splits(labels, k, rseed=0):
     r"""k-fold cross validation splits.
 
     Given a list of labels, the function produces a list of ``k`` splits.
-    Each split is a pair of tuples containing the indexes of the training set
-    and the indexes of the test set.
+    Each split is a pair of integer arrays containing the indexes of the
+    training set and the indexes of the test set.
 
     Parameters
     ----------
@@ -366,42 +457,39 @@ def kfold_splits(labels, k, rseed=0):
         Data labels.
     k : int, greater than `0`
         Number of splits.
-    rseed : int, optional (default is `0`)
-        Random seed.
+    rseed : int or RandomState, optional (default is `0`)
+        Random seed (or generator) of the permutation of the samples.
+        The splits of a seed are the ones of ``l1l2py.cross_val.KFold``,
+        which differ from the ones of the previous releases (shuffling a
+        Python list).
 
     Returns
     -------
     splits : list of ``k`` tuples
-        Each tuple contains two lists with the training set and test set
-        indexes.
+        Each tuple contains two integer arrays with the training set and test
+        set indexes.
 
     Raises
     ------
     ValueError
         If ``k`` is less than 2 or greater than `N`.
 
+    See Also
+    --------
+    l1l2py.cross_val.KFold : lazy splits of integer arrays.
+
     Examples
     --------
     >>> labels = range(10)
     >>> l1l2py.tools.kfold_splits(labels, 2)
-    [([7, 1, 3, 6, 8], [9, 4, 0, 5, 2]), ([9, 4, 0, 5, 2], [7, 1, 3, 6, 8])]
+    [(array([6, 7, 3, 0, 5]), array([2, 8, 4, 9, 1])), (array([2, 8, 4, 9, 1]), array([6, 7, 3, 0, 5]))]
     >>> l1l2py.tools.kfold_splits(labels, 1)
     Traceback (most recent call last):
         ...
     ValueError: 'k' must be greater than one and smaller or equal than the number of samples
 
     """
-    if not (2 <= k <= len(labels)):
-        raise ValueError("'k' must be greater than one and smaller or equal "
-                         "than the number of samples")
-
-    import random
-    random.seed(rseed)
-    indexes = list(range(len(labels)))
-    random.shuffle(indexes)
-    random.seed()  # restores random generation from a random seed
-
-    return _splits(indexes, k)
+    return list(KFold(len(labels), k, random_state=rseed))
 
 
 def stratified_kfold_splits(labels, k, rseed=0):
@@ -418,14 +506,15 @@ def stratified_kfold_splits(labels, k, rseed=0):
         Data labels (usually contains only 1s and -1s).
     k : int, greater than `0`
         Number of splits.
-    rseed : int, optional (default is `0`)
-        Random seed.
+    rseed : int or RandomState, optional (default is `0`)
+        Random seed (or generator) of the permutations of the samples
+        (see ``kfold_splits``).
 
     Returns
     -------
     splits : list of ``k`` tuples
-        Each tuple contains two lists with the training set and test set
-        indexes.
+        Each tuple contains two integer arrays with the training set and test
+        set indexes.
 
     Raises
     ------
@@ -444,46 +533,38 @@ def stratified_kfold_splits(labels, k, rseed=0):
     ValueError: 'labels' must contains only two class labels
     >>> labels = [1, 1, 1, 1, 1, 1, -1, -1, -1, -1]
     >>> l1l2py.tools.stratified_kfold_splits(labels, 2)
-    [([8, 9, 5, 2, 1], [7, 6, 3, 0, 4]), ([7, 6, 3, 0, 4], [8, 9, 5, 2, 1])]
+    [(array([7, 6, 4, 5, 3]), array([8, 9, 0, 2, 1])), (array([8, 9, 0, 2, 1]), array([7, 6, 4, 5, 3]))]
     >>> l1l2py.tools.stratified_kfold_splits(labels, 1)
     Traceback (most recent call last):
         ...
     ValueError: 'k' must be greater than one and smaller or equal than number of positive and negative samples
 
     """
+    labels = np.asarray(labels)
     classes = np.unique(labels)
     if classes.size != 2:
         raise ValueError("'labels' must contains only two class labels")
 
-    n_indexes = (np.where(labels == classes[0])[0]).tolist()
-    p_indexes = (np.where(labels == classes[1])[0]).tolist()
+    n_indexes = np.flatnonzero(labels == classes[0])
+    p_indexes = np.flatnonzero(labels == classes[1])
 
     if not (2 <= k <= min(len(n_indexes), len(p_indexes))):
-        raise ValueError("'k' must be greater than oen and smaller or equal "
+        raise ValueError("'k' must be greater than one and smaller or equal "
                          "than number of positive and negative samples")
 
-    import random
-    random.seed(rseed)
-    random.shuffle(n_indexes)
-    n_splits = _splits(n_indexes, k)
-
-    random.shuffle(p_indexes)
-    p_splits = _splits(p_indexes, k)
-    random.seed()  # restores random generation from a random seed
-
-    splits = list()
-    for ns, ps in zip(n_splits, p_splits):
-        train = ns[0] + ps[0]
-        test = ns[1] + ps[1]
-        splits.append((train, test))
+    random_state = _check_random_state(rseed)
+    n_splits = _splits(random_state.permutation(n_indexes), k)
+    p_splits = _splits(random_state.permutation(p_indexes), k)
 
-    return splits
+    return [(np.concatenate((ns[0], ps[0])), np.concatenate((ns[1], ps[1])))
+            for ns, ps in zip(n_splits, p_splits)]
 
 
 def _splits(indexes, k):
-    r"""Split the 'indexes' list in input in k disjoint chunks.
+    r"""Split the 'indexes' array in input in k disjoint chunks.
     """
-    return [(indexes[:start] + indexes[end:], indexes[start:end])
+    return [(np.concatenate((indexes[:start], indexes[end:])),
+             indexes[start:end])
             for start, end in _split_dimensions(len(indexes), k)]
 
 
@@ -1,5 +1,12 @@
 import os
-from setuptools import setup
+from setuptools import setup, Extension
+
+import numpy
+
+try:
+    from Cython.Build import cythonize
+except ImportError:  # build from the generated C source
+    cythonize = None
 
 # Package path
 pkg_path = os.path.dirname(__file__)
@@ -12,7 +19,14 @@ long_description = ''.join(lines[2:])
 
 # Package Version
 from l1l2py import __version__ as version
-    
+
+# Compiled FISTA solver
+fista_fast = Extension('l1l2py.fista_fast.fista_fast',
+                       [os.path.join('l1l2py', 'fista_fast', 'fista_fast.' +
+                                     ('c' if cythonize is None else 'pyx'))],
+                       include_dirs=[numpy.get_include()])
+ext_modules = [fista_fast] if cythonize is None else cythonize([fista_fast])
+
 setup(
     name='L1L2Py',
     version=version,
@@ -39,7 +53,8 @@ setup(
         'Topic :: Scientific/Engineering :: Artificial Intelligence',
     ],
 
-    packages=['l1l2py', 'l1l2py.tests'],
+    packages=['l1l2py', 'l1l2py.fista_fast', 'l1l2py.tests'],
+    ext_modules=ext_modules,
     package_data={'l1l2py.tests': ['data.txt']},
-    requires=['numpy (>=1.3.0)']
+    requires=['numpy (>=1.3.0)', 'scipy (>=0.16.0)']
 )